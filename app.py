@@ -1,20 +1,35 @@
 import gradio as gr
+import asyncio
 import os
 import sys
-import shutil
+import time
 import uuid
 
 # Ensure we can import from the current directory
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from main import graph
+from main import graph, NODE_LABELS
+from tools import review_queue
+from tools import evidence_store
+from tools import job_queue
+from tools import tracing
+from tools.llm_resilience import VisionUnavailableError
 
-# Ensure uploads directory exists
-os.makedirs("uploads", exist_ok=True)
+# How many handler calls Gradio runs at once; the handlers are async, so a
+# slow vision call no longer holds a worker thread while it waits.
+QUEUE_CONCURRENCY = int(os.environ.get("GRADIO_CONCURRENCY", 32))
 
-def get_status_output(config, thread_id):
+def render_progress(steps):
+    """Markdown checklist of the nodes started so far."""
+    lines = [f"* {'✅' if done else '⏳'} {NODE_LABELS.get(name, name)}" for name, done in steps.items()]
+    return "### Progress\n" + "\n".join(lines)
+
+def hidden():
+    return gr.update(visible=False)
+
+async def get_status_output(config, thread_id):
     """Helper to format the output based on graph state."""
-    snapshot = graph.get_state(config)
+    snapshot = await graph.aget_state(config)
     
     if not snapshot.values:
         return (
@@ -57,62 +72,116 @@ def get_status_output(config, thread_id):
         gr.update(visible=show_buttons)
     )
 
-def process_claim(order_id, files, thread_id):
+async def stream_graph(graph_input, config, thread_id):
+    """
+    Runs the graph and yields a progress update as each node starts and
+    finishes, then the final claim status.
+    """
+    steps = {}
+    run_config = {**config, "callbacks": tracing.callbacks()}
+    async for task in graph.astream(graph_input, config=run_config, stream_mode="tasks"):
+        # "tasks" events come in pairs: one when a node starts, one with its result
+        steps[task["name"]] = "result" in task or "error" in task
+        yield render_progress(steps), "⏳ Processing claim...", thread_id, hidden(), hidden()
+    yield await get_status_output(config, thread_id)
+
+def save_uploads(files, thread_id):
+    """Adds uploads to the content-addressed evidence store, referenced by this claim."""
+    # Identical files are stored once; new ones are hardlinked from Gradio's temp dir when possible
+    return [evidence_store.store_file(file_path, ref=thread_id) for file_path in files]
+
+async def process_claim(order_id, files, thread_id):
     if not order_id or not files:
-        return "Please provide an Order ID and at least one Image/Video.", "", thread_id, gr.update(visible=False), gr.update(visible=False)
+        yield "Please provide an Order ID and at least one Image/Video.", "", thread_id, gr.update(visible=False), gr.update(visible=False)
+        return
 
     # Generate new thread ID for new claims to ensure clean state
     thread_id = str(uuid.uuid4())
     
     config = {"configurable": {"thread_id": thread_id}}
     
-    saved_paths = []
-    for file_path in files:
-        filename = os.path.basename(file_path)
-        dest_path = os.path.join("uploads", filename)
-        # Copy from temp location to our uploads folder
-        shutil.copy(file_path, dest_path)
-        saved_paths.append(dest_path)
+    yield "### Progress\n* ⏳ Uploading evidence", "⏳ Processing claim...", thread_id, hidden(), hidden()
+    # File copies run in a worker thread, off the event loop
+    saved_paths = await asyncio.to_thread(save_uploads, files, thread_id)
     
     initial_state = {
         "claim_id": order_id,
         "image_paths": saved_paths,
+        "submitted_at": time.time(),
         "messages": [],
         "refund_status": "Pending"
     }
     
     # Run the Graph
     try:
-        for event in graph.stream(initial_state, config=config):
-            pass 
+        async for update in stream_graph(initial_state, config, thread_id):
+            yield update
+    except VisionUnavailableError:
+        # The checkpoint stays at the vision step; a claim worker (worker.py) resumes it from there
+        await asyncio.to_thread(job_queue.park, order_id, saved_paths, thread_id)
+        yield ("### Claim Parked", "⏸️ The damage-analysis service is unavailable. Your claim is saved "
+               "and queued for the claim workers, which retry it in the background.",
+               thread_id, hidden(), hidden())
     except Exception as e:
-        return f"Error processing claim: {e}", "", thread_id, gr.update(visible=False), gr.update(visible=False)
-
-    return get_status_output(config, thread_id)
+        yield f"Error processing claim: {e}", "", thread_id, gr.update(visible=False), gr.update(visible=False)
 
-def approve_claim(thread_id):
+async def resume_claim(thread_id, approve):
     if not thread_id:
-        return "Error: No active session.", "", None, gr.update(visible=False), gr.update(visible=False)
-        
+        yield "Error: No active session.", "", None, gr.update(visible=False), gr.update(visible=False)
+        return
+
     config = {"configurable": {"thread_id": thread_id}}
-    graph.update_state(config, {"refund_status": "Manager Approved"})
-    
-    for event in graph.stream(None, config=config): 
-        pass
-        
-    return get_status_output(config, thread_id)
+    yield "### Progress\n* ⏳ Recording the manager's decision", "⏳ Processing claim...", thread_id, hidden(), hidden()
+    # Same path as the review queue: claim the entry, check the thread is
+    # still paused, resume; a claim decided elsewhere is left alone
+    report = await review_queue.decide_many(graph, [thread_id], approve=approve, concurrency=1)
+    status_md, msg, thread_id, approve_btn, reject_btn = await get_status_output(config, thread_id)
+    if report["failed"]:
+        msg = f"Error resuming claim: {report['failed'][0]['error']}"
+    elif report["skipped"]:
+        msg = "ℹ️ Another reviewer already decided this claim, or is deciding it now. " + msg
+    yield status_md, msg, thread_id, approve_btn, reject_btn
 
-def reject_claim(thread_id):
-    if not thread_id:
-        return "Error: No active session.", "", None, gr.update(visible=False), gr.update(visible=False)
+async def approve_claim(thread_id):
+    async for update in resume_claim(thread_id, approve=True):
+        yield update
 
-    config = {"configurable": {"thread_id": thread_id}}
-    graph.update_state(config, {"refund_status": "Rejected"})
-    
-    for event in graph.stream(None, config=config): 
-        pass
-        
-    return get_status_output(config, thread_id)
+async def reject_claim(thread_id):
+    async for update in resume_claim(thread_id, approve=False):
+        yield update
+
+# --- Review Queue ---
+REVIEW_PAGE_SIZE = 25
+REVIEW_COLUMNS = ["Thread ID", "Order ID", "Order Value", "Tier", "Reason", "Waiting (min)"]
+
+def list_page(tier, page):
+    return review_queue.list_pending(tier=tier, limit=REVIEW_PAGE_SIZE, offset=(int(page or 1) - 1) * REVIEW_PAGE_SIZE)
+
+async def load_queue(tier, page):
+    """One page of claims waiting for a manager, oldest first."""
+    tier = tier or None
+    # SQLite reads run in a worker thread, off the event loop
+    rows = await asyncio.to_thread(list_page, tier, page)
+    table = [
+        [r["thread_id"], r["claim_id"], r["order_value"], r["customer_tier"], r["reason"], round(r["age_seconds"] / 60)]
+        for r in rows
+    ]
+    pending = await asyncio.to_thread(review_queue.count_pending, tier=tier)
+    return table, f"**{pending}** claims pending review."
+
+async def decide_page(tier, page, approve):
+    """Approves or rejects every claim on the current page, resuming them concurrently."""
+    tier = tier or None
+    rows = await asyncio.to_thread(list_page, tier, page)
+    report = await review_queue.decide_many(graph, [r["thread_id"] for r in rows], approve=approve)
+    table, summary = await load_queue(tier, page)
+    return table, f"{report['decision']}: {report['resumed']} claims ({len(report['failed'])} failed). {summary}"
+
+async def approve_page(tier, page):
+    return await decide_page(tier, page, approve=True)
+
+async def reject_page(tier, page):
+    return await decide_page(tier, page, approve=False)
 
 # --- Gradio UI Layout ---
 with gr.Blocks(title="Logistics Damage Claim Agent") as demo:
@@ -158,5 +227,23 @@ with gr.Blocks(title="Logistics Damage Claim Agent") as demo:
         outputs=[status_output, message_output, thread_state, approve_btn, reject_btn]
     )
 
+    # Review queue: every claim paused for a manager, not just this session's
+    gr.Markdown("### 👨‍💼 Review Queue")
+    with gr.Row():
+        tier_filter = gr.Dropdown(["", "VIP", "REGULAR"], value="", label="Tier")
+        page_input = gr.Number(value=1, precision=0, minimum=1, label="Page")
+        refresh_btn = gr.Button("🔄 Refresh")
+    queue_table = gr.Dataframe(headers=REVIEW_COLUMNS, interactive=False)
+    queue_summary = gr.Markdown("")
+    with gr.Row():
+        approve_page_btn = gr.Button("✅ Approve Page", variant="primary")
+        reject_page_btn = gr.Button("❌ Reject Page", variant="stop")
+
+    refresh_btn.click(fn=load_queue, inputs=[tier_filter, page_input], outputs=[queue_table, queue_summary])
+    approve_page_btn.click(fn=approve_page, inputs=[tier_filter, page_input], outputs=[queue_table, queue_summary])
+    reject_page_btn.click(fn=reject_page, inputs=[tier_filter, page_input], outputs=[queue_table, queue_summary])
+    demo.load(fn=load_queue, inputs=[tier_filter, page_input], outputs=[queue_table, queue_summary])
+
 if __name__ == "__main__":
+    demo.queue(default_concurrency_limit=QUEUE_CONCURRENCY)
     demo.launch()
\ No newline at end of file
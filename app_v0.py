@@ -1,89 +1,203 @@
 import streamlit as st
 import os
 import sys
+import time
+import uuid
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 # Ensure we can import from the current directory
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from main import graph
+# Importing main is cheap; the graph and databases are set up by get_graph() below
+from main import NODE_LABELS
+from tools import evidence_store
+from tools import job_queue
+from tools import review_queue
+from tools import tracing
+from tools.llm_resilience import VisionUnavailableError
+
+# Graph runs (and upload writes) in flight across all sessions; more wait for a free thread
+RUN_CONCURRENCY = int(os.environ.get("STREAMLIT_CONCURRENCY", 32))
 
 st.set_page_config(page_title="Logistics Claims AI", page_icon="📦", layout="wide")
 
+# --- Shared Resources (one per server process, not per session or rerun) ---
+@st.cache_resource
+def get_graph():
+    """The compiled graph; the runtime (env, logging, orders DB) is initialized once."""
+    from main import get_graph as build
+    return build()
+
+@st.cache_resource
+def get_pool():
+    """
+    Long-lived threads for graph runs. Streamlit starts a new script thread
+    on every rerun, so thread-local SQLite connections opened there would be
+    thrown away each time; these threads keep theirs.
+    """
+    return ThreadPoolExecutor(max_workers=RUN_CONCURRENCY, thread_name_prefix="claims")
+
+def summarize(snapshot):
+    """What the page shows about a claim, kept in the session between reruns."""
+    values = snapshot.values or {}
+    return {
+        "order_value": values.get("order_value", 0),
+        "customer_tier": values.get("customer_tier", "Unknown"),
+        "refund_status": values.get("refund_status", "Pending"),
+        "paused": "human_review" in (snapshot.next or ()),
+    }
+
+def run_claim(graph_input, config, update=None):
+    """
+    Runs the graph on the pool and yields ("node", name) as each node
+    finishes, then ("done", summary) or ("error", exception).
+    """
+    graph = get_graph()
+    events = queue.Queue()
+
+    def produce():
+        try:
+            if update:
+                graph.update_state(config, update)
+            run_config = {**config, "callbacks": tracing.callbacks()}
+            for event in graph.stream(graph_input, config=run_config, stream_mode="updates"):
+                for node in event:
+                    if not node.startswith("__"):  # skip "__interrupt__"
+                        events.put(("node", node))
+            events.put(("done", summarize(graph.get_state(config))))
+        except Exception as e:
+            events.put(("error", e))
+
+    get_pool().submit(produce)
+    while True:
+        kind, payload = events.get()
+        yield kind, payload
+        if kind != "node":
+            return
+
+def run_with_progress(graph_input, update=None):
+    """
+    Streams one graph run into a status box, node by node. A claim parked
+    at the vision step is handed to the job queue for the claim workers.
+    """
+    config = {"configurable": {"thread_id": st.session_state.thread_id}}
+    with st.status("🤖 AI Agent is processing your claim...", expanded=True) as status:
+        for kind, payload in run_claim(graph_input, config, update):
+            if kind == "node":
+                status.write(f"✅ {NODE_LABELS.get(payload, payload)}")
+            elif kind == "done":
+                st.session_state.claim = payload
+                status.update(label="Claim processed", state="complete", expanded=False)
+            elif isinstance(payload, VisionUnavailableError):
+                # The checkpoint stays at the vision step; a worker (worker.py) resumes it from there
+                values = get_graph().get_state(config).values
+                job_queue.park(values["claim_id"], values["image_paths"], st.session_state.thread_id)
+                st.session_state.claim = {"parked": True}
+                status.update(label="Claim parked", state="error")
+            else:
+                st.session_state.claim = {"error": f"{type(payload).__name__}: {payload}"}
+                status.update(label="Claim failed", state="error")
+
+def decide_claim(refund_status):
+    """
+    Applies a manager's decision the way the review queue does: claim the
+    entry, check the thread is still paused, resume, and give the claim up
+    if the run fails. A claim decided elsewhere is only re-read.
+    """
+    thread_id = st.session_state.thread_id
+    config = {"configurable": {"thread_id": thread_id}}
+    owner = str(uuid.uuid4())
+    pool = get_pool()
+    if pool.submit(review_queue.claim, thread_id, owner).result():
+        snapshot = pool.submit(get_graph().get_state, config).result()
+        if "human_review" in (snapshot.next or ()):
+            run_with_progress(None, {"refund_status": refund_status})
+            if "error" in st.session_state.claim:
+                pool.submit(review_queue.unclaim, thread_id, owner).result()
+            return
+        # Resumed elsewhere without closing its entry
+        pool.submit(review_queue.resolve, thread_id, snapshot.values.get("refund_status")).result()
+    snapshot = pool.submit(get_graph().get_state, config).result()
+    st.session_state.claim = {**summarize(snapshot), "taken": True}
+
 st.title("📦 Logistics Damage Claim Agent")
 st.markdown("Upload evidence of damage to initiate an automated refund claim.")
 
 # --- Session State Setup ---
+# Each browser session works on its own graph thread; a new claim starts a new one
 if "thread_id" not in st.session_state:
-    st.session_state.thread_id = "web_session_001"
-
-config = {"configurable": {"thread_id": st.session_state.thread_id}}
+    st.session_state.thread_id = str(uuid.uuid4())
+    st.session_state.claim = None
 
 # --- Sidebar: Input ---
 with st.sidebar:
     st.header("📝 New Claim")
     claim_id = st.text_input("Order ID", value="ORD-123", help="Try ORD-123 for High Value, ORD-456 for Low Value")
     uploaded_files = st.file_uploader("Upload Evidence", type=["jpg", "png", "jpeg", "mp4", "mov"], accept_multiple_files=True)
-    
+
     if st.button("🚀 Submit Claim", type="primary"):
         if uploaded_files and claim_id:
-            # Save the file locally so the Vision Node can read it
-            os.makedirs("uploads", exist_ok=True)
-            saved_paths = []
-            
-            for uploaded_file in uploaded_files:
-                file_path = os.path.join("uploads", uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                saved_paths.append(file_path)
-            
+            st.session_state.thread_id = str(uuid.uuid4())
+            thread_id = st.session_state.thread_id
+
+            # Save the files so the Vision Node can read them, in parallel on the pool
+            # (content-addressed, so identical uploads are stored once)
+            saved_paths = list(get_pool().map(
+                lambda f: evidence_store.store_bytes(f.getvalue(), f.name, ref=thread_id),
+                uploaded_files,
+            ))
             st.toast(f"Uploaded {len(saved_paths)} files.", icon="💾")
-            
+
             # Initialize Graph State
             initial_state = {
                 "claim_id": claim_id,
                 "image_paths": saved_paths,
+                "submitted_at": time.time(),
                 "messages": [],
                 "refund_status": "Pending"
             }
-            
-            # Run the Graph
-            with st.spinner("🤖 AI Agent is processing your claim..."):
-                for event in graph.stream(initial_state, config=config):
-                    pass # Just run to the next breakpoint or end
-            st.rerun()
+            run_with_progress(initial_state)
         else:
             st.error("Please provide an Order ID and at least one Image/Video.")
 
 # --- Main Area: Status & Human Loop ---
 
-# Get current state of the graph
-snapshot = graph.get_state(config)
+# Shown from the session; the graph state is only read again after a run
+claim = st.session_state.claim
+
+if claim and claim.get("parked"):
+    st.warning("⏸️ The damage-analysis service is unavailable. Your claim is saved "
+               "and queued for the claim workers, which retry it in the background.")
+elif claim and claim.get("error"):
+    st.error(f"Error processing claim: {claim['error']}")
+elif claim:
+    if claim.get("taken"):
+        st.info("ℹ️ Another reviewer already decided this claim, or is deciding it now.")
 
-if snapshot.values:
     # Display Current State
     col1, col2, col3 = st.columns(3)
-    col1.metric("Order Value", f"${snapshot.values.get('order_value', 0)}")
-    col2.metric("Customer Tier", snapshot.values.get('customer_tier', 'Unknown'))
-    col3.metric("Refund Status", snapshot.values.get('refund_status', 'Pending'))
+    col1.metric("Order Value", f"${claim['order_value']}")
+    col2.metric("Customer Tier", claim['customer_tier'])
+    col3.metric("Refund Status", claim['refund_status'])
 
     st.divider()
 
     # Check if we are paused for Human Review
-    if snapshot.next and "human_review" in snapshot.next:
+    if claim["paused"]:
         st.warning("⚠️ **Action Required:** High Value Claim Detected.")
         st.write("The AI has flagged this claim for manual approval because the value exceeds $1000.")
-        
+
         col_a, col_b = st.columns(2)
         with col_a:
-            if st.button("✅ Approve Refund"):
-                graph.update_state(config, {"refund_status": "Manager Approved"})
-                for event in graph.stream(None, config=config): pass
-                st.rerun()
+            approve = st.button("✅ Approve Refund")
         with col_b:
-            if st.button("❌ Reject Claim"):
-                graph.update_state(config, {"refund_status": "Rejected"})
-                for event in graph.stream(None, config=config): pass
-                st.rerun()
-    
-    elif snapshot.values.get("refund_status") in ["Approved", "Manager Approved"]:
-        st.success("🎉 Claim has been finalized and refund processed!")
\ No newline at end of file
+            reject = st.button("❌ Reject Claim")
+        if approve or reject:
+            decide_claim(review_queue.APPROVED if approve else review_queue.REJECTED)
+            st.rerun()
+
+    elif claim["refund_status"] in ["Approved", "Manager Approved"]:
+        st.success("🎉 Claim has been finalized and refund processed!")
+    elif claim["refund_status"] == "Rejected":
+        st.error("❌ Claim rejected.")
@@ -0,0 +1,249 @@
+"""
+batch_runner.py : pushes a file of claims through the compiled claim graph
+with bounded asyncio concurrency.
+
+Usage:
+    python batch_runner.py claims.jsonl --concurrency 16
+    python batch_runner.py claims.csv --report report.json
+
+Input rows need a `claim_id` and `image_paths` (a JSON list, or a
+`;`-separated string in CSV files). An optional `thread_id` is reused,
+otherwise every claim gets a fresh one.
+
+Claims whose vision call could not get a verdict are reported as parked.
+Their threads keep the checkpoint, so a later run picks them up where they
+stopped:
+
+    python batch_runner.py --retry-parked report.json
+
+With --enqueue the claims go to the durable job queue instead, for the
+worker pool (worker.py) to process.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+
+# --- PATH HANDLER ---
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- 1. Loading Claims ---
+def _parse_paths(value):
+    if isinstance(value, list):
+        return value
+    if not value:
+        return []
+    value = value.strip()
+    if value.startswith("["):
+        return json.loads(value)
+    return [p.strip() for p in value.split(";") if p.strip()]
+
+
+def load_claims(path):
+    """Reads claims from a .jsonl or .csv file into initial graph states."""
+    claims = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for row in rows:
+            claims.append({
+                "claim_id": row["claim_id"],
+                "image_paths": _parse_paths(row.get("image_paths")),
+                "thread_id": row.get("thread_id") or str(uuid.uuid4()),
+            })
+    return claims
+
+
+# --- 2. Running a Single Claim ---
+async def _run_claim(graph, claim, semaphore, callbacks=None):
+    from tools.llm_resilience import VisionUnavailableError
+
+    thread_id = claim.get("thread_id") or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    if callbacks:
+        config["callbacks"] = callbacks
+    initial_state = {
+        "claim_id": claim["claim_id"],
+        "image_paths": claim.get("image_paths", []),
+        "submitted_at": time.time(),
+        "messages": [],
+        "refund_status": "Pending",
+    }
+    # A parked claim continues from its checkpoint (None input means 'continue')
+    graph_input = None if claim.get("resume") else initial_state
+    result = {"claim_id": claim["claim_id"], "thread_id": thread_id}
+
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            await graph.ainvoke(graph_input, config=config)
+            snapshot = await graph.aget_state(config)
+            result["refund_status"] = snapshot.values.get("refund_status")
+            result["paused"] = "human_review" in (snapshot.next or ())
+            result["precheck_reason"] = snapshot.values.get("precheck_reason")
+        except VisionUnavailableError as e:
+            result["parked"] = str(e)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency"] = time.perf_counter() - started
+    return result
+
+
+# --- 3. Batch Entry Point ---
+async def _run_prefetched(graph, claims, semaphore, callbacks):
+    """
+    Runs the claims while resolving their orders with bulk queries, so
+    crm_node hits the hot-order cache instead of making one round-trip per
+    claim. Orders are fetched a window at a time, each once the claims two
+    windows back have finished, so a batch larger than ORDER_CACHE_SIZE
+    doesn't evict its own orders before they are used. At most three
+    windows are ever newer in the LRU than an order still waiting for its
+    claim, hence a quarter of the cache per window.
+    """
+    from tools import db_tools
+
+    window = db_tools.ORDER_CACHE_SIZE // 4
+    order_ids = [c["claim_id"] for c in claims]
+    finished = 0
+    progress = asyncio.Event()
+
+    async def run(claim):
+        nonlocal finished
+        try:
+            return await _run_claim(graph, claim, semaphore, callbacks)
+        finally:
+            finished += 1
+            progress.set()
+
+    async def prefetch():
+        for start in range(window, len(order_ids), window):
+            while finished < start - window:
+                progress.clear()
+                await progress.wait()
+            await asyncio.to_thread(db_tools.get_order_details_many, order_ids[start:start + window])
+
+    if not window:
+        return await asyncio.gather(*(run(c) for c in claims))
+    await asyncio.to_thread(db_tools.get_order_details_many, order_ids[:window])
+    prefetcher = asyncio.create_task(prefetch())
+    try:
+        return await asyncio.gather(*(run(c) for c in claims))
+    finally:
+        prefetcher.cancel()
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_batch(claims, concurrency=8, graph=None, callbacks=None):
+    """
+    Runs every claim through the graph, at most `concurrency` at a time.
+    Returns a report with per-claim results, the claims paused at
+    `human_review`, throughput and latency percentiles. `callbacks` are
+    attached to every run (e.g. timing handlers); by default that is the
+    shared tracer when TRACE_ENDPOINT is set.
+    """
+    if callbacks is None:
+        from tools import tracing
+        callbacks = tracing.callbacks()
+    from main import node_executor
+    if graph is None:
+        from main import get_graph
+        graph = get_graph()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    # Sync nodes need a thread each, so their pool must be at least as
+    # wide as the semaphore or it becomes the real limit.
+    with node_executor(concurrency):
+        results = await _run_prefetched(graph, claims, semaphore, callbacks)
+    elapsed = time.perf_counter() - started
+
+    latencies = [r["latency"] for r in results]
+    return {
+        "total": len(results),
+        "completed": sum(1 for r in results if "error" not in r and "parked" not in r and not r["paused"]),
+        "paused": [r for r in results if r.get("paused")],
+        "failed": [r for r in results if "error" in r],
+        # Vision model unavailable; retry with --retry-parked
+        "parked": [r for r in results if "parked" in r],
+        # Claims the precheck rejected without a vision call
+        "vision_skipped": sum(1 for r in results if r.get("precheck_reason")),
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "claims_per_sec": len(results) / elapsed if elapsed else 0.0,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "latency_max": max(latencies, default=0.0),
+        "results": results,
+    }
+
+
+def print_report(report):
+    print("\n--- 📊 BATCH REPORT ---")
+    print(f"Claims: {report['total']} (concurrency={report['concurrency']})")
+    print(f"Completed: {report['completed']}  Paused for review: {len(report['paused'])}  "
+          f"Parked: {len(report['parked'])}  Failed: {len(report['failed'])}")
+    print(f"Vision calls avoided by precheck: {report['vision_skipped']}")
+    print(f"Throughput: {report['claims_per_sec']:.2f} claims/sec over {report['elapsed']:.2f}s")
+    print(f"Latency: p50={report['latency_p50']:.3f}s p95={report['latency_p95']:.3f}s max={report['latency_max']:.3f}s")
+    for r in report["paused"]:
+        print(f"   🛑 {r['claim_id']} awaiting human review (thread_id={r['thread_id']})")
+    for r in report["parked"]:
+        print(f"   ⏸️ {r['claim_id']} parked, vision model unavailable (thread_id={r['thread_id']})")
+    for r in report["failed"]:
+        print(f"   ❌ {r['claim_id']} failed: {r['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a file of damage claims through the claim graph.")
+    parser.add_argument("path", nargs="?", help="Claims file (.jsonl or .csv)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max claims in flight")
+    parser.add_argument("--report", help="Optional path to write the JSON report")
+    parser.add_argument("--retry-parked", metavar="REPORT", help="Resume the parked claims of an earlier report")
+    parser.add_argument("--enqueue", action="store_true", help="Submit to the job queue for worker.py instead")
+    args = parser.parse_args(argv)
+
+    if args.retry_parked:
+        with open(args.retry_parked, encoding="utf-8") as f:
+            parked = json.load(f).get("parked", [])
+        claims = [{"claim_id": r["claim_id"], "thread_id": r["thread_id"], "resume": True} for r in parked]
+    elif args.path:
+        claims = load_claims(args.path)
+    else:
+        parser.error("give a claims file or --retry-parked REPORT")
+
+    if args.enqueue:
+        from tools import job_queue
+        from tools.db_tools import setup_db
+
+        setup_db()
+        # Parked threads resume from their checkpoint, like any other leased job
+        job_queue.submit_many(claims)
+        job_queue.requeue([c["thread_id"] for c in claims if c.get("resume")])
+        print(f"📥 Queued {len(claims)} claims for the worker pool: {job_queue.stats()}")
+        return
+    report = asyncio.run(run_batch(claims, concurrency=args.concurrency))
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+checkpoint_bench.py : checkpoint write latency per node transition.
+
+Runs simulated claims (text evidence, so no model calls) through the claim
+graph with `MemorySaver` and with `SqliteCheckpointer`, timing every `put`
+and `put_writes` call the graph makes.
+
+Usage:
+    python benchmarks/checkpoint_bench.py --claims 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+
+def _timed(saver, samples):
+    """Wraps the saver's write methods so every call is timed into `samples`."""
+    for name in ("put", "put_writes"):
+        original = getattr(saver, name)
+
+        def wrapper(*args, _original=original, _name=name, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                samples[_name].append(time.perf_counter() - started)
+
+        setattr(saver, name, wrapper)
+    return saver
+
+
+def _summary(values):
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+    return (f"n={len(ordered)} mean={sum(ordered) / len(ordered) * 1e6:.0f}us "
+            f"p50={pick(50) * 1e6:.0f}us p95={pick(95) * 1e6:.0f}us p99={pick(99) * 1e6:.0f}us")
+
+
+def run(saver, claims):
+    import contextlib
+    import io
+    import main
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.init_runtime()
+    # Sequential and ungated, so repeated claim IDs still take the full path
+    graph = main.build_graph(checkpointer=saver, topology="sequential")
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(claims):
+            config = {"configurable": {"thread_id": f"bench-{i}"}}
+            claim_id = "ORD-123" if i % 2 else "ORD-456"
+            graph.invoke({"claim_id": claim_id, "image_paths": ["bench"], "messages": []}, config)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--claims", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    from langgraph.checkpoint.memory import MemorySaver
+    from tools.checkpointer import SqliteCheckpointer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        savers = {
+            "MemorySaver": MemorySaver(),
+            "SqliteCheckpointer": SqliteCheckpointer(os.path.join(tmp, "bench.db")),
+        }
+        for name, saver in savers.items():
+            samples = {"put": [], "put_writes": []}
+            elapsed = run(_timed(saver, samples), args.claims)
+            print(f"\n{name}: {args.claims} claims in {elapsed:.2f}s")
+            print(f"   put        {_summary(samples['put'])}")
+            print(f"   put_writes {_summary(samples['put_writes'])}")
+
+        sqlite_saver = savers["SqliteCheckpointer"]
+        size = os.path.getsize(sqlite_saver.path)
+        print(f"\nSQLite file: {size / 1024:.0f} KiB, "
+              f"{sqlite_saver.conn.execute('SELECT COUNT(*) FROM checkpoints').fetchone()[0]} checkpoints kept")
+        sqlite_saver.close()
+
+
+if __name__ == "__main__":
+    main()
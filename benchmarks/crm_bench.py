@@ -0,0 +1,81 @@
+"""
+crm_bench.py : order lookup latency at production table sizes.
+
+Generates a synthetic orders table with tools.order_import, then times
+uncached `get_order_details` lookups (hits and misses) and bulk
+`get_order_details_many` batches against it.
+
+Usage:
+    python benchmarks/crm_bench.py --orders 20000000 --lookups 20000
+    python benchmarks/crm_bench.py --db /path/to/claims.db   # an existing table
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from tools import db_tools
+from tools.order_import import generate_orders, import_orders
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+    return f"p50={pick(50) * 1e6:.0f}us p95={pick(95) * 1e6:.0f}us p99={pick(99) * 1e6:.0f}us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CRM lookup latency benchmark.")
+    parser.add_argument("--orders", type=int, default=5_000_000, help="Synthetic orders to generate")
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=1000, help="IDs per get_order_details_many call")
+    parser.add_argument("--db", help="Benchmark an existing claims.db instead of generating one")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db_tools.DB_PATH = args.db
+        count = db_tools.get_connection().execute("SELECT MAX(rowid) FROM orders").fetchone()[0]
+        sample_ids = [r[0] for r in db_tools.get_connection().execute(
+            "SELECT order_id FROM orders WHERE rowid IN (SELECT abs(random()) % ? + 1 FROM orders LIMIT ?)",
+            (count, args.lookups))]
+    else:
+        db_tools.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="claims-crm-"), "claims.db")
+        report = import_orders(generate_orders(args.orders))
+        size = os.path.getsize(db_tools.DB_PATH) / 2 ** 20
+        print(f"📦 Generated {report['loaded']} orders in {report['seconds']:.1f}s "
+              f"({report['rows_per_sec']:.0f} rows/sec, index build {report['index_seconds']:.1f}s, {size:.0f} MiB)")
+        rng = random.Random(3)
+        sample_ids = [f"ORD-{rng.randrange(args.orders):010d}" for _ in range(args.lookups)]
+
+    # Measure the database, not the LRU
+    db_tools.ORDER_CACHE_SIZE = 0
+    db_tools.invalidate_order_cache()
+
+    hits = []
+    for order_id in sample_ids:
+        started = time.perf_counter()
+        db_tools.get_order_details(order_id)
+        hits.append(time.perf_counter() - started)
+    misses = []
+    for i in range(min(2000, args.lookups)):
+        started = time.perf_counter()
+        db_tools.get_order_details(f"MISSING-{i}")
+        misses.append(time.perf_counter() - started)
+    batches = []
+    for start in range(0, len(sample_ids), args.batch):
+        started = time.perf_counter()
+        db_tools.get_order_details_many(sample_ids[start:start + args.batch])
+        batches.append(time.perf_counter() - started)
+
+    print(f"   get_order_details (hit)   {percentiles(hits)}")
+    print(f"   get_order_details (miss)  {percentiles(misses)}")
+    print(f"   get_order_details_many    {percentiles(batches)} per {args.batch} IDs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+resilience_bench.py : the vision call layer under slow tails, flaky and dead
+endpoints, against the local stub model.
+
+    tail     5% of requests take --tail-latency seconds: no hedging vs p95 hedging
+    flaky    20% of requests fail with HTTP 500: no retries vs retries
+    outage   every request fails: claims are parked (never approved) and the
+             circuit breaker turns the rest into fast failures
+
+Usage:
+    python benchmarks/resilience_bench.py --claims 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from run_bench import make_images, percentiles
+from stub_llm_server import start_stub_server
+
+SCENARIOS = (
+    ("tail", "no hedging", {"tail_rate": 0.05}, {"VISION_HEDGE_DELAY": "0"}),
+    ("tail", "hedge at p95", {"tail_rate": 0.05}, {"VISION_HEDGE_DELAY": "p95"}),
+    ("flaky", "no retries", {"error_rate": 0.2}, {"VISION_RETRIES": "0"}),
+    ("flaky", "2 retries", {"error_rate": 0.2}, {"VISION_RETRIES": "2"}),
+    ("outage", "breaker", {"error_rate": 1.0}, {"VISION_RETRIES": "2"}),
+)
+
+
+async def run_claims(images, concurrency):
+    from nodes import vision_node
+    from tools.llm_resilience import VisionUnavailableError
+
+    semaphore = asyncio.Semaphore(concurrency)
+    outcome = {"latencies": [], "verdicts": 0, "approved_blind": 0, "parked": 0}
+
+    async def one(i, path):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await vision_node.avision_node({"claim_id": f"BENCH-{i}", "image_paths": [path]})
+                outcome["verdicts"] += 1
+                outcome["latencies"].append(time.perf_counter() - started)
+            except VisionUnavailableError:
+                outcome["parked"] += 1
+
+    await asyncio.gather(*(one(i, path) for i, path in enumerate(images)))
+    return outcome
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retries, circuit breaker and hedging against a stub model.")
+    parser.add_argument("--claims", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.03)
+    parser.add_argument("--tail-latency", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="claims-resilience-")
+    os.environ.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "VISION_CACHE": "0",
+        "PHASH_INDEX": "0",
+        "TRIAGE": "0",
+        "CLAIMS_LOG_LEVEL": "ERROR",
+        "VISION_BACKOFF_BASE": "0.05",
+        "VISION_BREAKER_RESET": "60",
+        "VISION_ATTEMPT_TIMEOUT": "10",
+    })
+    from tools import llm_client, llm_resilience, metrics
+    metrics.configure_logging()
+    images = make_images(workdir, args.claims)
+
+    print(f"--- 🛡️ RESILIENCE BENCH: {args.claims} calls, c={args.concurrency}, "
+          f"latency {args.latency}s, tail {args.tail_latency}s ---")
+    for scenario, mode, stub_options, env in SCENARIOS:
+        stub = start_stub_server(latency=args.latency, jitter=args.jitter, tail_latency=args.tail_latency,
+                                 seed=7, **stub_options)
+        os.environ.update({"OPENROUTER_BASE_URL": stub.base_url, "VISION_HEDGE_DELAY": "0",
+                           "VISION_RETRIES": "2", **env})
+        llm_client.reset_clients()
+        llm_resilience.reset()
+        if env.get("VISION_HEDGE_DELAY") == "p95":
+            # Fill the latency window so the hedge delay is the observed p95
+            asyncio.run(run_claims(images[:llm_resilience.MIN_HEDGE_SAMPLES * 2], args.concurrency))
+            stub.requests = 0
+
+        started = time.perf_counter()
+        outcome = asyncio.run(run_claims(images, args.concurrency))
+        elapsed = time.perf_counter() - started
+        stub.shutdown()
+        lat = percentiles(outcome["latencies"])
+        print(f"   {scenario:<7} {mode:<13} verdicts={outcome['verdicts']:<4} parked={outcome['parked']:<4} "
+              f"p50={lat['p50']:.2f}s p95={lat['p95']:.2f}s p99={lat['p99']:.2f}s  "
+              f"requests={stub.requests:<4} ({elapsed:.1f}s wall)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+review_bench.py : throughput of bulk approve/reject from the review queue.
+
+Pauses N high-value claims at `human_review` (simulated evidence, so no
+model calls), then resumes them through review_queue.decide_many at each
+concurrency level and reports resumed claims/sec. Also times a page of
+`list_pending` against the filled queue.
+
+Usage:
+    python benchmarks/review_bench.py --claims 600 --concurrency 1,8,32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk resume benchmark for the review queue.")
+    parser.add_argument("--claims", type=int, default=600, help="Claims paused for review (split across levels)")
+    parser.add_argument("--concurrency", default="1,8,32")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="claims-review-")
+    os.environ.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "CLAIMS_LOG_LEVEL": "WARNING",
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.db"),
+        "VISION_CACHE_PATH": os.path.join(workdir, "vision_cache.db"),
+        "PHASH_INDEX_PATH": os.path.join(workdir, "evidence_index.db"),
+    })
+
+    from tools import db_tools, review_queue
+    db_tools.DB_PATH = os.path.join(workdir, "claims.db")
+    import main as claims_main
+    from batch_runner import run_batch
+    graph = claims_main.get_graph()
+
+    conn = db_tools.get_connection()
+    rows = [(f"HV-{i:06d}", 1001.0 + i, "VIP" if i % 3 == 0 else "REGULAR") for i in range(args.claims)]
+    conn.executemany("INSERT OR REPLACE INTO orders VALUES (?,?,?)", rows)
+    conn.commit()
+
+    claims = [{"claim_id": order_id, "image_paths": ["simulated evidence"]} for order_id, _, _ in rows]
+    report = asyncio.run(run_batch(claims, concurrency=32, graph=graph))
+    print(f"⏸️  Paused {len(report['paused'])} claims in {report['elapsed']:.2f}s")
+
+    started = time.perf_counter()
+    for _ in range(100):
+        review_queue.list_pending(tier="VIP", order_by="value", limit=50, offset=50)
+    print(f"📄 list_pending (VIP by value, page 2): {(time.perf_counter() - started) * 10:.2f}ms per page "
+          f"over {review_queue.count_pending()} pending")
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    pending = review_queue.pending_thread_ids()
+    share = len(pending) // len(levels)
+    for i, concurrency in enumerate(levels):
+        batch = pending[i * share:(i + 1) * share]
+        result = asyncio.run(review_queue.decide_many(graph, batch, approve=bool(i % 2 == 0), concurrency=concurrency))
+        print(f"   c={concurrency:<3} {result['decision']:<16} {result['resumed']} resumed in {result['elapsed']:.2f}s "
+              f"-> {result['claims_per_sec']:.1f} claims/sec (failed={len(result['failed'])})")
+    print(f"Left in queue: {review_queue.count_pending()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+run_bench.py : offline end-to-end benchmark of the claim graph.
+
+Starts the local stub model, seeds a throwaway claims.db with a large
+synthetic order set, and drives the full StateGraph (through
+batch_runner.run_batch) at each requested concurrency. Reports per-node
+p50/p95/p99 latency, claims/sec, checkpoint write overhead and peak RSS.
+
+Usage:
+    python benchmarks/run_bench.py --claims 400 --concurrency 1,8,32
+    python benchmarks/run_bench.py --save-baseline       # record a baseline
+    python benchmarks/run_bench.py --compare             # fail on regressions
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from checkpoint_bench import _timed
+from stub_llm_server import start_stub_server
+
+TIERS = ("REGULAR", "REGULAR", "REGULAR", "VIP")
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+    return {"count": len(ordered), "p50": pick(50), "p95": pick(95), "p99": pick(99)}
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Times every graph node run via the callback events LangGraph emits."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = {}
+        self.samples = {}
+        self.errors = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node's own run, not the runnables nested inside it
+        if node and kwargs.get("name") == node:
+            with self.lock:
+                self.started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self.lock:
+            entry = self.started.pop(run_id, None)
+            if entry:
+                self.samples.setdefault(entry[0], []).append(time.perf_counter() - entry[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        with self.lock:
+            entry = self.started.pop(run_id, None)
+            if entry:
+                self.errors[entry[0]] = self.errors.get(entry[0], 0) + 1
+
+
+def seed_orders(db_tools, count, seed=7):
+    """Bulk-inserts `count` synthetic orders; returns their IDs."""
+    rng = random.Random(seed)
+    conn = db_tools.get_connection()
+    rows = [(f"ORD-{i:08d}", round(rng.lognormvariate(5, 1.2), 2), rng.choice(TIERS)) for i in range(count)]
+    conn.executemany("INSERT OR REPLACE INTO orders VALUES (?,?,?)", rows)
+    conn.commit()
+    db_tools.invalidate_order_cache()
+    return [r[0] for r in rows]
+
+
+def make_images(directory, count, seed=7):
+    """Writes `count` distinct 1280x960 JPEGs to use as evidence."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        image = cv2.GaussianBlur((rng.random((960, 1280, 3)) * 255).astype("uint8"), (9, 9), 0)
+        path = os.path.join(directory, f"evidence_{i}.jpg")
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        paths.append(path)
+    return paths
+
+
+def run_level(graph, claims, concurrency):
+    from batch_runner import run_batch
+
+    timer = NodeTimer()
+    samples = {"put": [], "put_writes": []}
+    saver = graph.checkpointer
+    originals = {name: getattr(saver, name) for name in samples}
+    _timed(saver, samples)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = asyncio.run(run_batch(claims, concurrency=concurrency, graph=graph, callbacks=[timer]))
+    finally:
+        for name, method in originals.items():
+            setattr(saver, name, method)
+
+    latencies = [r["latency"] for r in report["results"]]
+    checkpoint_total = sum(samples["put"]) + sum(samples["put_writes"])
+    return {
+        "concurrency": concurrency,
+        "claims": report["total"],
+        "failed": len(report["failed"]),
+        "paused": len(report["paused"]),
+        "claims_per_sec": report["claims_per_sec"],
+        "claim_latency": percentiles(latencies),
+        "nodes": {
+            node: {**percentiles(values), "errors": timer.errors.get(node, 0)}
+            for node, values in sorted(timer.samples.items())
+        },
+        "checkpoint": {
+            "put": percentiles(samples["put"]),
+            "put_writes": percentiles(samples["put_writes"]),
+            "ms_per_claim": checkpoint_total / max(1, report["total"]) * 1000,
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns human-readable regressions of `results` against `baseline`."""
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    problems = []
+    for level in results["levels"]:
+        old = previous.get(level["concurrency"])
+        if not old:
+            continue
+        if level["claims_per_sec"] < old["claims_per_sec"] * (1 - tolerance):
+            problems.append(f"c={level['concurrency']}: claims/sec {old['claims_per_sec']:.1f} -> {level['claims_per_sec']:.1f}")
+        if level["claim_latency"]["p95"] > old["claim_latency"]["p95"] * (1 + tolerance):
+            problems.append(f"c={level['concurrency']}: p95 {old['claim_latency']['p95']:.3f}s -> {level['claim_latency']['p95']:.3f}s")
+    return problems
+
+
+def print_results(results):
+    for level in results["levels"]:
+        lat = level["claim_latency"]
+        print(f"\n--- concurrency={level['concurrency']} ---")
+        print(f"   {level['claims_per_sec']:.1f} claims/sec, claim p50={lat['p50']:.3f}s p95={lat['p95']:.3f}s p99={lat['p99']:.3f}s"
+              f" (failed={level['failed']}, paused={level['paused']})")
+        for node, stats in level["nodes"].items():
+            print(f"   {node:<13} p50={stats['p50'] * 1000:7.1f}ms p95={stats['p95'] * 1000:7.1f}ms p99={stats['p99'] * 1000:7.1f}ms errors={stats['errors']}")
+        cp = level["checkpoint"]
+        print(f"   checkpoint    put p95={cp['put']['p95'] * 1000:.2f}ms, {cp['ms_per_claim']:.2f}ms per claim")
+    print(f"\nPeak RSS: {results['peak_rss_mb']:.0f} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the claim graph against a stub model.")
+    parser.add_argument("--claims", type=int, default=400, help="Claims per concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--orders", type=int, default=200_000, help="Synthetic orders seeded into claims.db")
+    parser.add_argument("--images", type=int, default=16, help="Distinct evidence images")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also write {BASELINE_PATH}")
+    parser.add_argument("--compare", action="store_true", help="Exit non-zero on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    parser.add_argument("--topology", default="gated", help="Graph topology: gated, parallel or sequential")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="claims-bench-")
+    stub = start_stub_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=7)
+    os.environ.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_BASE_URL": stub.base_url,
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.db"),
+        "VISION_CACHE_PATH": os.path.join(workdir, "vision_cache.db"),
+        "PHASH_INDEX_PATH": os.path.join(workdir, "evidence_index.db"),
+        # Every claim should pay for a model call
+        "VISION_CACHE": "0",
+        "PHASH_INDEX": "0",
+        "TRIAGE": "0",
+        # Node logs go to stderr; keep them out of the report
+        "CLAIMS_LOG_LEVEL": "WARNING",
+    })
+
+    from tools import db_tools
+    db_tools.DB_PATH = os.path.join(workdir, "claims.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        main.init_runtime()
+        graph = main.build_graph(topology=args.topology)
+    order_ids = seed_orders(db_tools, args.orders)
+    images = make_images(workdir, args.images)
+
+    rng = random.Random(11)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {k: getattr(args, k) for k in ("claims", "orders", "images", "latency", "jitter", "error_rate", "topology")},
+        "levels": [],
+    }
+    # Distinct orders across all levels, so the precheck's duplicate-claim
+    # gate doesn't turn repeats into cheap rejections
+    pool = rng.sample(order_ids, min(len(order_ids), args.claims * len(levels)))
+    for i, concurrency in enumerate(levels):
+        picked = pool[i * args.claims:(i + 1) * args.claims]
+        claims = [{"claim_id": order_id, "image_paths": [rng.choice(images)]} for order_id in picked]
+        results["levels"].append(run_level(graph, claims, concurrency))
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print_results(results)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {BASELINE_PATH}")
+
+    if args.compare:
+        if not os.path.exists(BASELINE_PATH):
+            print("⚠️ No baseline to compare against; run with --save-baseline first.")
+            return 1
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"❌ Regression: {problem}")
+        if problems:
+            return 1
+        print("✅ No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
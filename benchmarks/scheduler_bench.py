@@ -0,0 +1,120 @@
+"""
+scheduler_bench.py : who waits for the vision quota, first-come-first-served vs by priority.
+
+Against the local stub model, with VISION_RPM/VISION_TPM set well below
+demand: a burst of low-value REGULAR claims arrives at once, and VIP and
+high-value claims trickle in over the next seconds. The async vision node
+runs for every claim. The bench reports time to verdict per class, the
+longest wait of any claim (starvation), and the request rate the stub saw
+against the quota.
+
+    fifo      every claim gets the same head start, so arrival order decides
+    priority  the default SCHED_* head starts for tier and order value
+
+Usage:
+    python benchmarks/scheduler_bench.py --regular 240 --priority 40 --rpm 600
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from run_bench import make_images, percentiles
+from stub_llm_server import start_stub_server
+
+MODES = (
+    ("fifo", {"SCHED_TIER_HEAD_START": "", "SCHED_VALUE_HEAD_START": "0"}),
+    ("priority", {}),
+)
+
+
+def make_claims(images, regular, priority, arrival_window, seed=5):
+    rng = random.Random(seed)
+    claims = [{"kind": "regular", "delay": 0.0, "customer_tier": "REGULAR",
+               "order_value": round(rng.uniform(20, 120), 2)} for _ in range(regular)]
+    for i in range(priority):
+        vip = i % 2 == 0
+        claims.append({"kind": "vip" if vip else "high-value", "delay": rng.uniform(0.5, arrival_window),
+                       "customer_tier": "VIP" if vip else "REGULAR",
+                       "order_value": round(rng.uniform(50, 300) if vip else rng.uniform(900, 3000), 2)})
+    for i, claim in enumerate(claims):
+        claim["claim_id"] = f"SCHED-{i:05d}"
+        claim["image_paths"] = [images[i % len(images)]]
+    return claims
+
+
+async def run_mode(claims):
+    from nodes import vision_node
+
+    results = []
+
+    async def one(claim):
+        await asyncio.sleep(claim["delay"])
+        state = {k: claim[k] for k in ("claim_id", "image_paths", "customer_tier", "order_value")}
+        state["submitted_at"] = time.time()
+        started = time.perf_counter()
+        await vision_node.avision_node(state)
+        results.append((claim["kind"], time.perf_counter() - started))
+
+    await asyncio.gather(*(one(c) for c in claims))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vision call scheduling under a provider quota.")
+    parser.add_argument("--regular", type=int, default=240, help="Low-value claims in the initial burst")
+    parser.add_argument("--priority", type=int, default=40, help="VIP/high-value claims arriving later")
+    parser.add_argument("--arrival-window", type=float, default=10.0, help="Seconds over which they arrive")
+    parser.add_argument("--rpm", type=int, default=600, help="VISION_RPM quota")
+    parser.add_argument("--tpm", type=int, default=1200000, help="VISION_TPM quota")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub model latency in seconds")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="claims-sched-")
+    stub = start_stub_server(latency=args.latency, jitter=0.05, seed=7)
+    os.environ.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_BASE_URL": stub.base_url,
+        "VISION_CACHE": "0",
+        "PHASH_INDEX": "0",
+        "TRIAGE": "0",
+        "CLAIMS_LOG_LEVEL": "WARNING",
+        "VISION_RPM": str(args.rpm),
+        "VISION_TPM": str(args.tpm),
+        "VISION_RATE_BURST": "2",
+    })
+    from tools import llm_client, metrics, vision_scheduler
+    metrics.configure_logging()
+    images = make_images(workdir, 32)
+    claims = make_claims(images, args.regular, args.priority, args.arrival_window)
+
+    print(f"--- 🚦 SCHEDULER BENCH: {args.regular} regular claims at t=0, {args.priority} VIP/high-value "
+          f"over {args.arrival_window:.0f}s, quota {args.rpm} rpm / {args.tpm} tpm ---")
+    for name, env in MODES:
+        for key in ("SCHED_TIER_HEAD_START", "SCHED_VALUE_HEAD_START"):
+            os.environ.pop(key, None)
+        os.environ.update(env)
+        vision_scheduler.reset()
+        llm_client.reset_clients()
+        metrics.reset()
+        requests_before = stub.requests
+        started = time.perf_counter()
+        results = asyncio.run(run_mode(claims))
+        elapsed = time.perf_counter() - started
+        rate = (stub.requests - requests_before) / elapsed * 60
+        print(f"   {name}: {len(results)} verdicts in {elapsed:.1f}s, stub saw {rate:.0f} requests/min "
+              f"(quota {args.rpm}); slowest claim {max(s for _, s in results):.1f}s")
+        for kind in ("vip", "high-value", "regular"):
+            stats = percentiles([s for k, s in results if k == kind])
+            print(f"      {kind:<11} n={stats['count']:<4} p50={stats['p50']:5.2f}s p95={stats['p95']:5.2f}s "
+                  f"p99={stats['p99']:5.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+startup_bench.py : measures import time and cold start of the claim graph.
+
+Each run starts a fresh interpreter and times three phases: `import main`,
+the first `get_graph()` (runtime init + compile), and the first claim
+pushed through the graph (simulation evidence, so no model call). All
+databases live in a throwaway directory.
+
+Usage:
+    python benchmarks/startup_bench.py --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {repo!r})
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+loaded = set(sys.modules)
+graph = main.get_graph()
+built = time.perf_counter()
+graph.invoke({{"claim_id": "ORD-456", "image_paths": ["startup"], "messages": []}},
+             {{"configurable": {{"thread_id": "startup"}}}})
+done = time.perf_counter()
+print(json.dumps({{
+    "import": imported - started,
+    "get_graph": built - imported,
+    "first_claim": done - built,
+    "heavy_modules_after_import": [m for m in ("langchain_openai", "cv2", "httpx") if m in loaded],
+}}))
+"""
+
+
+def probe(workdir):
+    code = PROBE.format(repo=REPO_DIR)
+    env = dict(os.environ,
+               CLAIMS_LOG_LEVEL="WARNING",
+               CHECKPOINT_DB_PATH=os.path.join(workdir, "checkpoints.db"),
+               VISION_CACHE_PATH=os.path.join(workdir, "vision_cache.db"),
+               PHASH_INDEX_PATH=os.path.join(workdir, "evidence_index.db"),
+               OPENROUTER_API_KEY=os.environ.get("OPENROUTER_API_KEY", "startup-bench"))
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time and cold-start benchmark.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    runs = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix="claims-startup-") as workdir:
+            runs.append(probe(workdir))
+
+    for phase in ("import", "get_graph", "first_claim"):
+        values = sorted(r[phase] for r in runs)
+        print(f"   {phase:<12} median={values[len(values) // 2] * 1000:7.1f}ms "
+              f"min={values[0] * 1000:7.1f}ms max={values[-1] * 1000:7.1f}ms")
+    print(f"   heavy modules loaded by `import main`: {runs[-1]['heavy_modules_after_import'] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
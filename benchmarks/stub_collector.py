@@ -0,0 +1,109 @@
+"""
+stub_collector.py : a local stand-in for a trace collector.
+
+Accepts POSTs of {"spans": [...]} (the format tools/tracing.py exports),
+counts batches, spans and traces, and answers after --latency seconds, so a
+slow collector can be simulated. GET /stats returns the counts as JSON.
+Point the tracer at it with TRACE_ENDPOINT=http://127.0.0.1:<port>/spans.
+
+Usage:
+    python benchmarks/stub_collector.py --port 4318 --latency 0.05
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CollectorServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0):
+        super().__init__(address, CollectorHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.batches = 0
+            self.spans = 0
+            self.bytes = 0
+            self.traces = set()
+            self.kept_because = {}
+
+    def stats(self):
+        with self.lock:
+            return {"batches": self.batches, "spans": self.spans, "bytes": self.bytes,
+                    "traces": len(self.traces), "kept_because": dict(self.kept_because)}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/spans"
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            self._send(200, self.server.stats())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            spans = json.loads(body)["spans"]
+        except (ValueError, KeyError):
+            self._send(400, {"error": "expected {\"spans\": [...]}"})
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        server = self.server
+        with server.lock:
+            server.batches += 1
+            server.spans += len(spans)
+            server.bytes += len(body)
+            for span in spans:
+                server.traces.add(span["trace_id"])
+                reason = span.get("attributes", {}).get("kept_because")
+                if reason:
+                    server.kept_because[reason] = server.kept_because.get(reason, 0) + 1
+        self._send(200, {"accepted": len(spans)})
+
+
+def start_collector(port=0, **options):
+    """Starts the collector on a background thread; returns the server (see `.url`)."""
+    server = CollectorServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="stub-collector", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in trace collector.")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay per batch in seconds")
+    args = parser.parse_args(argv)
+
+    server = CollectorServer(("127.0.0.1", args.port), latency=args.latency)
+    print(f"🧪 Stub collector listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
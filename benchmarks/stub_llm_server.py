@@ -0,0 +1,194 @@
+"""
+stub_llm_server.py : a local stand-in for the OpenAI chat-completions API.
+
+Answers POST /v1/chat/completions (plain or `stream: true`) with a canned
+YES/NO verdict after a configurable delay, failing a configurable share of
+requests with HTTP 500. --tail-rate sends a share of requests to a slow
+tail of --tail-latency seconds. With --token-latency each completion word costs
+extra time (streamed one word per chunk), --description-words pads the
+description like a verbose model, and max_tokens truncates the answer. Usage
+reports each image as IMAGE_TOKENS prompt tokens. Point the vision node at it with
+OPENROUTER_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python benchmarks/stub_llm_server.py --port 8765 --latency 0.8 --jitter 0.2 --error-rate 0.01
+    python benchmarks/stub_llm_server.py --latency 0.3 --token-latency 0.02 --description-words 200
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DAMAGED = "YES. The box is crushed on one corner and the item inside is cracked."
+UNDAMAGED = "NO. The package and item look intact."
+FILLER = "The outer carton shows scuffing consistent with handling in transit and the tape seal is intact."
+
+
+# Vision APIs bill an image as a fixed number of tokens, not by its Base64 size
+IMAGE_TOKENS = 1600
+
+
+def count_prompt_tokens(request):
+    tokens = 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            tokens += IMAGE_TOKENS if part.get("type") == "image_url" else len(part.get("text", "")) // 4
+    return tokens
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 resets connections under benchmark concurrency
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, jitter=0.0, error_rate=0.0, damaged_rate=1.0, seed=None,
+                 token_latency=0.0, description_words=0, tail_rate=0.0, tail_latency=0.0):
+        super().__init__(address, StubHandler)
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.token_latency = token_latency
+        self.description_words = description_words
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.damaged_rate = damaged_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. a hedged request that lost the race
+            self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+
+        with server.lock:
+            server.requests += 1
+            delay = max(0.0, server.random.gauss(server.latency, server.jitter)) if server.jitter else server.latency
+            if server.random.random() < server.tail_rate:
+                delay = server.tail_latency
+            failed = server.random.random() < server.error_rate
+            damaged = server.random.random() < server.damaged_rate
+            if failed:
+                server.errors += 1
+        time.sleep(delay)
+
+        if failed:
+            self._send(500, json.dumps({"error": {"message": "stub: injected failure", "type": "server_error"}}).encode())
+            return
+
+        words = (DAMAGED if damaged else UNDAMAGED).split(" ")
+        filler = FILLER.split(" ")
+        words += [filler[i % len(filler)] for i in range(server.description_words)]
+        cap = request.get("max_completion_tokens") or request.get("max_tokens")
+        if cap:
+            words = words[:cap]
+        content = " ".join(words)
+        prompt_tokens = max(1, count_prompt_tokens(request))
+        completion_tokens = len(words)
+        with server.lock:
+            server.completion_tokens += completion_tokens
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "stub")
+
+        if request.get("stream"):
+            self._stream(completion_id, model, content, usage)
+            return
+
+        time.sleep(server.token_latency * completion_tokens)
+        body = {
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+        self._send(200, json.dumps(body).encode())
+
+    def _stream(self, completion_id, model, content, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, extra=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for word in content.split(" "):
+            if self.server.token_latency:
+                time.sleep(self.server.token_latency)
+            event({"content": word + " "})
+        event({}, finish_reason="stop")
+        event({}, extra={"choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_stub_server(port=0, **options):
+    """Starts the stub on a background thread; returns the server (see `.base_url`)."""
+    server = StubServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub for the vision model.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Std-dev of the delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--damaged-rate", type=float, default=1.0, help="Share of YES verdicts")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per completion word")
+    parser.add_argument("--description-words", type=int, default=0, help="Filler words added to each description")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of requests in the slow tail")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="Delay of slow-tail requests in seconds")
+    args = parser.parse_args(argv)
+
+    server = StubServer(("127.0.0.1", args.port), latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, damaged_rate=args.damaged_rate,
+                        token_latency=args.token_latency, description_words=args.description_words,
+                        tail_rate=args.tail_rate, tail_latency=args.tail_latency)
+    print(f"🧪 Stub model listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
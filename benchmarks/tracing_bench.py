@@ -0,0 +1,107 @@
+"""
+tracing_bench.py : per-claim cost of tracing, off vs sampled vs full.
+
+Runs N claims (simulated evidence, so no model calls and the graph itself is
+as cheap as it gets) through batch_runner in four modes:
+    off       TRACE_ENDPOINT unset
+    sampled   TRACE_SAMPLE_RATE=0.1 (errors and review claims always kept)
+    full      TRACE_SAMPLE_RATE=1
+    slow      full, against a collector that takes --slow-latency per batch
+              with a small queue: spans are dropped, claims don't wait
+Spans go to the local stand-in collector (stub_collector.py), which counts
+what actually arrived.
+
+Usage:
+    python benchmarks/tracing_bench.py --claims 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from run_bench import seed_orders
+from stub_collector import start_collector
+
+
+def run_mode(graph, claims, concurrency, env):
+    from batch_runner import run_batch
+    from tools import metrics, tracing
+
+    for key in ("TRACE_ENDPOINT", "TRACE_SAMPLE_RATE", "TRACE_QUEUE_SIZE"):
+        os.environ.pop(key, None)
+    os.environ.update(env)
+    tracing.reset()
+    metrics.reset()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = asyncio.run(run_batch(claims, concurrency=concurrency, graph=graph))
+    flushed = tracing.flush(timeout=30)
+    counts = {}
+    for c in metrics.snapshot()["counters"]:
+        if c["name"] == "claims_trace_spans_total":
+            counts[c["labels"]["outcome"]] = c["value"]
+    return report, counts, flushed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tracing overhead per claim.")
+    parser.add_argument("--claims", type=int, default=2000, help="Claims per mode")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--slow-latency", type=float, default=0.5, help="Seconds per batch of the slow collector")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="claims-tracing-")
+    os.environ.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "CLAIMS_LOG_LEVEL": "WARNING",
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.db"),
+        "VISION_CACHE_PATH": os.path.join(workdir, "vision_cache.db"),
+        "PHASH_INDEX_PATH": os.path.join(workdir, "evidence_index.db"),
+    })
+
+    from tools import db_tools
+    db_tools.DB_PATH = os.path.join(workdir, "claims.db")
+    import main as claims_main
+    graph = claims_main.get_graph()
+
+    collector = start_collector()
+    slow = start_collector(latency=args.slow_latency)
+    modes = (
+        ("off", {}),
+        ("sampled", {"TRACE_ENDPOINT": collector.url, "TRACE_SAMPLE_RATE": "0.1"}),
+        ("full", {"TRACE_ENDPOINT": collector.url, "TRACE_SAMPLE_RATE": "1"}),
+        ("slow", {"TRACE_ENDPOINT": slow.url, "TRACE_SAMPLE_RATE": "1", "TRACE_QUEUE_SIZE": "500"}),
+    )
+    order_ids = seed_orders(db_tools, args.claims * (len(modes) + 1))
+
+    # Warm-up, so the first mode doesn't pay for imports and cold caches
+    warmup = [{"claim_id": o, "image_paths": ["simulated evidence"]} for o in order_ids[:args.claims // 4]]
+    run_mode(graph, warmup, args.concurrency, {})
+
+    print(f"--- 🛰️ TRACING BENCH: {args.claims} claims per mode, concurrency {args.concurrency} ---")
+    baseline = None
+    for i, (name, env) in enumerate(modes, start=1):
+        claims = [{"claim_id": o, "image_paths": ["simulated evidence"]}
+                  for o in order_ids[i * args.claims:(i + 1) * args.claims]]
+        target = slow if name == "slow" else collector
+        target.reset()
+        report, counts, flushed = run_mode(graph, claims, args.concurrency, env)
+        per_claim = report["elapsed"] / len(claims) * 1000
+        baseline = baseline or per_claim
+        stats = target.stats() if env else {"spans": 0, "traces": 0, "bytes": 0, "kept_because": {}}
+        print(f"   {name:<8} {per_claim:6.2f} ms/claim ({per_claim - baseline:+.2f})  "
+              f"p50 {report['latency_p50'] * 1000:6.1f} ms  "
+              f"received {stats['spans']:>6} spans / {stats['traces']:>5} traces ({stats['bytes'] // 1024} KiB) "
+              f"{stats['kept_because']}  dropped={counts.get('dropped', 0)}"
+              + ("" if flushed else "  (flush timed out)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+vision_stream_bench.py : time-to-verdict and tokens billed per vision call.
+
+Runs the async vision node against the local stub model in three modes:
+a blocking completion (the old behaviour), streaming with the full
+description, and streaming with a max_tokens cap. Every mode returns the
+complete description; the verdict time is when its word arrived in the
+stream, the claim time is when the node returned.
+The stub streams one word per chunk with --token-latency seconds each, and
+pads descriptions with --description-words words like a verbose model.
+
+Usage:
+    python benchmarks/vision_stream_bench.py --claims 40 --description-words 200 --max-tokens 60
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from run_bench import make_images, percentiles
+from stub_llm_server import start_stub_server
+
+MODES = (
+    ("blocking", {"VISION_STREAM": "0", "VISION_MAX_TOKENS": "0"}),
+    ("stream", {"VISION_STREAM": "1", "VISION_MAX_TOKENS": "0"}),
+    ("stream+cap", {"VISION_STREAM": "1"}),
+)
+
+
+async def run_mode(images, concurrency):
+    from nodes import vision_node
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i, path):
+        async with semaphore:
+            started = time.perf_counter()
+            await vision_node.avision_node({"claim_id": f"BENCH-{i}", "image_paths": [path]})
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i, path) for i, path in enumerate(images)))
+    return latencies
+
+
+def verdict_p50():
+    """Streaming modes record when the verdict word arrived; blocking has it with the last token."""
+    from tools import metrics
+
+    for h in metrics.snapshot()["histograms"]:
+        if h["name"] == "claims_llm_time_to_verdict_seconds":
+            return f"{h['p50']:.2f}s"
+    return "  -  "
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming vs blocking vision calls against a stub model.")
+    parser.add_argument("--claims", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub time to first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Stub seconds per word")
+    parser.add_argument("--description-words", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=60, help="Cap used by the stream+cap mode")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="claims-vision-")
+    stub = start_stub_server(latency=args.latency, token_latency=args.token_latency,
+                             description_words=args.description_words, seed=7)
+    os.environ.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_BASE_URL": stub.base_url,
+        "VISION_CACHE": "0",
+        "PHASH_INDEX": "0",
+        "TRIAGE": "0",
+        "CLAIMS_LOG_LEVEL": "WARNING",
+    })
+    from tools import llm_client, metrics
+    metrics.configure_logging()
+    images = make_images(workdir, args.claims)
+
+    print(f"--- 👁️ VISION STREAM BENCH: {args.claims} calls, c={args.concurrency}, "
+          f"{args.description_words} filler words, {args.token_latency * 1000:.0f}ms/word ---")
+    for name, env in MODES:
+        os.environ.update({"VISION_MAX_TOKENS": str(args.max_tokens), **env})
+        llm_client.reset_clients()
+        metrics.reset()
+        tokens_before = stub.completion_tokens
+        started = time.perf_counter()
+        latencies = asyncio.run(run_mode(images, args.concurrency))
+        elapsed = time.perf_counter() - started
+        stats = percentiles(latencies)
+        tokens = (stub.completion_tokens - tokens_before) / len(images)
+        verdict = verdict_p50()
+        print(f"   {name:<10} verdict p50={verdict}  claim p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s  "
+              f"{tokens:6.1f} completion tokens/claim  ({elapsed:.1f}s wall)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+worker_bench.py : throughput of the worker pool and recovery from a killed worker.
+
+Queues N claims with real JPEG evidence (so normalization costs CPU) in a
+throwaway claims.db and drains them with `worker.py --exit-when-idle` at
+each process count, against the local stub model. Then it SIGKILLs one
+worker mid-run and checks that every claim still finishes, resumed by
+another worker once the dead one's leases expire.
+
+Usage:
+    python benchmarks/worker_bench.py --claims 300 --processes 1,2,4 --concurrency 8
+"""
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.append(ROOT)
+
+from run_bench import make_images, seed_orders
+from stub_llm_server import start_stub_server
+
+
+def submit(job_queue, order_ids, images, rng, count):
+    claims = [{"claim_id": order_id, "image_paths": [rng.choice(images)]} for order_id in order_ids[:count]]
+    del order_ids[:count]
+    return job_queue.submit_many(claims)
+
+
+def worker_command(processes, concurrency):
+    return [sys.executable, os.path.join(ROOT, "worker.py"), "--processes", str(processes),
+            "--concurrency", str(concurrency), "--exit-when-idle"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker pool throughput and crash recovery.")
+    parser.add_argument("--claims", type=int, default=300, help="Claims per run")
+    parser.add_argument("--processes", default="1,2,4")
+    parser.add_argument("--concurrency", type=int, default=8, help="Claims in flight per process")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub model latency in seconds")
+    parser.add_argument("--images", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="claims-workers-")
+    stub = start_stub_server(latency=args.latency, jitter=0.05, seed=7)
+    env = dict(os.environ,
+               OPENROUTER_API_KEY="benchmark",
+               OPENROUTER_BASE_URL=stub.base_url,
+               CHECKPOINT_DB_PATH=os.path.join(workdir, "checkpoints.db"),
+               VISION_CACHE="0",
+               PHASH_INDEX="0",
+               TRIAGE="0",
+               CLAIMS_LOG_LEVEL="WARNING",
+               JOB_LEASE_SECONDS="5",
+               WORKER_POLL_INTERVAL="0.1")
+    os.environ.update(env)
+
+    from tools import db_tools, job_queue
+    db_tools.DB_PATH = os.path.join(workdir, "claims.db")
+    db_tools.setup_db()
+    order_ids = seed_orders(db_tools, args.claims * 10)
+    images = make_images(workdir, args.images)
+    rng = random.Random(3)
+
+    print(f"--- 👷 WORKER BENCH: {args.claims} claims per run, {args.concurrency} per process, "
+          f"{os.cpu_count()} CPU(s), stub latency {args.latency}s ---")
+    for processes in [int(p) for p in args.processes.split(",")]:
+        submit(job_queue, order_ids, images, rng, args.claims)
+        started = time.perf_counter()
+        subprocess.run(worker_command(processes, args.concurrency), cwd=workdir, env=env,
+                       stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - started
+        print(f"   processes={processes:<2} {args.claims / elapsed:6.1f} claims/sec ({elapsed:.1f}s incl. startup)  "
+              f"{job_queue.stats()}")
+
+    # Crash recovery: kill one of two workers while it holds leases
+    threads = submit(job_queue, order_ids, images, rng, args.claims)
+    started = time.perf_counter()
+    supervisor = subprocess.Popen(worker_command(2, args.concurrency), cwd=workdir, env=env,
+                                  stdout=subprocess.DEVNULL, start_new_session=True)
+    time.sleep(4)
+    # Worker children only, not multiprocessing's resource tracker
+    children = subprocess.run(["pgrep", "-P", str(supervisor.pid), "-f", "spawn_main"],
+                              capture_output=True, text=True).stdout.split()
+    if children:
+        os.kill(int(children[0]), signal.SIGKILL)
+        print(f"   💀 SIGKILLed worker {children[0]} mid-run")
+    supervisor.wait()
+    elapsed = time.perf_counter() - started
+
+    conn = db_tools.get_connection()
+    marks = ",".join("?" * len(threads))
+    done = conn.execute(f"SELECT COUNT(*) FROM claim_jobs WHERE status IN ('done','paused') AND thread_id IN ({marks})",
+                        threads).fetchone()[0]
+    resumed = conn.execute(f"SELECT COUNT(*) FROM claim_jobs WHERE attempts>1 AND thread_id IN ({marks})",
+                           threads).fetchone()[0]
+    print(f"   recovery: {done}/{len(threads)} claims finished, {resumed} re-leased after the crash ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
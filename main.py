@@ -1,25 +1,19 @@
 import os
-from dotenv import load_dotenv
-from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
-from langfuse.langchain import CallbackHandler
 import sys
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
 
 # --- PATH HANDLER ---
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import components
+# Importing this module is cheap and has no side effects: nodes, LangGraph
+# builders, the tracer and the databases are only touched once a graph is
+# actually built (`build_graph` / `get_graph`).
 from state import ClaimState
-from tools.db_tools import setup_db
-from nodes.vision_node import vision_node
-from nodes.crm_node import crm_node
-from nodes.logic_node import logic_node
-from nodes.human_node import human_review_node
-from nodes.refund_node import refund_node
-
-# Load Environment
-load_dotenv()
-setup_db() # Init the SQLite DB
 
 # --- 1. Define Routing Logic ---
 def route_decision(state: ClaimState):
@@ -32,51 +26,204 @@ def route_decision(state: ClaimState):
         return "refund"
 
 # --- 2. Build the Graph ---
-builder = StateGraph(ClaimState)
-
-# Add Nodes
-builder.add_node("vision", vision_node)
-builder.add_node("crm", crm_node)
-builder.add_node("logic", logic_node)
-builder.add_node("human_review", human_review_node)
-builder.add_node("refund", refund_node)
-
-# Add Edges
-builder.add_edge(START, "vision")
-builder.add_edge("vision", "crm")
-builder.add_edge("crm", "logic")
-
-# Conditional Edge from Logic
-builder.add_conditional_edges(
-    "logic",
-    route_decision,
-    {
-        "END": END,
-        "human_review": "human_review",
-        "refund": "refund"
-    }
-)
+TOPOLOGIES = ("gated", "parallel", "sequential")
+
+# What each graph node is doing, as shown while a claim runs
+NODE_LABELS = {
+    "crm": "🗄️ Looking up the order",
+    "precheck": "🚧 Running pre-checks",
+    "vision": "👁️ Analyzing the evidence",
+    "logic": "🧠 Applying refund policy",
+    "enqueue_review": "📥 Queueing for manager review",
+    "human_review": "👨‍💼 Recording the manager's decision",
+    "refund": "💰 Finalizing the refund",
+}
+
+# Pool the sync nodes run on under ainvoke/astream, set by `node_executor`
+_node_executor = contextvars.ContextVar("node_executor", default=None)
+
+@contextmanager
+def node_executor(max_workers):
+    """
+    Runs the sync nodes of every graph invoked asynchronously inside the
+    block on a pool `max_workers` wide, so they are not capped by the
+    loop's default executor. Without it they fall back to that executor.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="claims")
+    token = _node_executor.set(executor)
+    try:
+        yield executor
+    finally:
+        _node_executor.reset(token)
+        executor.shutdown(wait=False)
+
+def sync_node(name, fn):
+    """An instrumented sync node whose async path runs it on the `node_executor` pool."""
+    from langchain_core.runnables import RunnableLambda
+    from langchain_core.runnables.utils import accepts_config
+    from tools.metrics import instrument_node
 
-# After human review, we try to refund (assuming human approved)
-builder.add_edge("human_review", "refund")
-builder.add_edge("refund", END)
+    func = instrument_node(name, fn)
+    takes_config = accepts_config(func)
+
+    async def afunc(state, config):
+        call = functools.partial(func, state, config=config) if takes_config else functools.partial(func, state)
+        # Carries the run's context (callbacks, tracing) into the worker thread
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(_node_executor.get(), context.run, call)
+
+    return RunnableLambda(func, afunc=afunc, name=name)
+
+def build_builder(topology="gated"):
+    """
+    Returns the uncompiled StateGraph with every node and edge wired up.
+      gated       crm -> precheck, and only claims that pass reach vision (default)
+      parallel    vision and crm run as concurrent branches and join at logic
+      sequential  vision -> crm -> logic
+    parallel and sequential have no precheck, so no duplicate-claim gate and
+    a vision call for every claim. They are kept as the baselines that
+    benchmarks/run_bench.py --topology compares gated against; the claim
+    apps and workers always build the gated graph.
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology!r}; expected one of {TOPOLOGIES}")
+    from langgraph.graph import StateGraph, START, END
+    from langchain_core.runnables import RunnableLambda
+    from tools.metrics import instrument_node
+    from nodes.vision_node import vision_node, avision_node
+    from nodes.crm_node import crm_node
+    from nodes.precheck_node import precheck_node, route_precheck
+    from nodes.logic_node import logic_node
+    from nodes.human_node import enqueue_review_node, human_review_node
+    from nodes.refund_node import refund_node
+
+    builder = StateGraph(ClaimState)
+
+    # Add Nodes (each wrapped to record latency/error metrics)
+    # vision runs the sync node under invoke/stream and the async one under ainvoke/astream;
+    # the other nodes are sync and run on the `node_executor` pool under ainvoke/astream
+    builder.add_node("vision", RunnableLambda(
+        instrument_node("vision", vision_node),
+        afunc=instrument_node("vision", avision_node),
+        name="vision",
+    ))
+    builder.add_node("crm", sync_node("crm", crm_node))
+    if topology == "gated":
+        builder.add_node("precheck", sync_node("precheck", precheck_node))
+    builder.add_node("logic", sync_node("logic", logic_node))
+    builder.add_node("enqueue_review", sync_node("enqueue_review", enqueue_review_node))
+    builder.add_node("human_review", sync_node("human_review", human_review_node))
+    builder.add_node("refund", sync_node("refund", refund_node))
+
+    # Add Edges
+    if topology == "gated":
+        # The order lookup and duplicate check are cheap; claims that can only
+        # be rejected never reach the model call.
+        builder.add_edge(START, "crm")
+        builder.add_edge("crm", "precheck")
+        builder.add_conditional_edges("precheck", route_precheck, {"END": END, "vision": "vision"})
+        builder.add_edge("vision", "logic")
+    elif topology == "parallel":
+        # crm only needs claim_id, so it runs alongside the model call.
+        # The branches write disjoint keys (see state.py); logic waits for both.
+        builder.add_edge(START, "vision")
+        builder.add_edge(START, "crm")
+        builder.add_edge(["vision", "crm"], "logic")
+    else:
+        builder.add_edge(START, "vision")
+        builder.add_edge("vision", "crm")
+        builder.add_edge("crm", "logic")
+
+    # Conditional Edge from Logic
+    builder.add_conditional_edges(
+        "logic",
+        route_decision,
+        {
+            "END": END,
+            "human_review": "enqueue_review",
+            "refund": "refund"
+        }
+    )
+
+    # Claims headed for a manager are queued first, then the graph pauses
+    builder.add_edge("enqueue_review", "human_review")
+
+    # After human review, we try to refund (assuming human approved)
+    builder.add_edge("human_review", "refund")
+    builder.add_edge("refund", END)
+    return builder
 
 # --- 3. Persistence & Compilation ---
-# MemorySaver is crucial for "pausing" the graph and resuming later
-checkpointer = MemorySaver()
+def build_graph(checkpointer=None, interrupt_before=("human_review",), topology="gated"):
+    """
+    Compiles a new claim graph. The checkpointer is crucial for "pausing" the
+    graph and resuming later; by default it lives on disk so paused claims
+    survive a restart, and the sweeper drops finished and long-idle threads
+    so the store stays bounded. We interrupt BEFORE the human_review node runs.
+    """
+    if checkpointer is None:
+        from tools.checkpointer import SqliteCheckpointer
+        checkpointer = SqliteCheckpointer()
+        checkpointer.start_sweeper(on_sweep=release_swept)
+    return build_builder(topology=topology).compile(
+        checkpointer=checkpointer,
+        interrupt_before=list(interrupt_before or ()),
+    )
+
+def release_swept(thread_ids):
+    """
+    Checkpointer sweep hook. Swept threads release their uploaded evidence,
+    their claim reservations and any review entry still pointing at them.
+    """
+    from tools import evidence_store, review_queue
+    from tools.db_tools import release_threads
+
+    release_threads(thread_ids)
+    review_queue.expire(thread_ids)
+    evidence_store.release_and_gc(thread_ids)
 
-# We interrupt BEFORE the human_review node runs
-graph = builder.compile(
-    checkpointer=checkpointer,
-    interrupt_before=["human_review"]
-)
+_graph = None
+_graph_lock = threading.Lock()
+
+def init_runtime():
+    """One-time process setup: environment, logging, the orders DB and metrics."""
+    from dotenv import load_dotenv
+    from tools.db_tools import setup_db
+    from tools.metrics import configure_logging, serve_metrics
+
+    load_dotenv()
+    configure_logging() # Level from CLAIMS_LOG_LEVEL
+    setup_db() # Creates/seeds the SQLite DB without touching existing orders
+    if os.environ.get("METRICS_PORT"):
+        serve_metrics() # /metrics (Prometheus) and /metrics.json
+
+def get_graph():
+    """Returns the process-wide graph, initializing the runtime on first use."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                init_runtime()
+                _graph = build_graph()
+    return _graph
+
+def __getattr__(name):
+    # Keeps `from main import graph` working without building it at import
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- 4. Execution Simulation ---
 
 def run_simulation():
-    # Setup Observability
-    langfuse_handler = CallbackHandler()
-    config_settings = {"callbacks": [langfuse_handler], "configurable": {"thread_id": "ticket_888"}}
+    from tools import tracing
+
+    graph = get_graph()
+
+    # Setup Observability: the shared, sampled tracer (TRACE_ENDPOINT) instead of a handler per run
+    config_settings = {"callbacks": tracing.callbacks(), "configurable": {"thread_id": "ticket_888"}}
 
     print("\n--- 🏁 STARTING AUTOMATED CLAIM PROCESS (High Value: $1500) ---")
     
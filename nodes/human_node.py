@@ -1,7 +1,23 @@
+import logging
+from langchain_core.runnables import RunnableConfig
 from state import ClaimState
+from tools import review_queue
+
+logger = logging.getLogger(__name__)
+
+def enqueue_review_node(state: ClaimState, config: RunnableConfig = None):
+    """Puts the claim on the persistent review queue just before the graph pauses."""
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    if state.get("reused_evidence"):
+        reason = "reused evidence: " + ", ".join(state["reused_evidence"])
+    else:
+        reason = "high value"
+    review_queue.enqueue(thread_id, state, reason)
+    logger.info("📥 [Review Queue] Claim %s queued for a manager (%s).", state["claim_id"], reason)
+    return {}
 
 def human_review_node(state: ClaimState):
-    print("👨‍💼 [Human Node] Manager is reviewing the case...")
+    logger.info("👨‍💼 [Human Node] Manager is reviewing the case...")
     # This node actually runs AFTER the human has approved.
     # The state update happens via the API/Script, not inside this function.
     return {}
\ No newline at end of file
@@ -1,24 +1,36 @@
+import logging
+from langchain_core.runnables import RunnableConfig
 from state import ClaimState
+from tools.db_tools import release_claim
+from tools.policy import evaluate
 """
 The Supervisor/Brain. 
 It defines where to go next, but strictly speaking, 
 in LangGraph, the Conditional Edge function usually handles the "Next" logic.
  This node prepares the final judgment state.
 """
-def logic_node(state: ClaimState):
+logger = logging.getLogger(__name__)
+
+def logic_node(state: ClaimState, config: RunnableConfig = None):
     """
     Acts as the Supervisor.
     """
-    print("🧠 [Logic Node] Evaluating Policy rules...")
-    
-    if not state.get("is_valid_damage"):
-        return {"refund_status": "Rejected"}
-    
-    value = state.get("order_value", 0)
-    
-    # Policy: refunds > $1000 require human review
-    if value > 1000:
-        print("   ⚠️ High Value Detected. Flagging for Human Review.")
-        return {"refund_status": "Manual Review"}
-    
-    return {"refund_status": "Approved"}
\ No newline at end of file
+    logger.info("🧠 [Logic Node] Evaluating Policy rules...")
+
+    # First matching rule of the policy table decides (see tools/policy.py)
+    decision, rule = evaluate(state)
+
+    if decision == "Manual Review":
+        if rule.get("reused"):
+            # The same photo on another order is a fraud signal; a human decides
+            logger.info("   🔁 Evidence re-used from claim(s) %s. Flagging for Human Review.",
+                        ", ".join(state.get("reused_evidence") or []))
+        else:
+            logger.info("   ⚠️ Rule '%s' matched. Flagging for Human Review.", rule.get("name", "?"))
+
+    if decision == "Rejected":
+        # The claim ends here; it may be submitted again with new evidence
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        release_claim(state["claim_id"], thread_id)
+
+    return {"refund_status": decision}
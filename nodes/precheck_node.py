@@ -0,0 +1,43 @@
+import logging
+from langchain_core.runnables import RunnableConfig
+from state import ClaimState
+from tools.db_tools import get_decision, reserve_claim
+from tools import metrics
+"""
+precheck_node.py : cheap gate between the CRM lookup and the vision model.
+
+Claims for unknown or zero-value orders, and claims that were already
+decided, cannot end in a refund, so they are rejected here before paying
+for a vision call. A claim that passes is reserved for its thread in
+claim_reservations, so a duplicate submitted while the first is still in
+flight (at the vision step, parked, or waiting for a manager) is rejected
+too. The reservation is released only when the claim ends Rejected.
+Everything else passes through untouched.
+"""
+logger = logging.getLogger(__name__)
+
+def precheck_node(state: ClaimState, config: RunnableConfig = None):
+    reason = None
+    if state.get("customer_tier") == "Unknown":
+        reason = "order not found"
+    elif not state.get("order_value"):
+        reason = "zero-value order"
+    else:
+        previous = get_decision(state["claim_id"])
+        if previous is not None:
+            reason = f"already decided ({previous})"
+        else:
+            thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+            holder = reserve_claim(state["claim_id"], thread_id)
+            if holder != thread_id:
+                reason = f"already in flight ({holder})"
+
+    if reason is None:
+        return {}
+
+    logger.info("🚧 [Precheck Node] Skipping vision for %s: %s", state["claim_id"], reason)
+    metrics.inc("claims_vision_skipped_total", reason=reason.split(" (")[0])
+    return {"refund_status": "Rejected", "precheck_reason": reason}
+
+def route_precheck(state: ClaimState):
+    return "END" if state.get("precheck_reason") else "vision"
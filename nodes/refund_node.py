@@ -1,7 +1,20 @@
+import logging
+from langchain_core.runnables import RunnableConfig
 from state import ClaimState
+from tools.db_tools import record_decision, release_claim
+from tools import review_queue
 
-def refund_node(state: ClaimState):
+logger = logging.getLogger(__name__)
+
+def refund_node(state: ClaimState, config: RunnableConfig = None):
     status = state["refund_status"]
-    print(f"💰 [Refund Node] Finalizing Transaction. Status: {status}")
+    logger.info("💰 [Refund Node] Finalizing Transaction. Status: %s", status)
     # In a real app, this would call the Stripe API
+    # Remember the outcome so a resubmitted claim is stopped at the precheck
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    record_decision(state["claim_id"], status, thread_id)
+    if status == "Rejected":
+        release_claim(state["claim_id"], thread_id)
+    if thread_id:
+        review_queue.resolve(thread_id, status)
     return {}
\ No newline at end of file
@@ -1,107 +1,374 @@
 import os
+import re
 import base64
+import json
+import time
+import asyncio
+import logging
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
 from state import ClaimState
+from tools.llm_client import MODEL_ID, get_vision_llm, get_async_vision_llm
+from tools import vision_cache
+from tools import phash_index
+from tools import triage
+from tools import vision_scheduler
+from tools.image_tools import normalize_image, settings as image_settings
+from tools.video_tools import sample_keyframes
+from tools import metrics
+from tools import llm_resilience
+from tools.llm_resilience import VisionUnavailableError
 
-# 1. Define the OpenRouter Model ID
-#    This matches the HuggingFace ID exactly on OpenRouter
-MODEL_ID = "meta-llama/llama-3.2-11b-vision-instruct"
+logger = logging.getLogger(__name__)
 
-def extract_frame_from_video(video_path):
+VISION_PROMPT = "Examine these images/videos of a package. Is the item damaged? Answer strictly YES or NO, then provide a short description of the damage if any."
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+
+# Whole words only: a substring test would read "EYES" as YES
+VERDICT_PATTERN = re.compile(r"\b(YES|NO)\b", re.IGNORECASE)
+# Mid-stream a word is only complete once something follows it ("NO" vs "NOT")
+EARLY_VERDICT_PATTERN = re.compile(r"\b(YES|NO)(?=\W)", re.IGNORECASE)
+
+def streaming_enabled():
+    """VISION_STREAM=0 goes back to one blocking completion per claim."""
+    return os.environ.get("VISION_STREAM", "1") != "0"
+
+def extract_frames_from_video(video_path):
     """
-    Attempts to extract the first frame from a video file.
-    Falls back to the original path if opencv is not installed.
+    Samples the most informative keyframes of a video as in-memory JPEG
+    buffers. Falls back to the original path if opencv is not installed.
     """
     try:
-        import cv2
-        cap = cv2.VideoCapture(video_path)
-        ret, frame = cap.read()
-        cap.release()
-        
-        if ret:
-            # Save frame as a temporary image
-            image_path = video_path + "_frame.jpg"
-            cv2.imwrite(image_path, frame)
-            print(f"   🎬 Extracted frame from video: {image_path}")
-            return image_path
+        frames = sample_keyframes(video_path)
+        if frames:
+            logger.info("   🎬 Sampled %d keyframes from video: %s", len(frames), video_path)
+            return frames
+        logger.warning("   ⚠️ No usable frames in video: %s", video_path)
     except ImportError:
-        print("   ⚠️ OpenCV not found. Cannot extract video frame. Treating as file.")
+        logger.warning("   ⚠️ OpenCV not found. Cannot extract video frame. Treating as file.")
     except Exception as e:
-        print(f"   ⚠️ Error processing video: {e}")
-    return video_path
+        logger.warning("   ⚠️ Error processing video: %s", e)
+    return [video_path]
 
 def encode_image(image_path):
     """Helper to convert local image to Base64"""
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-def vision_node(state: ClaimState):
-    image_paths = state.get('image_paths', [])
-    print(f"👁️  [Vision Node] Analyzing {len(image_paths)} items with Llama 3.2...")
-    
-    # Process all paths (handle videos)
+def load_images(processed_paths):
+    """Reads the raw bytes of every existing file; these are what the cache key hashes."""
+    images = []
+    for path in processed_paths:
+        if isinstance(path, bytes):
+            images.append(path)
+        elif os.path.exists(path):
+            with open(path, "rb") as image_file:
+                images.append(image_file.read())
+    return images
+
+def cache_key(images):
+    variant = json.dumps(image_settings(), sort_keys=True)
+    return vision_cache.make_key(images, VISION_PROMPT, MODEL_ID, variant=variant)
+
+def prepare_payloads(images):
+    """Downsizes/re-encodes every image; returns (bytes, mime) pairs."""
+    return [normalize_image(data) for data in images]
+
+def process_paths(image_paths):
+    """Replaces videos with their keyframe buffers, keeping image paths as they are."""
     processed_paths = []
     for path in image_paths:
-        if path.lower().endswith(('.mp4', '.mov', '.avi')):
-            path = extract_frame_from_video(path)
-        processed_paths.append(path)
-    
+        if path.lower().endswith(VIDEO_EXTENSIONS):
+            processed_paths.extend(extract_frames_from_video(path))
+        else:
+            processed_paths.append(path)
+    return processed_paths
+
+def is_simulation(processed_paths):
     # Check if we have valid files or if this is a simulation
     # We assume if the first file doesn't exist, it's a text simulation
-    is_simulation = len(processed_paths) > 0 and not os.path.exists(processed_paths[0])
-
-    # 2. Initialize ChatOpenAI pointing to OpenRouter
-    llm = ChatOpenAI(
-        model=MODEL_ID,
-        openai_api_key=os.environ["OPENROUTER_API_KEY"],
-        openai_api_base="https://openrouter.ai/api/v1",
-        temperature=0.1,
-        # Optional: Add headers if OpenRouter requires them for tracking
-        default_headers={
-            "HTTP-Referer": "https://localhost:3000", # Required by OpenRouter for some tiers
-            "X-Title": "Logistics Agent"
-        }
-    )
-
-    # 3. Handle Local vs Simulated Images
-    if is_simulation or not processed_paths:
-        print("   (Simulating Vision Analysis based on text description...)")
-        # ... keep your simulation logic here ...
-        return {"is_valid_damage": True, "damage_description": "Simulated damage report."}
-
-    # 4. Prepare the Payload (Standard OpenAI Format)
-    content_payload = [
-        {
-            "type": "text", 
-            "text": "Examine these images/videos of a package. Is the item damaged? Answer strictly YES or NO, then provide a short description of the damage if any."
-        }
-    ]
+    if not processed_paths:
+        return True
+    first = processed_paths[0]
+    return not isinstance(first, bytes) and not os.path.exists(first)
+
+def build_message(payloads):
+    """Builds the vision prompt (Standard OpenAI Format) from (bytes, mime) pairs."""
+    content_payload = [{"type": "text", "text": VISION_PROMPT}]
 
     # Append all images to the message
-    for path in processed_paths:
-        if os.path.exists(path):
-            base64_image = encode_image(path)
-            content_payload.append({
-                "type": "image_url", 
-                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-            })
-    
-    msg = HumanMessage(content=content_payload)
-    
-    # 5. Invoke
-    try:
-        response = llm.invoke([msg])
-        content = response.content
-        print(f"   🤖 Llama says: {content}")
-    except Exception as e:
-        print(f"   ⚠️ API Error: {e}")
-        print("   ⚠️ (Falling back to simulated damage detection to continue workflow)")
-        content = "YES. The item appears to be damaged. (Simulated Fallback)"
-    
-    is_damaged = "YES" in content.upper()
-    
+    for data, mime in payloads:
+        base64_image = base64.b64encode(data).decode('utf-8')
+        content_payload.append({
+            "type": "image_url",
+            "image_url": {"url": f"data:{mime};base64,{base64_image}"}
+        })
+    return HumanMessage(content=content_payload)
+
+def parse_verdict(content):
+    match = VERDICT_PATTERN.search(content)
+    is_damaged = bool(match) and match.group(1).upper() == "YES"
     return {
         "is_valid_damage": is_damaged,
         "damage_description": content
-    }
\ No newline at end of file
+    }
+
+def early_verdict(text):
+    """True/False once the verdict word is complete in `text`, else None."""
+    match = EARLY_VERDICT_PATTERN.search(text)
+    return None if match is None else match.group(1).upper() == "YES"
+
+class VerdictStream:
+    """
+    Accumulates a streamed completion and notices the YES/NO verdict as soon
+    as its word is complete, which `claims_llm_time_to_verdict_seconds`
+    records. The node still returns only once the description is complete:
+    the state, the review queue and the refund records keep the whole text.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.message = None
+        self.verdict = None
+
+    def feed(self, chunk):
+        """Adds a chunk; returns True once the verdict is known."""
+        self.message = chunk if self.message is None else self.message + chunk
+        if self.verdict is None:
+            self.verdict = early_verdict(self.content)
+            if self.verdict is not None:
+                metrics.observe("claims_llm_time_to_verdict_seconds", time.perf_counter() - self.started)
+        return self.verdict is not None
+
+    @property
+    def content(self):
+        return self.message.content if self.message is not None else ""
+
+    def log_verdict(self):
+        logger.info("   ⚡ Verdict after %.2fs: %s", time.perf_counter() - self.started,
+                    "YES" if self.verdict else "NO")
+
+    def result(self):
+        if self.verdict is None:
+            # Stream ended without a clean verdict word
+            return parse_verdict(self.content)
+        return {"is_valid_damage": self.verdict, "damage_description": self.content}
+
+    def finish(self, payloads, key):
+        """Records the finished call and caches the full description."""
+        record_llm_call(payloads, self.message, time.perf_counter() - self.started)
+        logger.info("   🤖 Llama says: %s", self.content)
+        result = self.result()
+        vision_cache.put(key, result, VISION_PROMPT, MODEL_ID)
+        return result
+
+def invoke_verdict(msg, payloads, key, model=None):
+    """One blocking completion; the verdict arrives with the full description."""
+    started = time.perf_counter()
+    response = get_vision_llm(model).invoke([msg])
+    record_llm_call(payloads, response, time.perf_counter() - started)
+    logger.info("   🤖 Llama says: %s", response.content)
+    result = parse_verdict(response.content)
+    vision_cache.put(key, result, VISION_PROMPT, MODEL_ID)
+    return result
+
+async def ainvoke_verdict(msg, payloads, key, model=None):
+    started = time.perf_counter()
+    response = await get_async_vision_llm(model).ainvoke([msg])
+    record_llm_call(payloads, response, time.perf_counter() - started)
+    logger.info("   🤖 Llama says: %s", response.content)
+    result = parse_verdict(response.content)
+    await asyncio.to_thread(vision_cache.put, key, result, VISION_PROMPT, MODEL_ID)
+    return result
+
+def stream_verdict(msg, payloads, key, model=None):
+    """
+    Streams the completion, noting when the verdict arrives, and returns
+    once the description is complete. VISION_MAX_TOKENS bounds how long
+    that tail can be.
+    """
+    stream = VerdictStream()
+    for chunk in get_vision_llm(model).stream([msg]):
+        known = stream.verdict is not None
+        if stream.feed(chunk) and not known:
+            stream.log_verdict()
+    return stream.finish(payloads, key)
+
+async def astream_verdict(msg, payloads, key, model=None):
+    """Async variant of `stream_verdict`."""
+    stream = VerdictStream()
+    async for chunk in get_async_vision_llm(model).astream([msg]):
+        known = stream.verdict is not None
+        if stream.feed(chunk) and not known:
+            stream.log_verdict()
+    return await asyncio.to_thread(stream.finish, payloads, key)
+
+def match_evidence(claim_id, images):
+    """
+    Looks every image up in the perceptual-hash index. Returns the hashes,
+    the other claims whose evidence this claim re-uses and, when every image
+    matches a stored verdict, the nearest prior verdict.
+    """
+    evidence = {"hashes": [], "reused": [], "prior": None}
+    if not phash_index.is_enabled():
+        return evidence
+    try:
+        evidence["hashes"] = [phash_index.dhash(data) for data in images]
+    except ImportError:
+        return evidence
+
+    nearest = []
+    for value in evidence["hashes"]:
+        matches = phash_index.find(value, exclude_claim=claim_id)
+        nearest.append(matches[0] if matches else None)
+    evidence["reused"] = sorted({m["claim_id"] for m in nearest if m})
+    if evidence["reused"]:
+        logger.info("   🔁 Evidence matches earlier claim(s): %s", ", ".join(evidence["reused"]))
+
+    if nearest and phash_index.reuse_verdicts() and all(m and m["is_valid_damage"] is not None for m in nearest):
+        best = min(nearest, key=lambda m: m["distance"])
+        evidence["prior"] = {"is_valid_damage": best["is_valid_damage"], "damage_description": best["damage_description"]}
+    return evidence
+
+def triage_evidence(images):
+    """
+    Runs the local OpenCV triage. Returns (verdict, images): a verdict when
+    the claim was decided locally, else the usable images for the model.
+    """
+    if not triage.is_enabled():
+        return None, images
+    outcome = triage.assess(images)
+    if outcome["verdict"]:
+        logger.info("   🔎 Local triage: %s, no model call needed.", outcome["outcome"])
+        return outcome["verdict"], images
+    usable = [images[i] for i in outcome["usable"]]
+    if len(usable) < len(images):
+        logger.info("   🔎 Local triage dropped %d unusable image(s).", len(images) - len(usable))
+    return None, usable
+
+def remember_evidence(claim_id, evidence, result, store_verdict=True):
+    """Indexes this claim's evidence and flags any re-use into the result."""
+    phash_index.add_many(evidence["hashes"], claim_id, result if store_verdict else None)
+    if evidence["reused"]:
+        result = {**result, "reused_evidence": evidence["reused"]}
+    return result
+
+def record_llm_call(payloads, response, seconds):
+    """Records request/response sizes, latency and token usage of one model call."""
+    metrics.observe("claims_llm_latency_seconds", seconds)
+    metrics.observe("claims_llm_request_bytes", sum(len(d) for d, _ in payloads), buckets=metrics.SIZE_BUCKETS)
+    metrics.observe("claims_llm_response_chars", len(response.content), buckets=metrics.TOKEN_BUCKETS)
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        metrics.inc("claims_llm_tokens_total", usage.get("input_tokens", 0), kind="prompt")
+        metrics.inc("claims_llm_tokens_total", usage.get("output_tokens", 0), kind="completion")
+        vision_scheduler.settle(vision_scheduler.estimate_tokens(len(payloads)), usage.get("total_tokens"))
+    logger.debug("   ⏱️ Vision call: %.2fs for %d KiB of images, usage=%s",
+                 seconds, sum(len(d) for d, _ in payloads) // 1024, usage)
+
+def park(e):
+    """
+    No verdict could be obtained. Raising leaves the claim's checkpoint at
+    this node, so re-invoking the thread with no input retries it. A made-up
+    YES would auto-approve refunds during every outage.
+    """
+    metrics.inc("claims_vision_parked_total")
+    logger.warning("   ⏸️ Vision model unavailable (%s). Claim parked for retry.", e)
+    return e
+
+SIMULATED_RESULT = {"is_valid_damage": True, "damage_description": "Simulated damage report."}
+
+def vision_node(state: ClaimState):
+    image_paths = state.get('image_paths', [])
+    logger.info("👁️  [Vision Node] Analyzing %d items with Llama 3.2...", len(image_paths))
+
+    processed_paths = process_paths(image_paths)
+
+    # Handle Local vs Simulated Images
+    if is_simulation(processed_paths):
+        logger.info("   (Simulating Vision Analysis based on text description...)")
+        return dict(SIMULATED_RESULT)
+
+    images = load_images(processed_paths)
+    claim_id = state.get("claim_id")
+    evidence = match_evidence(claim_id, images)
+    if evidence["prior"]:
+        logger.info("   ♻️ Reusing the verdict of near-duplicate evidence.")
+        return remember_evidence(claim_id, evidence, evidence["prior"])
+
+    key = cache_key(images)
+    cached = vision_cache.get(key)
+    if cached:
+        logger.info("   ♻️ Reusing cached verdict for identical evidence.")
+        return remember_evidence(claim_id, evidence, cached)
+
+    # Triage verdicts stay out of the vision cache and the phash index:
+    # they are cheap to recompute and must not pose as model verdicts
+    local, images = triage_evidence(images)
+    if local:
+        return remember_evidence(claim_id, evidence, local, store_verdict=False)
+
+    payloads = prepare_payloads(images)
+    msg = build_message(payloads)
+
+    # Wait for quota, VIP and high-value claims first; retries and hedges are charged, not queued
+    cost = vision_scheduler.estimate_tokens(len(payloads))
+    vision_scheduler.admit(state, cost)
+
+    # Invoke through the shared, keep-alive client
+    verdict = stream_verdict if streaming_enabled() else invoke_verdict
+    attempt = vision_scheduler.metered(lambda model: verdict(msg, payloads, key, model), cost)
+    try:
+        result = llm_resilience.call(attempt)
+    except VisionUnavailableError as e:
+        raise park(e)
+
+    return remember_evidence(claim_id, evidence, result)
+
+async def avision_node(state: ClaimState):
+    """
+    Async variant of `vision_node` for graphs driven by `ainvoke`/`astream`.
+    Frame extraction, file reads, hashing, image normalization (one thread
+    per image) and Base64 encoding run in worker threads so they never
+    block the event loop.
+    """
+    image_paths = state.get('image_paths', [])
+    logger.info("👁️  [Vision Node] Analyzing %d items with Llama 3.2 (async)...", len(image_paths))
+
+    processed_paths = await asyncio.to_thread(process_paths, image_paths)
+
+    if is_simulation(processed_paths):
+        logger.info("   (Simulating Vision Analysis based on text description...)")
+        return dict(SIMULATED_RESULT)
+
+    images = await asyncio.to_thread(load_images, processed_paths)
+    claim_id = state.get("claim_id")
+    evidence = await asyncio.to_thread(match_evidence, claim_id, images)
+    if evidence["prior"]:
+        logger.info("   ♻️ Reusing the verdict of near-duplicate evidence.")
+        return await asyncio.to_thread(remember_evidence, claim_id, evidence, evidence["prior"])
+
+    key = await asyncio.to_thread(cache_key, images)
+    cached = await asyncio.to_thread(vision_cache.get, key)
+    if cached:
+        logger.info("   ♻️ Reusing cached verdict for identical evidence.")
+        return await asyncio.to_thread(remember_evidence, claim_id, evidence, cached)
+
+    local, images = await asyncio.to_thread(triage_evidence, images)
+    if local:
+        return await asyncio.to_thread(remember_evidence, claim_id, evidence, local, False)
+
+    payloads = await asyncio.gather(*(asyncio.to_thread(normalize_image, data) for data in images))
+    msg = await asyncio.to_thread(build_message, payloads)
+
+    cost = vision_scheduler.estimate_tokens(len(payloads))
+    await vision_scheduler.aadmit(state, cost)
+
+    verdict = astream_verdict if streaming_enabled() else ainvoke_verdict
+    attempt = vision_scheduler.metered(lambda model: verdict(msg, payloads, key, model), cost)
+    try:
+        result = await llm_resilience.acall(attempt)
+    except VisionUnavailableError as e:
+        raise park(e)
+
+    return await asyncio.to_thread(remember_evidence, claim_id, evidence, result)
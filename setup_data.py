@@ -1,44 +1,28 @@
-import sqlite3
 import os
+import sys
+import logging
 
-DB_PATH = "claims.db"
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-def setup_db():
-    """Initializes a dummy database with orders."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DROP TABLE IF EXISTS orders")
-    cursor.execute("""
-        CREATE TABLE orders (
-            order_id TEXT PRIMARY KEY,
-            amount REAL,
-            customer_tier TEXT
-        )
-    """)
-    
-    # Seed Data
-    # ORD-123: High value (Trigger Human Review)
-    # ORD-456: Low value (Auto Approve)
-    data = [
-        ("ORD-123", 1500.00, "VIP"),
-        ("ORD-456", 50.00, "REGULAR")
-    ]
-    cursor.executemany("INSERT INTO orders VALUES (?,?,?)", data)
-    conn.commit()
-    conn.close()
-    print("✅ Database initialized with dummy orders.")
-
-def get_order_details(order_id: str):
-    """Fetches order details from SQLite."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT amount, customer_tier FROM orders WHERE order_id=?", (order_id,))
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return {"amount": row[0], "tier": row[1]}
-    return None
+# The schema and lookups live in tools/db_tools.py; this script only drives them.
+from tools.db_tools import DB_PATH, setup_db, get_order_details
+from tools.order_import import import_file, import_orders, generate_orders
 
 if __name__ == "__main__":
-    setup_db()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create claims.db and optionally load orders into it.")
+    parser.add_argument("files", nargs="*", help="CSV or JSONL order exports to upsert")
+    parser.add_argument("--generate", type=int, metavar="N", help="Also add N synthetic orders")
+    parser.add_argument("--reset", action="store_true", help="Drop and re-seed the tables first")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    setup_db(reset=args.reset)
+    for path in args.files:
+        report = import_file(path)
+        print(f"✅ {path}: {report['loaded']} orders upserted, {report['rejected']} rejected.")
+    if args.generate:
+        report = import_orders(generate_orders(args.generate))
+        print(f"✅ {report['loaded']} synthetic orders added ({report['rows_per_sec']:.0f} rows/sec).")
+    print(f"ORD-123 -> {get_order_details('ORD-123')} ({DB_PATH})")
@@ -9,15 +9,25 @@ class ClaimState(TypedDict):
     # Inputs
     claim_id: str
     image_paths: List[str]  # List of paths to images/videos or text description
+    submitted_at: Optional[float]  # epoch seconds; ages the claim's place in the vision queue
     
+    # Each node writes its own keys. The default (gated) graph runs crm ->
+    # precheck -> vision in sequence; the `parallel` topology in main.py runs
+    # vision and crm as concurrent branches, which is only valid because no
+    # two of them write the same key in a step (`messages` has a reducer).
+
     # Vision Node Outputs
     is_valid_damage: Optional[bool]
     damage_description: Optional[str]
+    reused_evidence: Optional[List[str]]  # earlier claims with near-identical evidence
     
     # CRM Node Outputs
     order_value: Optional[float]
     customer_tier: Optional[str]
     
+    # Precheck Output: why the claim was stopped before the vision call
+    precheck_reason: Optional[str]
+
     # Logic/Human Outputs
     refund_status: str # "Pending", "Approved", "Rejected", "Manual Review"
     
@@ -0,0 +1,45 @@
+import os
+import sys
+import pytest
+
+# --- PATH HANDLER ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import db_tools
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, seeded claims.db in a temp dir for one test."""
+    monkeypatch.setattr(db_tools, "DB_PATH", str(tmp_path / "claims.db"))
+    db_tools.setup_db()
+    yield db_tools
+    db_tools.close_connection()
+
+
+@pytest.fixture
+def runtime(db, tmp_path, monkeypatch):
+    """Every store the graph touches in the temp dir; `main.get_graph()` builds a fresh graph."""
+    import main
+
+    monkeypatch.setenv("OPENROUTER_API_KEY", "x")
+    monkeypatch.setenv("CLAIMS_LOG_LEVEL", "WARNING")
+    monkeypatch.setenv("CHECKPOINT_DB_PATH", str(tmp_path / "checkpoints.db"))
+    monkeypatch.setenv("VISION_CACHE_PATH", str(tmp_path / "vision_cache.db"))
+    monkeypatch.setenv("PHASH_INDEX_PATH", str(tmp_path / "evidence_index.db"))
+    monkeypatch.setenv("EVIDENCE_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(main, "_graph", None)
+    return main
+
+
+@pytest.fixture
+def paused_claim(runtime):
+    """Runs ORD-123 ($1500, VIP) until it pauses for manager review; returns its thread_id."""
+    import uuid
+
+    thread_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    graph = runtime.get_graph()
+    graph.invoke({"claim_id": "ORD-123", "image_paths": ["simulated evidence"], "messages": []}, config=config)
+    assert "human_review" in graph.get_state(config).next
+    return thread_id
@@ -0,0 +1,67 @@
+import os
+import pytest
+
+streamlit = pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app_v0.py")
+
+
+@pytest.fixture
+def app(runtime):
+    """app_v0.py against temp databases, with a fresh graph for this test."""
+    streamlit.cache_resource.clear()
+    yield AppTest.from_file(APP, default_timeout=30)
+    streamlit.cache_resource.clear()
+
+
+def test_renders_empty_form(app):
+    app.run()
+    assert not app.exception
+    assert app.title[0].value == "📦 Logistics Damage Claim Agent"
+    assert app.sidebar.text_input[0].value == "ORD-123"
+    assert app.session_state.claim is None
+
+
+def test_submit_without_evidence_shows_error(app):
+    app.run()
+    app.sidebar.button[0].click().run()
+    assert not app.exception
+    assert app.error[0].value == "Please provide an Order ID and at least one Image/Video."
+
+
+def test_manager_approves_paused_claim(app, runtime, paused_claim):
+    # AppTest can't upload files, so the claim was paused by a direct graph run
+    config = {"configurable": {"thread_id": paused_claim}}
+    app.session_state.thread_id = paused_claim
+    app.session_state.claim = {"order_value": 1500.0, "customer_tier": "VIP",
+                               "refund_status": "Manual Review", "paused": True}
+    app.run()
+    assert "Action Required" in app.warning[0].value
+
+    approve = next(b for b in app.button if b.label == "✅ Approve Refund")
+    approve.click().run()
+    assert not app.exception
+    assert app.session_state.claim["refund_status"] == "Manager Approved"
+    assert "refund processed" in app.success[0].value
+    assert runtime.get_graph().get_state(config).next == ()
+
+
+def test_claim_decided_elsewhere_is_not_resumed_again(app, runtime, paused_claim):
+    import asyncio
+    from tools import review_queue
+
+    # The page still shows the claim as paused, but the review queue rejects it first
+    app.session_state.thread_id = paused_claim
+    app.session_state.claim = {"order_value": 1500.0, "customer_tier": "VIP",
+                               "refund_status": "Manual Review", "paused": True}
+    app.run()
+    graph = runtime.get_graph()
+    assert asyncio.run(review_queue.decide_many(graph, [paused_claim], approve=False))["resumed"] == 1
+
+    next(b for b in app.button if b.label == "✅ Approve Refund").click().run()
+    assert not app.exception
+    assert "Another reviewer" in app.info[0].value
+    assert app.session_state.claim["refund_status"] == "Rejected"
+    config = {"configurable": {"thread_id": paused_claim}}
+    assert graph.get_state(config).values["refund_status"] == "Rejected"
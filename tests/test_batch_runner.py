@@ -0,0 +1,27 @@
+import asyncio
+import threading
+import batch_runner
+from nodes import crm_node
+
+
+def test_sync_nodes_run_on_the_batch_pool(runtime, monkeypatch):
+    threads = []
+    lookup = crm_node.crm_node
+
+    def recording_crm_node(state):
+        threads.append(threading.current_thread().name)
+        return lookup(state)
+
+    monkeypatch.setattr(crm_node, "crm_node", recording_crm_node)
+    graph = runtime.build_graph()
+    claims = [{"claim_id": "ORD-456", "image_paths": ["simulated evidence"], "thread_id": f"t{i}"} for i in range(4)]
+
+    report = asyncio.run(batch_runner.run_batch(claims, concurrency=4, graph=graph, callbacks=[]))
+    assert report["total"] == 4 and not report["failed"]
+    assert len(threads) == 4 and all(name.startswith("claims") for name in threads)
+
+    # Outside the block the nodes fall back to the loop's default executor
+    threads.clear()
+    asyncio.run(graph.ainvoke({"claim_id": "ORD-123", "image_paths": ["simulated evidence"], "messages": []},
+                              config={"configurable": {"thread_id": "t9"}}))
+    assert threads and not threads[0].startswith("claims")
@@ -0,0 +1,42 @@
+import uuid
+from tools.checkpointer import SqliteCheckpointer
+
+
+def stalled_claim(runtime, checkpointer):
+    """A claim stopped before vision (e.g. parked and never retried): unfinished, not held."""
+    thread_id = str(uuid.uuid4())
+    graph = runtime.build_graph(checkpointer=checkpointer, interrupt_before=("vision",))
+    graph.invoke({"claim_id": "ORD-456", "image_paths": ["simulated evidence"], "messages": []},
+                 config={"configurable": {"thread_id": thread_id}})
+    return thread_id
+
+
+def age(checkpointer, days):
+    with checkpointer.lock:
+        checkpointer.conn.execute("UPDATE threads SET updated_at=updated_at-?", (days * 86400,))
+        checkpointer.conn.commit()
+
+
+def test_abandoned_sweep_keeps_claims_waiting_for_review(runtime, paused_claim):
+    checkpointer = runtime.get_graph().checkpointer
+    stalled = stalled_claim(runtime, checkpointer)
+    age(checkpointer, 90)
+
+    assert checkpointer.sweep(finished_ttl=86400, abandoned_ttl=30 * 86400) == [stalled]
+    assert checkpointer.get_tuple({"configurable": {"thread_id": paused_claim}}) is not None
+    assert checkpointer.get_tuple({"configurable": {"thread_id": stalled}}) is None
+
+
+def test_upgrade_marks_existing_review_threads_held(runtime, paused_claim, tmp_path):
+    checkpointer = runtime.get_graph().checkpointer
+    stalled = stalled_claim(runtime, checkpointer)
+    # A store written before threads.held existed
+    with checkpointer.lock:
+        checkpointer.conn.execute("ALTER TABLE threads DROP COLUMN held")
+        checkpointer.conn.commit()
+
+    upgraded = SqliteCheckpointer(checkpointer.path)
+    age(upgraded, 90)
+    assert upgraded.sweep(finished_ttl=86400, abandoned_ttl=30 * 86400) == [stalled]
+    assert upgraded.get_tuple({"configurable": {"thread_id": paused_claim}}) is not None
+    upgraded.close()
@@ -0,0 +1,103 @@
+import time
+import pytest
+from tools import job_queue
+
+
+@pytest.fixture
+def jobs(db, monkeypatch):
+    monkeypatch.setenv("JOB_LEASE_SECONDS", "60")
+    monkeypatch.setenv("JOB_MAX_FAILURES", "2")
+    return job_queue
+
+
+def row(thread_id):
+    from tools.db_tools import get_connection
+    status, failures, owner, available_at = get_connection().execute(
+        "SELECT status, failures, lease_owner, available_at FROM claim_jobs WHERE thread_id=?", (thread_id,)
+    ).fetchone()
+    return {"status": status, "failures": failures, "owner": owner, "available_at": available_at}
+
+
+def expire_lease(thread_id):
+    from tools.db_tools import get_connection
+    conn = get_connection()
+    conn.execute("UPDATE claim_jobs SET lease_expires=? WHERE thread_id=?", (time.time() - 1, thread_id))
+    conn.commit()
+
+
+def test_submit_is_idempotent(jobs):
+    thread_id = jobs.submit("ORD-456", ["a.jpg"], thread_id="t1")
+    assert jobs.submit("ORD-456", ["b.jpg"], thread_id="t1") == thread_id
+    assert jobs.stats()["queued"] == 1
+
+
+def test_lease_then_ack(jobs):
+    jobs.submit("ORD-456", ["a.jpg"], thread_id="t1")
+    [job] = jobs.lease("w1", limit=5)
+    assert job["thread_id"] == "t1" and job["image_paths"] == ["a.jpg"] and job["attempts"] == 1
+    assert row("t1")["status"] == "leased" and row("t1")["owner"] == "w1"
+    # A held lease is not handed out twice
+    assert jobs.lease("w2") == []
+    assert jobs.heartbeat("w1", ["t1"]) == {"t1"}
+    assert not jobs.ack("t1", "w2")
+    assert jobs.ack("t1", "w1", status="paused")
+    assert row("t1")["status"] == "paused" and row("t1")["owner"] is None
+    assert jobs.outstanding() == 0
+
+
+def test_retry_backs_off_then_gives_up(jobs):
+    jobs.submit("ORD-456", [], thread_id="t1")
+    jobs.lease("w1")
+    assert jobs.retry("t1", "w1", "boom", delay=30) == "queued"
+    assert row("t1")["failures"] == 1
+    # Not due until the backoff has passed
+    assert jobs.lease("w1") == []
+
+    from tools.db_tools import get_connection
+    get_connection().execute("UPDATE claim_jobs SET available_at=0 WHERE thread_id='t1'")
+    get_connection().commit()
+    jobs.lease("w1")
+    assert jobs.retry("t1", "w1", "boom again", delay=0) == "failed"
+    assert jobs.lease("w1") == []
+    assert jobs.retry("t1", "w1", "lost lease", delay=0) is None
+
+
+def test_parked_retry_does_not_count_as_failure(jobs):
+    jobs.submit("ORD-456", [], thread_id="t1")
+    jobs.lease("w1")
+    assert jobs.retry("t1", "w1", "vision down", delay=0, failed=False) == "queued"
+    assert row("t1")["failures"] == 0
+
+
+def test_fail_gives_up_at_once(jobs):
+    jobs.submit("ORD-456", [], thread_id="t1")
+    jobs.lease("w1")
+    assert jobs.fail("t1", "w1", "400 Bad Request")
+    assert row("t1")["status"] == "failed"
+    assert jobs.requeue() == 1
+    assert row("t1")["status"] == "queued" and row("t1")["failures"] == 0
+
+
+def test_expired_lease_is_taken_over_and_counted(jobs):
+    jobs.submit("ORD-456", [], thread_id="t1")
+    jobs.lease("w1")
+    expire_lease("t1")
+    [job] = jobs.lease("w2")
+    assert job["attempts"] == 2 and row("t1")["owner"] == "w2" and row("t1")["failures"] == 1
+    assert not jobs.ack("t1", "w1")
+    # The second crash reaches JOB_MAX_FAILURES: given up, not leased again
+    expire_lease("t1")
+    assert jobs.lease("w3") == []
+    assert row("t1")["status"] == "failed" and row("t1")["failures"] == 2
+
+
+def test_release_and_park(jobs, monkeypatch):
+    jobs.submit("ORD-456", [], thread_id="t1")
+    jobs.lease("w1")
+    assert jobs.release("w1") == 1
+    assert jobs.lease("w2")[0]["thread_id"] == "t1"
+
+    monkeypatch.setenv("JOB_PARK_DELAY", "30")
+    jobs.park("ORD-123", ["b.jpg"], "t2")
+    assert row("t2")["status"] == "queued" and row("t2")["available_at"] > time.time() + 20
+    assert jobs.lease("w2") == []
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from tools import llm_resilience
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A breaker that is half-open: its next call is the probe."""
+    monkeypatch.setenv("VISION_RETRIES", "0")
+    monkeypatch.setattr(llm_resilience, "breaker", llm_resilience.CircuitBreaker("test", failures=1, reset_after=0))
+    llm_resilience.breaker.record_failure()
+    assert llm_resilience.breaker.state == "half_open"
+    return llm_resilience.breaker
+
+
+def test_cancelled_async_probe_rearms_breaker(breaker):
+    async def scenario():
+        started = asyncio.Event()
+
+        async def attempt(model):
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.ensure_future(llm_resilience.acall(attempt))
+        await started.wait()
+        assert breaker.probing and not breaker.allow()
+        # e.g. the worker lost its lease on this claim
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert not breaker.probing
+    assert llm_resilience.call(lambda model: "verdict") == "verdict"
+    assert breaker.state == "closed"
+
+
+def test_interrupted_sync_probe_rearms_breaker(breaker):
+    def attempt(model):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        llm_resilience.call(attempt)
+    assert not breaker.probing and breaker.allow()
+
+
+def test_failed_probe_reopens_breaker(breaker):
+    def attempt(model):
+        raise TimeoutError("slow model")
+
+    with pytest.raises(llm_resilience.VisionUnavailableError):
+        llm_resilience.call(attempt)
+    assert breaker.opened_at is not None and not breaker.probing
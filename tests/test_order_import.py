@@ -0,0 +1,36 @@
+import pytest
+from tools import job_queue, order_import
+
+
+def indexes(db):
+    return {r[0] for r in db.get_connection().execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='orders' AND name LIKE 'idx_orders_%'")}
+
+
+def test_import_upserts_and_rebuilds_indexes(db):
+    report = order_import.import_orders([("ORD-1", 10.0, "GOLD"), ("ORD-456", 75.0, "VIP")], chunk_size=1)
+    assert report["loaded"] == 2
+    assert db.get_order_details("ORD-456") == {"amount": 75.0, "tier": "VIP"}
+    assert indexes(db) == set(db.ORDER_INDEXES)
+
+
+def test_failed_import_still_rebuilds_indexes(db):
+    def rows():
+        yield "ORD-1", 10.0, "GOLD"
+        raise OSError("export truncated")
+
+    with pytest.raises(OSError):
+        order_import.import_orders(rows(), chunk_size=1)
+    assert indexes(db) == set(db.ORDER_INDEXES)
+    assert db.get_order_details("ORD-1")["amount"] == 10.0
+
+
+def test_offline_import_refuses_while_a_worker_holds_a_lease(db):
+    job_queue.submit("ORD-456", [], thread_id="t1")
+    job_queue.lease("w1")
+    with pytest.raises(RuntimeError, match="worker"):
+        order_import.import_orders([("ORD-1", 10.0, "GOLD")])
+    assert indexes(db) == set(db.ORDER_INDEXES)
+
+    # An online import keeps the indexes in place, so it may run alongside
+    assert order_import.import_orders([("ORD-1", 10.0, "GOLD")], rebuild_indexes=False)["loaded"] == 1
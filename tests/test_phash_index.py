@@ -0,0 +1,61 @@
+import random
+import pytest
+from tools import phash_index
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setenv("PHASH_INDEX_PATH", str(tmp_path / "evidence_index.db"))
+    monkeypatch.setenv("PHASH_INDEX", "1")
+    monkeypatch.setattr(phash_index, "_conn", None)
+    yield phash_index
+    if phash_index._conn is not None:
+        phash_index._conn.close()
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_finds_hashes_within_radius(index):
+    rng = random.Random(3)
+    base = rng.getrandbits(64)
+    # The flips spread over all four 16-bit chunks, so no chunk matches exactly
+    near = flip(base, [1, 17, 33, 49, 50, 63])
+    far = flip(base, [1, 2, 17, 18, 33, 34, 49])
+    index.add(near, "ORD-1", {"is_valid_damage": True, "damage_description": "cracked"})
+    index.add(far, "ORD-2")
+    index.add_many([rng.getrandbits(64) for _ in range(500)], "ORD-noise")
+
+    matches = index.find(base, max_distance=6)
+    assert [(m["claim_id"], m["distance"]) for m in matches] == [("ORD-1", 6)]
+    assert matches[0]["is_valid_damage"] is True and matches[0]["damage_description"] == "cracked"
+    assert [m["claim_id"] for m in index.find(base, max_distance=7)] == ["ORD-1", "ORD-2"]
+
+
+def test_matches_brute_force(index):
+    rng = random.Random(11)
+    stored = [rng.getrandbits(64) for _ in range(300)]
+    # Near-duplicates of the first few, at every distance up to the radius
+    stored += [flip(stored[i], rng.sample(range(64), i % 9)) for i in range(40)]
+    for i, value in enumerate(stored):
+        index.add(value, f"ORD-{i}")
+
+    for query in stored[:40]:
+        expected = sorted((value ^ query).bit_count() for value in stored if (value ^ query).bit_count() <= 8)
+        assert [m["distance"] for m in index.find(query, max_distance=8)] == expected
+
+
+def test_exclude_claim_and_high_bit_hashes(index):
+    value = (1 << 63) | 5  # stored as a negative SQLite integer
+    index.add(value, "ORD-1")
+    assert index.find(value, max_distance=0)[0]["distance"] == 0
+    assert index.find(value, max_distance=0, exclude_claim="ORD-1") == []
+
+
+def test_disabled_index_is_inert(index, monkeypatch):
+    monkeypatch.setenv("PHASH_INDEX", "0")
+    index.add(123, "ORD-1")
+    assert index.find(123) == []
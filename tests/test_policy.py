@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from tools import policy
+
+RULES = [
+    {"name": "no-damage", "damaged": False, "decision": policy.REJECTED},
+    {"name": "reused-evidence", "reused": True, "decision": policy.REVIEW},
+    {"name": "vip-high-value", "tier": ["vip", "Gold"], "above": 500, "decision": policy.REVIEW},
+    {"name": "regular-small", "tier": "REGULAR", "up_to": 100, "decision": policy.APPROVED},
+    {"name": "regular-large", "tier": "Regular", "above": 1000, "decision": policy.REJECTED},
+    {"name": "default", "decision": policy.APPROVED},
+]
+
+
+@pytest.mark.parametrize("rules", [policy.DEFAULT_RULES, RULES], ids=["default", "tiered"])
+def test_evaluate_many_matches_evaluate(rules):
+    history = policy.synthetic_history(5000)
+    # Mixed-case tiers, as a CSV export or a hand-written rule might spell them
+    history["customer_tier"] = np.array([t.lower() if i % 3 == 0 else t.title() if i % 3 == 1 else t
+                                         for i, t in enumerate(history["customer_tier"])])
+    vectorized = policy.evaluate_many(rules, history["order_value"], history["customer_tier"],
+                                      history["is_valid_damage"], history["reused"])
+    for i in range(len(vectorized)):
+        claim = {
+            "order_value": float(history["order_value"][i]),
+            "customer_tier": str(history["customer_tier"][i]),
+            "is_valid_damage": bool(history["is_valid_damage"][i]),
+            "reused_evidence": bool(history["reused"][i]),
+        }
+        assert policy.DECISIONS[vectorized[i]] == policy.evaluate(claim, rules)[0], claim
+
+
+def test_tier_matching_ignores_case():
+    claim = {"order_value": 800, "customer_tier": "VIP", "is_valid_damage": True}
+    assert policy.evaluate(claim, RULES)[1]["name"] == "vip-high-value"
+    assert policy.evaluate({**claim, "customer_tier": "vip"}, RULES)[1]["name"] == "vip-high-value"
+
+
+def test_load_history_csv_matches_rules(tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text("order_value,customer_tier,is_valid_damage\n800,vip,true\n50,Regular,yes\n20,,0\n")
+    history = policy.load_history(str(path))
+    decisions = policy.evaluate_many(RULES, history["order_value"], history["customer_tier"],
+                                     history["is_valid_damage"], history["reused"])
+    assert [policy.DECISIONS[d] for d in decisions] == [policy.REVIEW, policy.APPROVED, policy.REJECTED]
+
+
+def test_validate_rejects_conditional_last_rule():
+    with pytest.raises(ValueError):
+        policy.validate([{"tier": "VIP", "decision": policy.APPROVED}])
@@ -0,0 +1,47 @@
+from nodes.precheck_node import precheck_node, route_precheck
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def claim(claim_id="ORD-456", value=50.0, tier="REGULAR"):
+    return {"claim_id": claim_id, "order_value": value, "customer_tier": tier}
+
+
+def test_passes_new_claim_and_reserves_it(db):
+    state = claim()
+    assert precheck_node(state, config("t1")) == {}
+    assert route_precheck(state) == "vision"
+    # The same thread resuming its own claim is not a duplicate
+    assert precheck_node(state, config("t1")) == {}
+
+
+def test_rejects_unknown_and_zero_value_orders(db):
+    assert precheck_node(claim("ORD-404", 0, "Unknown"), config("t1"))["precheck_reason"] == "order not found"
+    assert precheck_node(claim(value=0), config("t1"))["precheck_reason"] == "zero-value order"
+
+
+def test_rejects_duplicate_in_flight(db):
+    assert precheck_node(claim(), config("t1")) == {}
+    result = precheck_node(claim(), config("t2"))
+    assert result == {"refund_status": "Rejected", "precheck_reason": "already in flight (t1)"}
+    assert route_precheck({**claim(), **result}) == "END"
+
+
+def test_rejects_already_decided(db):
+    db.record_decision("ORD-456", "Approved", thread_id="t1")
+    result = precheck_node(claim(), config("t2"))
+    assert result["precheck_reason"] == "already decided (Approved)"
+
+
+def test_released_claim_can_be_submitted_again(db):
+    assert precheck_node(claim(), config("t1")) == {}
+    db.release_claim("ORD-456", "t1")
+    assert precheck_node(claim(), config("t2")) == {}
+
+
+def test_swept_thread_releases_its_reservation(db):
+    assert precheck_node(claim(), config("t1")) == {}
+    db.release_threads(["t1"])
+    assert precheck_node(claim(), config("t2")) == {}
@@ -0,0 +1,34 @@
+from tools import review_queue
+
+
+def test_tier_filter_ignores_case(db):
+    review_queue.enqueue("t1", {"claim_id": "ORD-123", "order_value": 1500.0, "customer_tier": "vip"}, "high value")
+    review_queue.enqueue("t2", {"claim_id": "ORD-456", "order_value": 50.0, "customer_tier": "REGULAR"})
+    assert [r["thread_id"] for r in review_queue.list_pending(tier="VIP")] == ["t1"]
+    assert review_queue.list_pending(tier="Vip")[0]["customer_tier"] == "VIP"
+    assert review_queue.count_pending(tier="regular") == 1
+    assert review_queue.pending_thread_ids(tier="Regular") == ["t2"]
+
+
+def test_only_one_decision_resumes_a_claim(runtime, paused_claim):
+    import asyncio
+
+    graph = runtime.get_graph()
+    config = {"configurable": {"thread_id": paused_claim}}
+
+    async def both():
+        # Two managers deciding the same claim at once
+        return await asyncio.gather(
+            review_queue.decide_many(graph, [paused_claim], approve=True),
+            review_queue.decide_many(graph, [paused_claim], approve=False),
+        )
+
+    reports = asyncio.run(both())
+    assert sorted((r["resumed"], r["skipped"]) for r in reports) == [(0, 1), (1, 0)]
+    winner = next(r for r in reports if r["resumed"])
+    assert graph.get_state(config).values["refund_status"] == winner["decision"]
+
+    # A late decision on the finished claim changes nothing
+    late = asyncio.run(review_queue.decide_many(graph, [paused_claim], approve=winner["decision"] != "Manager Approved"))
+    assert late["skipped"] == 1
+    assert graph.get_state(config).values["refund_status"] == winner["decision"]
@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+from tools import triage
+
+
+def encode(gray):
+    return cv2.imencode(".jpg", gray)[1].tobytes()
+
+
+def noise(seed=1):
+    return encode(np.random.default_rng(seed).integers(0, 256, (480, 640), dtype=np.uint8))
+
+
+def plain_box():
+    gray = np.full((480, 640), 170, np.uint8)
+    cv2.rectangle(gray, (120, 100), (520, 380), 90, 3)
+    return encode(gray)
+
+
+def soft_dent():
+    gray = np.full((480, 640), 150, np.uint8)
+    cv2.circle(gray, (320, 240), 80, 120, -1)
+    return encode(cv2.GaussianBlur(gray, (31, 31), 0))
+
+
+def test_defaults_never_decide_on_the_score():
+    # High texture scores ~1.0, a plain box ~0; neither is settled without the model
+    for images in ([noise()], [plain_box()], [soft_dent()]):
+        result = triage.assess(images)
+        assert result["verdict"] is None and result["usable"] == [0], result
+
+
+def test_damage_is_never_approved_locally(monkeypatch):
+    monkeypatch.setenv("TRIAGE_DAMAGE_ABOVE", "0")
+    result = triage.assess([noise()])
+    assert result["outcome"] == "damaged" and result["verdict"] is None
+
+
+def test_calibrated_thresholds_reject_clean_and_unusable(monkeypatch):
+    monkeypatch.setenv("TRIAGE_CLEAN_BELOW", "0.03")
+    assert triage.assess([plain_box()])["verdict"]["is_valid_damage"] is False
+    dark = encode(np.full((480, 640), 5, np.uint8))
+    assert triage.assess([dark])["outcome"] == "unusable"
@@ -0,0 +1,405 @@
+import os
+import time
+import zlib
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+"""
+checkpointer.py : a durable, bounded SQLite checkpointer for the claim graph.
+
+Unlike `MemorySaver`, paused human-review claims survive a restart and memory
+stays flat: checkpoints live on disk as zlib-compressed blobs, only the latest
+`keep_last` checkpoints are kept per thread, and a background sweep deletes
+finished threads once they are older than `finished_ttl` seconds.
+Unfinished threads (parked and never retried, or abandoned mid-run) are
+deleted once they have not moved for `abandoned_ttl` seconds. Threads paused
+before a `hold_nodes` node (human_review: a claim waiting for a manager)
+are never swept unfinished; they wait as long as the manager takes.
+
+    CHECKPOINT_DB_PATH         SQLite file (default: checkpoints.db)
+    CHECKPOINT_KEEP_LAST       checkpoints kept per thread (default: 3)
+    CHECKPOINT_FINISHED_TTL    seconds a finished thread is kept (default: 1 day)
+    CHECKPOINT_ABANDONED_TTL   seconds an unfinished thread is kept without progress (default: 30 days, 0 = forever)
+    CHECKPOINT_SWEEP_INTERVAL  seconds between sweeps (default: 300)
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = "checkpoints.db"
+
+# Blobs smaller than this are stored raw; zlib's header makes tiny blobs bigger.
+_COMPRESS_MIN = 256
+
+# Channels that, when holding a value, mean some node is still due to run
+_TRIGGER_PREFIXES = ("branch:to:", "join:", "__start__")
+
+
+def _pack(typed):
+    type_, data = typed
+    if len(data) >= _COMPRESS_MIN:
+        return "z:" + type_, zlib.compress(data, 1)
+    return type_, data
+
+
+def _unpack(type_, data):
+    if type_.startswith("z:"):
+        return type_[2:], zlib.decompress(data)
+    return type_, data
+
+
+def _pending(channel, value):
+    if not channel.startswith(_TRIGGER_PREFIXES):
+        return False
+    if channel.startswith("join:"):
+        # Join barriers keep an empty "seen" set after they fire
+        seen = value[0] if isinstance(value, tuple) else value
+        return bool(seen)
+    return True
+
+
+def is_finished(checkpoint):
+    """A checkpoint is finished when no node is left to trigger (the graph hit END)."""
+    return not any(_pending(k, v) for k, v in checkpoint["channel_values"].items())
+
+
+def is_held(checkpoint, nodes):
+    """True when one of `nodes` is due to run next, e.g. a claim paused before human_review."""
+    return any(f"branch:to:{node}" in checkpoint["channel_values"] for node in nodes)
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """Checkpoint saver backed by a local SQLite file."""
+
+    def __init__(self, path=None, *, keep_last=None, finished_ttl=None, abandoned_ttl=None,
+                 hold_nodes=("human_review",), serde=None):
+        super().__init__(serde=serde)
+        self.hold_nodes = tuple(hold_nodes)
+        self.path = path or os.environ.get("CHECKPOINT_DB_PATH", DEFAULT_PATH)
+        self.keep_last = keep_last or int(os.environ.get("CHECKPOINT_KEEP_LAST", 3))
+        self.finished_ttl = finished_ttl if finished_ttl is not None else float(
+            os.environ.get("CHECKPOINT_FINISHED_TTL", 24 * 3600)
+        )
+        self.abandoned_ttl = abandoned_ttl if abandoned_ttl is not None else float(
+            os.environ.get("CHECKPOINT_ABANDONED_TTL", 30 * 24 * 3600)
+        )
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._sweeper = None
+        self._stop = threading.Event()
+        self._setup()
+
+    def _setup(self):
+        with self.lock:
+            # auto_vacuum must be set before the first table is created
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA busy_timeout=5000")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint BLOB,
+                    metadata_type TEXT,
+                    metadata BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    value BLOB,
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id TEXT PRIMARY KEY,
+                    finished INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    held INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_threads_sweep ON threads(finished, updated_at);
+            """)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(threads)")}
+            if "held" not in columns:
+                self.conn.execute("ALTER TABLE threads ADD COLUMN held INTEGER NOT NULL DEFAULT 0")
+                self._backfill_held()
+            self.conn.commit()
+
+    def _backfill_held(self):
+        """Marks the held threads of a store written before `held` existed (once, on upgrade)."""
+        rows = self.conn.execute(
+            """SELECT t.thread_id, c.type, c.checkpoint FROM threads t JOIN checkpoints c
+                   ON c.thread_id=t.thread_id AND c.checkpoint_ns='' AND c.checkpoint_id=(
+                       SELECT MAX(checkpoint_id) FROM checkpoints
+                       WHERE thread_id=t.thread_id AND checkpoint_ns='')
+               WHERE t.finished=0"""
+        ).fetchall()
+        held = [(thread_id,) for thread_id, type_, blob in rows
+                if is_held(self.serde.loads_typed(_unpack(type_, blob)), self.hold_nodes)]
+        self.conn.executemany("UPDATE threads SET held=1 WHERE thread_id=?", held)
+
+    # --- Reads ---
+    def _load_tuple(self, row):
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, mtype, mblob = row
+        checkpoint = self.serde.loads_typed(_unpack(type_, blob))
+        metadata = self.serde.loads_typed(_unpack(mtype, mblob))
+        writes = sorted(self.conn.execute(
+            "SELECT task_path, task_id, idx, channel, type, value FROM writes "
+            "WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ), key=lambda w: writes_sort_key(w[0], w[1], w[2]))
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=(
+                {"configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_id,
+                }}
+                if parent_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(_unpack(t, v)))
+                for _, task_id, _, channel, t, v in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = "SELECT * FROM checkpoints WHERE thread_id=? AND checkpoint_ns=?"
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id=?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self.lock:
+            row = self.conn.execute(query, params).fetchone()
+            return self._load_tuple(row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id=?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns=?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id=?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id<?")
+            params.append(before_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM checkpoints{where} ORDER BY checkpoint_id DESC", params
+            ).fetchall()
+            tuples = [self._load_tuple(row) for row in rows]
+
+        for item in tuples:
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield item
+
+    # --- Writes ---
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, blob = _pack(self.serde.dumps_typed(checkpoint))
+        mtype, mblob = _pack(self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)))
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?,?,?,?,?,?,?,?)",
+                (thread_id, checkpoint_ns, checkpoint["id"],
+                 config["configurable"].get("checkpoint_id"), type_, blob, mtype, mblob),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, finished, updated_at, held) VALUES (?,?,?,?)",
+                (thread_id, int(is_finished(checkpoint)), time.time(),
+                 int(is_held(checkpoint, self.hold_nodes))),
+            )
+            self._prune(thread_id, checkpoint_ns)
+            self.conn.commit()
+
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def _prune(self, thread_id, checkpoint_ns):
+        """Keeps only the newest `keep_last` checkpoints (and their writes) of a thread."""
+        stale = self.conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last),
+        ).fetchall()
+        if stale:
+            params = [(thread_id, checkpoint_ns, row[0]) for row in stale]
+            self.conn.executemany(
+                "DELETE FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?", params
+            )
+            self.conn.executemany(
+                "DELETE FROM writes WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?", params
+            )
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) have fixed negative indexes and
+        # may be overwritten; regular writes are idempotent per task.
+        verb = "REPLACE" if all(c in WRITES_IDX_MAP for c, _ in writes) else "IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = _pack(self.serde.dumps_typed(value))
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id,
+                         WRITES_IDX_MAP.get(channel, idx), channel, type_, blob, task_path))
+
+        with self.lock:
+            self.conn.executemany(f"INSERT OR {verb} INTO writes VALUES (?,?,?,?,?,?,?,?,?)", rows)
+            # A node that ran (or failed, e.g. a parked vision call) is progress too
+            self.conn.execute("UPDATE threads SET updated_at=? WHERE thread_id=?", (time.time(), thread_id))
+            self.conn.commit()
+
+    def delete_thread(self, thread_id):
+        with self.lock:
+            self._delete_threads([thread_id])
+            self.conn.commit()
+
+    def _delete_threads(self, thread_ids):
+        params = [(t,) for t in thread_ids]
+        for table in ("checkpoints", "writes", "threads"):
+            self.conn.executemany(f"DELETE FROM {table} WHERE thread_id=?", params)
+
+    # --- Async API (SQLite work runs in a worker thread) ---
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current, channel):
+        # Same scheme as MemorySaver: zero-padded counter plus a random tiebreak
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- Compaction ---
+    def sweep(self, finished_ttl=None, abandoned_ttl=None):
+        """
+        Deletes finished threads older than `finished_ttl` seconds, and
+        unfinished ones untouched for `abandoned_ttl` seconds (0 keeps them)
+        unless they are held for a `hold_nodes` node, then returns the freed pages to the filesystem. Returns the list of
+        deleted thread IDs.
+        """
+        ttl = self.finished_ttl if finished_ttl is None else finished_ttl
+        abandoned_ttl = self.abandoned_ttl if abandoned_ttl is None else abandoned_ttl
+        now = time.time()
+        with self.lock:
+            expired = [row[0] for row in self.conn.execute(
+                "SELECT thread_id FROM threads WHERE finished=1 AND updated_at<?", (now - ttl,),
+            )]
+            if abandoned_ttl > 0:
+                abandoned = [row[0] for row in self.conn.execute(
+                    "SELECT thread_id FROM threads WHERE finished=0 AND held=0 AND updated_at<?",
+                    (now - abandoned_ttl,),
+                )]
+                if abandoned:
+                    logger.info("🧹 [Checkpointer] Expiring %d threads idle for over %.0f days.",
+                                len(abandoned), abandoned_ttl / 86400)
+                expired += abandoned
+            if expired:
+                self._delete_threads(expired)
+                self.conn.commit()
+                self.conn.execute("PRAGMA incremental_vacuum")
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return expired
+
+    def start_sweeper(self, interval=None, on_sweep=None):
+        """
+        Runs `sweep()` every `interval` seconds on a daemon thread.
+        `on_sweep(thread_ids)` is called with the threads each pass deleted.
+        """
+        if self._sweeper is not None:
+            return
+        interval = interval or float(os.environ.get("CHECKPOINT_SWEEP_INTERVAL", 300))
+
+        def loop():
+            while not self._stop.wait(interval):
+                deleted = self.sweep()
+                if deleted:
+                    logger.info("🧹 [Checkpointer] Swept %d threads.", len(deleted))
+                    if on_sweep is not None:
+                        try:
+                            on_sweep(deleted)
+                        except Exception as e:
+                            logger.warning("   ⚠️ Sweep hook failed: %s", e)
+
+        self._sweeper = threading.Thread(target=loop, name="checkpoint-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+        self._stop.clear()
+
+    def close(self):
+        self.stop_sweeper()
+        with self.lock:
+            self.conn.close()
@@ -1,21 +1,179 @@
 import sqlite3
 import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from tools import metrics
+
+logger = logging.getLogger(__name__)
 
 DB_PATH = "claims.db"
 
-def setup_db():
-    """Initializes a dummy database with orders."""
-    conn = sqlite3.connect(DB_PATH)
+# Tuned for many short concurrent reads: WAL lets readers run alongside a
+# writer, and busy_timeout waits out brief locks instead of failing.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Secondary indexes on orders: name -> column. Offline bulk imports drop these
+# first and rebuild them once the rows are in (see tools/order_import.py).
+ORDER_INDEXES = {
+    "idx_orders_tier": "customer_tier",
+    "idx_orders_amount": "amount",
+}
+
+# Hot-order LRU; ORDER_CACHE_SIZE=0 disables it.
+ORDER_CACHE_SIZE = int(os.environ.get("ORDER_CACHE_SIZE", 4096))
+
+_local = threading.local()
+_cache_lock = threading.Lock()
+_order_cache = OrderedDict()
+
+def get_connection(db_path=None):
+    """
+    Returns this thread's connection to the orders DB, opening it on first
+    use. Connections are reused for the life of the thread instead of being
+    opened and closed around every query.
+    """
+    db_path = db_path or DB_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conns[db_path] = conn
+    return conn
+
+def close_connection(db_path=None):
+    """Closes this thread's connection (if any)."""
+    conns = getattr(_local, "conns", {})
+    conn = conns.pop(db_path or DB_PATH, None)
+    if conn is not None:
+        conn.close()
+
+def _add_columns(cursor, table, columns):
+    """Adds columns missing from a table created by an older version."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def setup_db(reset=False, db_path=None):
+    """
+    Initializes the orders database. Safe to call on every start: the table
+    is only created if missing and the demo orders are only added if absent.
+    Pass reset=True to drop and re-seed the table.
+    """
+    conn = get_connection(db_path)
     cursor = conn.cursor()
-    cursor.execute("DROP TABLE IF EXISTS orders")
+    if reset:
+        cursor.execute("DROP TABLE IF EXISTS orders")
+        cursor.execute("DROP TABLE IF EXISTS claim_decisions")
+        cursor.execute("DROP TABLE IF EXISTS claim_reservations")
+        cursor.execute("DROP TABLE IF EXISTS review_queue")
+        cursor.execute("DROP TABLE IF EXISTS evidence_blobs")
+        cursor.execute("DROP TABLE IF EXISTS evidence_refs")
+        cursor.execute("DROP TABLE IF EXISTS claim_jobs")
     cursor.execute("""
-        CREATE TABLE orders (
+        CREATE TABLE IF NOT EXISTS orders (
             order_id TEXT PRIMARY KEY,
             amount REAL,
             customer_tier TEXT
         )
     """)
-    
+    for name, column in ORDER_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON orders({column})")
+    # Final outcome of every claim that reached the refund step
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS claim_decisions (
+            claim_id TEXT PRIMARY KEY,
+            refund_status TEXT NOT NULL,
+            thread_id TEXT,
+            decided_at REAL NOT NULL
+        )
+    """)
+    # Claims accepted by the precheck and not yet decided, one thread per claim_id
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS claim_reservations (
+            claim_id TEXT PRIMARY KEY,
+            thread_id TEXT,
+            reserved_at REAL NOT NULL
+        )
+    """)
+
+    # Claims paused for a manager (see tools/review_queue.py), indexed for
+    # listing pending entries by age, tier and order value
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_queue (
+            thread_id TEXT PRIMARY KEY,
+            claim_id TEXT NOT NULL,
+            order_value REAL,
+            customer_tier TEXT,
+            reason TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            refund_status TEXT,
+            created_at REAL NOT NULL,
+            decided_at REAL,
+            claimed_by TEXT,
+            claimed_at REAL
+        )
+    """)
+    _add_columns(cursor, "review_queue", {"claimed_by": "TEXT", "claimed_at": "REAL"})
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_status_age ON review_queue(status, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_status_tier ON review_queue(status, customer_tier, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_status_value ON review_queue(status, order_value)")
+    # Entries queued before tiers were normalized (see policy.normalize_tier)
+    cursor.execute("UPDATE review_queue SET customer_tier=upper(coalesce(customer_tier, 'Unknown')) "
+                   "WHERE customer_tier IS NULL OR customer_tier<>upper(customer_tier)")
+
+    # Uploaded evidence blobs and the claims referencing them (see tools/evidence_store.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS evidence_blobs (
+            path TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            size INTEGER,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS evidence_refs (
+            ref TEXT NOT NULL,
+            path TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (ref, path)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_evidence_refs_path ON evidence_refs(path)")
+
+    # Claims waiting for, or leased by, a worker process (see tools/job_queue.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS claim_jobs (
+            thread_id TEXT PRIMARY KEY,
+            claim_id TEXT NOT NULL,
+            image_paths TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            available_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_claim_jobs_ready ON claim_jobs(status, available_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_claim_jobs_lease ON claim_jobs(status, lease_expires)")
+
     # Seed Data
     # ORD-123: High value (Trigger Human Review)
     # ORD-456: Low value (Auto Approve)
@@ -23,22 +181,141 @@ def setup_db():
         ("ORD-123", 1500.00, "VIP"),
         ("ORD-456", 50.00, "REGULAR")
     ]
-    cursor.executemany("INSERT INTO orders VALUES (?,?,?)", data)
+    cursor.executemany("INSERT OR IGNORE INTO orders VALUES (?,?,?)", data)
     conn.commit()
-    conn.close()
-    print("✅ Database initialized with dummy orders.")
+    invalidate_order_cache()
+    logger.info("✅ Database %s with dummy orders.", "reset" if reset else "initialized")
 
+# --- Hot-order cache ---
+def _cache_get(order_id):
+    with _cache_lock:
+        row = _order_cache.get(order_id)
+        if row is not None:
+            _order_cache.move_to_end(order_id)
+        return row
+
+def _cache_put(order_id, row):
+    if ORDER_CACHE_SIZE <= 0:
+        return
+    with _cache_lock:
+        _order_cache[order_id] = row
+        _order_cache.move_to_end(order_id)
+        while len(_order_cache) > ORDER_CACHE_SIZE:
+            _order_cache.popitem(last=False)
+
+def invalidate_order_cache(order_ids=None):
+    """Drops the given order IDs from the cache, or everything if None."""
+    with _cache_lock:
+        if order_ids is None:
+            _order_cache.clear()
+        else:
+            for order_id in order_ids:
+                _order_cache.pop(order_id, None)
+
+# --- Lookups ---
 def get_order_details(order_id: str):
     """Fetches order details from SQLite."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT amount, customer_tier FROM orders WHERE order_id=?", (order_id,))
+    row = _cache_get(order_id)
+    if row is not None:
+        return dict(row)
+
+    started = time.perf_counter()
+    cursor = get_connection().execute(
+        "SELECT amount, customer_tier FROM orders WHERE order_id=?", (order_id,)
+    )
     row = cursor.fetchone()
-    conn.close()
-    
+    metrics.observe("claims_sqlite_query_seconds", time.perf_counter() - started, query="get_order_details")
+
     if row:
-        return {"amount": row[0], "tier": row[1]}
+        details = {"amount": row[0], "tier": row[1]}
+        _cache_put(order_id, details)
+        return dict(details)
     return None
 
+# SQLite's default limit on bound parameters is 999 on older builds
+_IN_CHUNK = 900
+
+def get_order_details_many(order_ids):
+    """
+    Fetches many orders at once. Cached rows are served from memory and the
+    rest are resolved with a single `IN` query (chunked for very large
+    batches). Returns {order_id: details}; unknown IDs are left out.
+    """
+    found, missing = {}, []
+    for order_id in dict.fromkeys(order_ids):
+        row = _cache_get(order_id)
+        if row is not None:
+            found[order_id] = dict(row)
+        else:
+            missing.append(order_id)
+
+    conn = get_connection()
+    started = time.perf_counter()
+    for start in range(0, len(missing), _IN_CHUNK):
+        chunk = missing[start:start + _IN_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT order_id, amount, customer_tier FROM orders WHERE order_id IN ({placeholders})",
+            chunk,
+        ).fetchall()
+        for order_id, amount, tier in rows:
+            details = {"amount": amount, "tier": tier}
+            _cache_put(order_id, details)
+            found[order_id] = dict(details)
+    if missing:
+        metrics.observe("claims_sqlite_query_seconds", time.perf_counter() - started, query="get_order_details_many")
+    return found
+
+# --- Claim decisions ---
+def record_decision(claim_id, refund_status, thread_id=None):
+    """Stores the final outcome of a claim; the first decision wins."""
+    conn = get_connection()
+    conn.execute(
+        "INSERT OR IGNORE INTO claim_decisions VALUES (?,?,?,?)",
+        (claim_id, refund_status, thread_id, time.time()),
+    )
+    conn.commit()
+
+def get_decision(claim_id):
+    """Returns the recorded refund_status for a claim, or None if undecided."""
+    started = time.perf_counter()
+    row = get_connection().execute(
+        "SELECT refund_status FROM claim_decisions WHERE claim_id=?", (claim_id,)
+    ).fetchone()
+    metrics.observe("claims_sqlite_query_seconds", time.perf_counter() - started, query="get_decision")
+    return row[0] if row else None
+
+def reserve_claim(claim_id, thread_id):
+    """
+    Reserves a claim for a thread, atomically. Returns the thread holding
+    the reservation: `thread_id` if it won (or already held it), else the
+    thread that got there first.
+    """
+    conn = get_connection()
+    inserted = conn.execute(
+        "INSERT INTO claim_reservations VALUES (?,?,?) ON CONFLICT(claim_id) DO NOTHING",
+        (claim_id, thread_id, time.time()),
+    ).rowcount
+    conn.commit()
+    if inserted:
+        return thread_id
+    row = conn.execute("SELECT thread_id FROM claim_reservations WHERE claim_id=?", (claim_id,)).fetchone()
+    # Released between the two statements: try again
+    return row[0] if row else reserve_claim(claim_id, thread_id)
+
+def release_threads(thread_ids):
+    """Drops the reservations held by threads whose checkpoints were swept."""
+    conn = get_connection()
+    conn.executemany("DELETE FROM claim_reservations WHERE thread_id=?", [(t,) for t in thread_ids])
+    conn.commit()
+
+def release_claim(claim_id, thread_id):
+    """Drops the thread's reservation on a claim so it can be submitted again."""
+    conn = get_connection()
+    conn.execute("DELETE FROM claim_reservations WHERE claim_id=? AND thread_id IS ?", (claim_id, thread_id))
+    conn.commit()
+
 if __name__ == "__main__":
-    setup_db()
\ No newline at end of file
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    setup_db(reset="--reset" in sys.argv)
@@ -0,0 +1,196 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from tools import metrics
+from tools.db_tools import get_connection
+
+"""
+evidence_store.py : content-addressed, deduplicating store for uploaded evidence.
+
+Every upload is written once, at blobs/<aa>/<bb>/<sha256><ext> under
+EVIDENCE_DIR. The two-level shard keeps directories small. An identical
+upload from any customer resolves to the same file, so same-named uploads
+can no longer overwrite each other. New blobs are hardlinked or renamed
+into place when the source is on the same filesystem, and copied only as
+a last resort.
+
+Each claim (thread_id) holds references to its blobs in claims.db. When
+the checkpointer sweeps a thread (finished, or unfinished and idle past
+CHECKPOINT_ABANDONED_TTL), `release()` drops its references, and `gc()`
+deletes blobs nobody references any more.
+
+    EVIDENCE_DIR        root directory (default: uploads)
+    EVIDENCE_GC_GRACE   seconds an unreferenced blob is kept before removal (default: 3600)
+"""
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 1 << 20
+
+
+def root():
+    return os.environ.get("EVIDENCE_DIR", "uploads")
+
+
+def _grace():
+    return float(os.environ.get("EVIDENCE_GC_GRACE", 3600))
+
+
+def blob_path(digest, ext=""):
+    return os.path.join(root(), "blobs", digest[:2], digest[2:4], digest + ext)
+
+
+def _ext(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    # Keep the extension: vision_node tells videos from images by it
+    return ext if len(ext) <= 8 else ""
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _place(src, dest, move):
+    """Puts `src` at `dest` atomically: rename or hardlink, else copy + rename."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        if move:
+            os.replace(src, dest)
+        else:
+            os.link(src, dest)
+        return "move" if move else "link"
+    except FileExistsError:
+        return "exists"
+    except OSError:
+        pass  # Different filesystem, or links not supported
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".incoming-")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if move:
+        os.remove(src)
+    return "copy"
+
+
+def _track(path, digest, size, ref):
+    conn = get_connection()
+    now = time.time()
+    conn.execute(
+        "INSERT INTO evidence_blobs (path, sha256, size, created_at) VALUES (?,?,?,?) "
+        "ON CONFLICT(path) DO UPDATE SET created_at=excluded.created_at",
+        (path, digest, size, now),
+    )
+    if ref is not None:
+        conn.execute("INSERT OR IGNORE INTO evidence_refs (path, ref, created_at) VALUES (?,?,?)", (path, ref, now))
+    conn.commit()
+
+
+def store_file(src, ref=None, filename=None, move=False):
+    """
+    Stores the file at `src` and records a reference from `ref` (usually the
+    claim's thread_id). Returns the blob path to put in `image_paths`. With
+    `move`, the source file is consumed.
+    """
+    digest = _hash_file(src)
+    size = os.path.getsize(src)
+    dest = blob_path(digest, _ext(filename or src))
+    # Track first: a fresh row keeps gc() off the blob while we place it
+    _track(dest, digest, size, ref)
+    if os.path.exists(dest):
+        method = "dedup"
+        if move:
+            os.remove(src)
+    else:
+        method = _place(src, dest, move)
+        if method == "exists":
+            method = "dedup"
+    metrics.inc("claims_evidence_stored_total", method=method)
+    if method != "dedup":
+        metrics.inc("claims_evidence_bytes_total", size)
+    return dest
+
+
+def store_bytes(data, filename, ref=None):
+    """Stores an in-memory upload (e.g. Streamlit's getbuffer()); returns the blob path."""
+    data = bytes(data)
+    digest = hashlib.sha256(data).hexdigest()
+    dest = blob_path(digest, _ext(filename))
+    _track(dest, digest, len(data), ref)
+    if os.path.exists(dest):
+        metrics.inc("claims_evidence_stored_total", method="dedup")
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".incoming-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+        metrics.inc("claims_evidence_stored_total", method="write")
+        metrics.inc("claims_evidence_bytes_total", len(data))
+    return dest
+
+
+def release(refs):
+    """Drops every blob reference held by the given refs (thread IDs)."""
+    refs = list(refs)
+    if not refs:
+        return 0
+    conn = get_connection()
+    removed = 0
+    for start in range(0, len(refs), 900):
+        chunk = refs[start:start + 900]
+        removed += conn.execute(
+            f"DELETE FROM evidence_refs WHERE ref IN ({','.join('?' * len(chunk))})", chunk
+        ).rowcount
+    conn.commit()
+    return removed
+
+
+def gc(grace=None):
+    """
+    Deletes blobs that have no references and were stored more than `grace`
+    seconds ago. The grace period protects an upload whose reference is
+    still being recorded. Returns (blobs removed, bytes freed).
+    """
+    grace = _grace() if grace is None else grace
+    conn = get_connection()
+    orphans = conn.execute(
+        "SELECT path, size FROM evidence_blobs b WHERE created_at<? "
+        "AND NOT EXISTS (SELECT 1 FROM evidence_refs r WHERE r.path=b.path)",
+        (time.time() - grace,),
+    ).fetchall()
+    freed = 0
+    for path, size in orphans:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        freed += size or 0
+    conn.executemany("DELETE FROM evidence_blobs WHERE path=?", [(p,) for p, _ in orphans])
+    conn.commit()
+    if orphans:
+        logger.info("🧹 [Evidence Store] Removed %d unreferenced blobs (%d KiB).", len(orphans), freed // 1024)
+    return len(orphans), freed
+
+
+def release_and_gc(thread_ids):
+    """Checkpointer sweep hook: frees the evidence of swept threads, finished or abandoned."""
+    release(thread_ids)
+    return gc()
+
+
+def stats():
+    conn = get_connection()
+    blobs, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM evidence_blobs").fetchone()
+    refs = conn.execute("SELECT COUNT(*) FROM evidence_refs").fetchone()[0]
+    return {"blobs": blobs, "bytes": size, "refs": refs}
@@ -0,0 +1,110 @@
+import os
+import time
+import logging
+import threading
+from tools import metrics
+
+"""
+image_tools.py : normalizes evidence images before they are sent to the vision model.
+
+Uploads are decoded with OpenCV, downscaled so the longest side is at most
+VISION_MAX_DIM, and re-encoded as JPEG at VISION_JPEG_QUALITY. Re-encoding
+drops EXIF/GPS metadata, and the payload gets its real MIME type instead of
+a blanket `image/jpeg`.
+
+    VISION_NORMALIZE       set to 0 to send the original bytes (default: 1)
+    VISION_MAX_DIM         longest side in pixels after resizing (default: 1024)
+    VISION_JPEG_QUALITY    JPEG quality 1-100 (default: 85)
+"""
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stats = {"images": 0, "normalized": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def is_enabled():
+    return os.environ.get("VISION_NORMALIZE", "1") != "0"
+
+
+def settings():
+    """Current normalization settings; part of the vision cache key."""
+    return {
+        "enabled": is_enabled(),
+        "max_dim": int(os.environ.get("VISION_MAX_DIM", 1024)),
+        "quality": int(os.environ.get("VISION_JPEG_QUALITY", 85)),
+    }
+
+
+def sniff_mime(data: bytes):
+    """Guesses an image MIME type from its magic bytes."""
+    for magic, mime in _MAGIC:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def _record(size_in, size_out, seconds, normalized):
+    with _lock:
+        _stats["images"] += 1
+        _stats["normalized" if normalized else "failed"] += 1
+        _stats["bytes_in"] += size_in
+        _stats["bytes_out"] += size_out
+        _stats["seconds"] += seconds
+    metrics.inc("claims_image_bytes_total", size_in, stage="in")
+    metrics.inc("claims_image_bytes_total", size_out, stage="out")
+    metrics.observe("claims_image_normalize_seconds", seconds)
+
+
+def normalize_image(data: bytes, max_dim=None, quality=None):
+    """
+    Returns `(bytes, mime)` ready for the model. Images OpenCV cannot decode
+    are passed through unchanged with their sniffed MIME type.
+    """
+    opts = settings()
+    if not opts["enabled"]:
+        return data, sniff_mime(data)
+    max_dim = max_dim or opts["max_dim"]
+    quality = quality or opts["quality"]
+
+    started = time.perf_counter()
+    try:
+        import cv2
+        import numpy as np
+
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("not a decodable image")
+
+        height, width = image.shape[:2]
+        scale = max_dim / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        out = encoded.tobytes()
+    except Exception as e:
+        logger.warning("   ⚠️ Could not normalize image (%s); sending original bytes.", e)
+        _record(len(data), len(data), time.perf_counter() - started, normalized=False)
+        return data, sniff_mime(data)
+
+    _record(len(data), len(out), time.perf_counter() - started, normalized=True)
+    return out, "image/jpeg"
+
+
+def stats():
+    """Counters for this process, including total bytes saved."""
+    with _lock:
+        return {**_stats, "bytes_saved": _stats["bytes_in"] - _stats["bytes_out"]}
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from tools.db_tools import get_connection
+
+"""
+job_queue.py : durable queue of claims for the worker pool (see worker.py).
+
+A submitted claim becomes a row in claim_jobs (claims.db), keyed by the
+thread_id its graph run checkpoints under. Workers lease jobs for
+JOB_LEASE_SECONDS and heartbeat while they work. A job whose lease runs out
+(its worker died or hung) goes back to whichever worker leases next, and
+that worker resumes the thread from its last checkpoint. The expired lease
+counts as a failed run, so a claim that keeps killing its worker is given
+up after JOB_MAX_FAILURES like any other. Finished jobs are
+acked as done, or as paused when they wait for a manager. Failed runs are
+retried with backoff until JOB_MAX_FAILURES; a claim whose vision request
+the model rejected fails at once. Claims parked because the vision model
+was down are retried after JOB_PARK_DELAY and don't count as failures. The
+UIs hand their parked threads to the queue the same way (`park`).
+
+    python -m tools.job_queue                         # counts per status
+    python -m tools.job_queue --submit claims.jsonl
+    python -m tools.job_queue --requeue-failed
+
+    JOB_LEASE_SECONDS   lease length (default: 60)
+    JOB_MAX_FAILURES    failed runs before a job is given up (default: 3)
+    JOB_PARK_DELAY      seconds before a parked claim is retried (default: 30)
+"""
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("queued", "leased", "done", "paused", "failed")
+
+
+def lease_seconds():
+    return float(os.environ.get("JOB_LEASE_SECONDS", 60))
+
+
+def max_failures():
+    return int(os.environ.get("JOB_MAX_FAILURES", 3))
+
+
+def park_delay():
+    return float(os.environ.get("JOB_PARK_DELAY", 30))
+
+
+@contextmanager
+def _immediate():
+    """
+    A write transaction that takes the lock up front. Under WAL, a deferred
+    one fails with SQLITE_BUSY, without waiting, when another worker commits
+    between its read and its write.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _insert(rows):
+    with _immediate() as conn:
+        conn.executemany(
+            "INSERT INTO claim_jobs (thread_id, claim_id, image_paths, available_at, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,?) ON CONFLICT(thread_id) DO NOTHING",
+            rows,
+        )
+
+
+def submit(claim_id, image_paths, thread_id=None, delay=0):
+    """Queues a claim; returns its thread_id. Re-submitting a thread is a no-op."""
+    return submit_many([{"claim_id": claim_id, "image_paths": image_paths, "thread_id": thread_id}], delay)[0]
+
+
+def submit_many(claims, delay=0):
+    """
+    Queues claims (dicts with claim_id, image_paths and an optional thread_id)
+    in one transaction, to be leased `delay` seconds from now.
+    """
+    now = time.time()
+    rows = [
+        (c.get("thread_id") or str(uuid.uuid4()), c["claim_id"], json.dumps(list(c.get("image_paths", []))),
+         now + delay, now, now)
+        for c in claims
+    ]
+    _insert(rows)
+    return [r[0] for r in rows]
+
+
+def lease(worker_id, limit=1):
+    """
+    Atomically leases up to `limit` ready jobs: queued ones that are due, and
+    leased ones whose lease expired. Returns them as dicts. An expired lease
+    is booked as a failure; jobs that reach JOB_MAX_FAILURES that way are
+    moved to failed instead of being handed out again.
+    """
+    now = time.time()
+    with _immediate() as conn:
+        crashed = conn.execute(
+            """UPDATE claim_jobs SET status='failed', failures=failures+1, lease_owner=NULL, lease_expires=NULL,
+                   last_error='lease expired: its worker died or hung', updated_at=?
+               WHERE status='leased' AND lease_expires<? AND failures+1>=?
+               RETURNING thread_id, claim_id""",
+            (now, now, max_failures()),
+        ).fetchall()
+        rows = conn.execute(
+            """UPDATE claim_jobs SET failures=failures+(status='leased'), status='leased', lease_owner=?,
+                   lease_expires=?, attempts=attempts+1, updated_at=?
+               WHERE thread_id IN (
+                   SELECT thread_id FROM claim_jobs WHERE status='queued' AND available_at<=?
+                   UNION ALL
+                   SELECT thread_id FROM claim_jobs WHERE status='leased' AND lease_expires<?
+                   LIMIT ?)
+               RETURNING thread_id, claim_id, image_paths, attempts, created_at""",
+            (worker_id, now + lease_seconds(), now, now, now, limit),
+        ).fetchall()
+    for thread_id, claim_id in crashed:
+        logger.error("❌ Claim %s (%s) given up after %d failed runs; the last one's lease expired",
+                     claim_id, thread_id, max_failures())
+    return [
+        {"thread_id": r[0], "claim_id": r[1], "image_paths": json.loads(r[2]), "attempts": r[3], "created_at": r[4]}
+        for r in rows
+    ]
+
+
+def heartbeat(worker_id, thread_ids):
+    """Extends this worker's leases; returns the thread_ids it still holds."""
+    if not thread_ids:
+        return set()
+    thread_ids = list(thread_ids)
+    now = time.time()
+    with _immediate() as conn:
+        rows = conn.execute(
+            f"UPDATE claim_jobs SET lease_expires=?, updated_at=? "
+            f"WHERE lease_owner=? AND status='leased' AND thread_id IN ({','.join('?' * len(thread_ids))}) "
+            f"RETURNING thread_id",
+            [now + lease_seconds(), now, worker_id] + thread_ids,
+        ).fetchall()
+    return {r[0] for r in rows}
+
+
+def ack(thread_id, worker_id, status="done"):
+    """Completes a leased job (done or paused); False if the lease was lost meanwhile."""
+    with _immediate() as conn:
+        updated = conn.execute(
+            "UPDATE claim_jobs SET status=?, lease_owner=NULL, lease_expires=NULL, last_error=NULL, updated_at=? "
+            "WHERE thread_id=? AND lease_owner=? AND status='leased'",
+            (status, time.time(), thread_id, worker_id),
+        ).rowcount
+    return bool(updated)
+
+
+def retry(thread_id, worker_id, error, delay, failed=True):
+    """
+    Returns a leased job to the queue after `delay` seconds. With `failed`,
+    the run counts towards JOB_MAX_FAILURES and the job is given up after it.
+    Returns the job's new status, or None if the lease was lost meanwhile.
+    """
+    now = time.time()
+    with _immediate() as conn:
+        row = conn.execute(
+            """UPDATE claim_jobs SET
+                   failures=failures+?,
+                   status=CASE WHEN failures+?>=? THEN 'failed' ELSE 'queued' END,
+                   available_at=?, last_error=?, lease_owner=NULL, lease_expires=NULL, updated_at=?
+               WHERE thread_id=? AND lease_owner=? AND status='leased'
+               RETURNING status""",
+            (int(failed), int(failed), max_failures(), now + delay, str(error)[:500], now, thread_id, worker_id),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def park(claim_id, image_paths, thread_id):
+    """
+    Queues a thread another process parked at the vision step (the UIs),
+    so a worker resumes it from its checkpoint after JOB_PARK_DELAY.
+    """
+    return submit(claim_id, image_paths, thread_id=thread_id, delay=park_delay())
+
+
+def fail(thread_id, worker_id, error):
+    """Gives up a leased job at once, whatever its failure count; False if the lease was lost."""
+    with _immediate() as conn:
+        updated = conn.execute(
+            "UPDATE claim_jobs SET status='failed', failures=failures+1, last_error=?, lease_owner=NULL, "
+            "lease_expires=NULL, updated_at=? WHERE thread_id=? AND lease_owner=? AND status='leased'",
+            (str(error)[:500], time.time(), thread_id, worker_id),
+        ).rowcount
+    return bool(updated)
+
+
+def release(worker_id):
+    """Hands every job this worker still holds back to the queue (graceful shutdown)."""
+    now = time.time()
+    with _immediate() as conn:
+        return conn.execute(
+            "UPDATE claim_jobs SET status='queued', available_at=?, lease_owner=NULL, lease_expires=NULL, updated_at=? "
+            "WHERE lease_owner=? AND status='leased'",
+            (now, now, worker_id),
+        ).rowcount
+
+
+def requeue(thread_ids=None, status="failed"):
+    """Puts jobs back in the queue: the given threads, or every job in `status`."""
+    now = time.time()
+    with _immediate() as conn:
+        if thread_ids is None:
+            return conn.execute(
+                "UPDATE claim_jobs SET status='queued', failures=0, available_at=?, updated_at=? WHERE status=?",
+                (now, now, status),
+            ).rowcount
+        return conn.executemany(
+            "UPDATE claim_jobs SET status='queued', failures=0, available_at=?, updated_at=? WHERE thread_id=?",
+            [(now, now, t) for t in thread_ids],
+        ).rowcount
+
+
+def outstanding():
+    """Jobs not yet finished: queued (due or not) or leased."""
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM claim_jobs WHERE status IN ('queued', 'leased')"
+    ).fetchone()[0]
+
+
+def stats():
+    rows = get_connection().execute("SELECT status, COUNT(*) FROM claim_jobs GROUP BY status").fetchall()
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(dict(rows))
+    return counts
+
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from batch_runner import load_claims
+    from tools.db_tools import setup_db
+
+    parser = argparse.ArgumentParser(description="Inspect and feed the claim job queue.")
+    parser.add_argument("--submit", metavar="FILE", help="Queue every claim in a .jsonl/.csv file")
+    parser.add_argument("--requeue-failed", action="store_true", help="Retry jobs that were given up")
+    args = parser.parse_args(argv)
+
+    setup_db()
+    if args.submit:
+        print(f"📥 Queued {len(submit_many(load_claims(args.submit)))} claims from {args.submit}")
+    if args.requeue_failed:
+        print(f"🔁 Requeued {requeue()} failed jobs")
+    print("   " + "  ".join(f"{status}={count}" for status, count in stats().items()))
+
+
+if __name__ == "__main__":
+    main()
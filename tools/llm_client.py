@@ -0,0 +1,111 @@
+import os
+import asyncio
+import threading
+import weakref
+import httpx
+
+"""
+llm_client.py : long-lived, pooled chat clients for the vision model.
+
+Building a ChatOpenAI per claim also builds a new HTTP client, so every
+request paid for a fresh TCP/TLS handshake. These clients are created once
+and reuse keep-alive connections. Tuning comes from the environment:
+
+    OPENROUTER_BASE_URL        API base (default: https://openrouter.ai/api/v1)
+    VISION_TIMEOUT             read/write timeout in seconds (default: 60)
+    VISION_CONNECT_TIMEOUT     connect timeout in seconds (default: 10)
+    VISION_MAX_CONNECTIONS     per-process connection limit (default: 20)
+    VISION_MAX_KEEPALIVE       idle keep-alive connections kept (default: 10)
+    VISION_MAX_TOKENS          completion cap; the verdict comes first, so the
+                               cap only trims the description (default: 120, 0 = none)
+"""
+
+# 1. Define the OpenRouter Model ID
+#    This matches the HuggingFace ID exactly on OpenRouter
+MODEL_ID = "meta-llama/llama-3.2-11b-vision-instruct"
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+
+_lock = threading.Lock()
+# Keyed by model ID: hedged requests may go to a fallback model
+_sync_llms = {}
+# One set of async clients per event loop: httpx async pools are bound to
+# the loop that opened their connections.
+_async_llms = weakref.WeakKeyDictionary()
+
+
+def _timeout():
+    return httpx.Timeout(
+        float(os.environ.get("VISION_TIMEOUT", 60)),
+        connect=float(os.environ.get("VISION_CONNECT_TIMEOUT", 10)),
+    )
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=int(os.environ.get("VISION_MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(os.environ.get("VISION_MAX_KEEPALIVE", 10)),
+    )
+
+
+def max_tokens():
+    value = int(os.environ.get("VISION_MAX_TOKENS", 120))
+    return value or None
+
+
+def _build_llm(model=None, **client_kwargs):
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model or MODEL_ID,
+        openai_api_key=os.environ["OPENROUTER_API_KEY"],
+        openai_api_base=os.environ.get("OPENROUTER_BASE_URL", DEFAULT_BASE_URL),
+        temperature=0.1,
+        timeout=_timeout(),
+        max_tokens=max_tokens(),
+        # Retries, backoff and hedging live in tools/llm_resilience.py
+        max_retries=0,
+        # Report token usage on streamed completions too
+        stream_usage=True,
+        # Optional: Add headers if OpenRouter requires them for tracking
+        default_headers={
+            "HTTP-Referer": "https://localhost:3000", # Required by OpenRouter for some tiers
+            "X-Title": "Logistics Agent"
+        },
+        **client_kwargs,
+    )
+
+
+def get_vision_llm(model=None):
+    """Returns the process-wide ChatOpenAI for blocking `invoke` calls."""
+    model = model or MODEL_ID
+    llm = _sync_llms.get(model)
+    if llm is None:
+        with _lock:
+            llm = _sync_llms.get(model)
+            if llm is None:
+                llm = _build_llm(
+                    model, http_client=httpx.Client(timeout=_timeout(), limits=_limits())
+                )
+                _sync_llms[model] = llm
+    return llm
+
+
+def get_async_vision_llm(model=None):
+    """Returns the ChatOpenAI for `ainvoke` calls on the running event loop."""
+    model = model or MODEL_ID
+    llms = _async_llms.setdefault(asyncio.get_running_loop(), {})
+    llm = llms.get(model)
+    if llm is None:
+        llm = _build_llm(
+            model, http_async_client=httpx.AsyncClient(timeout=_timeout(), limits=_limits())
+        )
+        llms[model] = llm
+    return llm
+
+
+def reset_clients():
+    """Drops the cached clients, e.g. after changing the environment."""
+    with _lock:
+        _sync_llms.clear()
+        _async_llms.clear()
@@ -0,0 +1,288 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from tools import metrics
+
+"""
+llm_resilience.py : retries, a circuit breaker and hedged requests around
+the vision model.
+
+Every attempt gets a deadline. Transient failures (timeouts, connection
+errors, 429 and 5xx) are retried with full-jitter exponential backoff.
+Repeated failures open a circuit breaker, and while it is open calls fail
+at once instead of queueing behind a dead endpoint. After a cool-down one
+probe call is let through, and its outcome closes or re-opens the circuit.
+When no attempt succeeds, `VisionUnavailableError` is raised and the claim
+is parked for a retry, never given a made-up verdict. A request the model
+rejects outright (a 400, a payload it can't read) raises
+`VisionRequestError` instead: retrying it later would fail the same way,
+so the claim fails rather than parking.
+
+Async calls can be hedged. If the first request has not answered after the
+hedge delay, a duplicate goes out, optionally to a fallback model. The
+first answer wins and the other request is cancelled.
+
+    VISION_ATTEMPT_TIMEOUT     seconds per attempt, verdict included (default: 30)
+    VISION_RETRIES             extra attempts after the first (default: 2)
+    VISION_BACKOFF_BASE        first backoff ceiling in seconds (default: 0.5)
+    VISION_BACKOFF_MAX         backoff ceiling in seconds (default: 8)
+    VISION_BREAKER_FAILURES    consecutive failures that open the circuit (default: 5)
+    VISION_BREAKER_RESET       seconds before a probe is let through (default: 30)
+    VISION_HEDGE_DELAY         "p95" (recent p95 latency), seconds, or unset/0 for no hedging
+    VISION_FALLBACK_MODEL      model ID for hedged requests (default: the primary model)
+"""
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429}
+RETRYABLE_NAMES = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"}
+
+# Adaptive hedging waits for this many samples before trusting the p95
+MIN_HEDGE_SAMPLES = 20
+
+
+class VisionUnavailableError(RuntimeError):
+    """The vision model could not give a verdict; park the claim and retry later."""
+
+
+class VisionRequestError(RuntimeError):
+    """The vision model rejected the request itself; the claim fails instead of parking."""
+
+
+def _float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def attempt_timeout():
+    return _float("VISION_ATTEMPT_TIMEOUT", 30)
+
+
+def retries():
+    return int(os.environ.get("VISION_RETRIES", 2))
+
+
+def fallback_model():
+    return os.environ.get("VISION_FALLBACK_MODEL") or None
+
+
+def backoff(attempt):
+    """Full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+    ceiling = min(_float("VISION_BACKOFF_MAX", 8), _float("VISION_BACKOFF_BASE", 0.5) * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return type(error).__name__ in RETRYABLE_NAMES or type(error).__module__.startswith("httpx")
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open probe after a cool-down."""
+
+    def __init__(self, name, failures=None, reset_after=None):
+        self.name = name
+        self.threshold = failures or int(os.environ.get("VISION_BREAKER_FAILURES", 5))
+        self.reset_after = reset_after if reset_after is not None else _float("VISION_BREAKER_RESET", 30)
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self):
+        """True if a call may go out now. In half-open state only one probe does."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("🟢 [Circuit %s] Closed again.", self.name)
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+                logger.warning("🔴 [Circuit %s] Open after %d failures; failing fast for %.0fs.",
+                               self.name, self.failures, self.reset_after)
+                metrics.inc("claims_llm_breaker_opened_total", circuit=self.name)
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def release_probe(self):
+        """A probe that ended without a verdict either way (a bad request, a cancellation)."""
+        with self._lock:
+            self.probing = False
+
+
+class LatencyWindow:
+    """Recent successful attempt latencies, for the adaptive hedge delay."""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+
+    def p95(self):
+        if len(self.samples) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+breaker = CircuitBreaker("vision")
+latencies = LatencyWindow()
+
+
+def hedge_delay():
+    """Seconds to wait before hedging, or None to not hedge."""
+    value = os.environ.get("VISION_HEDGE_DELAY", "").strip().lower()
+    if value in ("", "0", "off"):
+        return None
+    if value == "p95":
+        return latencies.p95()
+    return float(value)
+
+
+def _admit():
+    if not breaker.allow():
+        metrics.inc("claims_llm_attempts_total", outcome="short_circuited")
+        raise VisionUnavailableError("circuit open: the vision model is failing, claim parked for retry")
+
+
+def _failed(error, attempt, total):
+    """Books a failed attempt; returns True if another attempt should follow."""
+    retryable = is_retryable(error)
+    if retryable:
+        breaker.record_failure()
+    else:
+        breaker.release_probe()
+    metrics.inc("claims_llm_attempts_total", outcome="retryable" if retryable else "error")
+    logger.warning("   ⚠️ Vision attempt %d/%d failed: %s: %s", attempt + 1, total, type(error).__name__, error)
+    return retryable and attempt + 1 < total
+
+
+def _give_up(error, attempts):
+    if not is_retryable(error):
+        return VisionRequestError(f"request rejected: {type(error).__name__}: {error}")
+    return VisionUnavailableError(f"no verdict after {attempts} attempt(s): {type(error).__name__}: {error}")
+
+
+def _succeeded(started):
+    breaker.record_success()
+    latencies.observe(time.perf_counter() - started)
+    metrics.inc("claims_llm_attempts_total", outcome="ok")
+
+
+def call(attempt):
+    """
+    Runs `attempt(model)` with retries behind the breaker. The blocking path
+    is not hedged, and its deadline is the HTTP client's VISION_TIMEOUT.
+    """
+    total = retries() + 1
+    for n in range(total):
+        _admit()
+        started = time.perf_counter()
+        try:
+            result = attempt(None)
+        except Exception as e:
+            if not _failed(e, n, total):
+                raise _give_up(e, n + 1) from e
+            time.sleep(backoff(n))
+            continue
+        except BaseException:
+            # Interrupted: no verdict either way, so a half-open probe must not stay claimed
+            breaker.release_probe()
+            raise
+        _succeeded(started)
+        return result
+
+
+async def _hedged(attempt, timeout):
+    """One attempt, plus a duplicate request if the first is slower than the hedge delay."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    primary = asyncio.ensure_future(attempt(None))
+    pending = {primary}
+    error = None
+    try:
+        delay = hedge_delay()
+        if delay is not None and delay < timeout:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                model = fallback_model()
+                logger.info("   🏇 No verdict after %.2fs; hedging%s.", delay, f" to {model}" if model else "")
+                metrics.inc("claims_llm_hedges_total")
+                pending.add(asyncio.ensure_future(attempt(model)))
+
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        metrics.inc("claims_llm_hedges_won_total")
+                    return task.result()
+                error = task.exception()
+        if pending or error is None:
+            raise asyncio.TimeoutError(f"no verdict within {timeout:.1f}s")
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def acall(attempt):
+    """
+    Async variant of `call`: `attempt(model)` returns an awaitable. Each
+    attempt has a VISION_ATTEMPT_TIMEOUT deadline and may be hedged.
+    """
+    total = retries() + 1
+    for n in range(total):
+        _admit()
+        started = time.perf_counter()
+        try:
+            result = await _hedged(attempt, attempt_timeout())
+        except Exception as e:
+            if not _failed(e, n, total):
+                raise _give_up(e, n + 1) from e
+            await asyncio.sleep(backoff(n))
+            continue
+        except BaseException:
+            # Cancelled (a lost job lease, a caller's timeout): release the probe as above
+            breaker.release_probe()
+            raise
+        _succeeded(started)
+        return result
+
+
+def reset():
+    """Fresh breaker and latency window, e.g. after changing the environment."""
+    global breaker, latencies
+    breaker = CircuitBreaker("vision")
+    latencies = LatencyWindow()
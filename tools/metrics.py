@@ -0,0 +1,235 @@
+import os
+import time
+import json
+import bisect
+import asyncio
+import logging
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+metrics.py : in-process counters, gauges and latency histograms for the claim graph.
+
+Graph nodes are wrapped with `instrument_node`, which records a latency
+histogram and an error counter per node. Other modules record LLM payload
+sizes, token usage and SQLite query time through `observe`/`inc`, and
+current levels such as queue depth through `set_gauge`. The data
+is available as a JSON `snapshot()`, as Prometheus text via
+`render_prometheus()`, or over HTTP with `serve_metrics(port)`.
+
+Logging goes through `configure_logging()`; the level comes from
+CLAIMS_LOG_LEVEL (default INFO). Log calls use lazy %-formatting, so
+disabled levels cost a single level check.
+"""
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384)
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus-style cumulative on export)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimates a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Adds `value` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Sets a gauge to its current value."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Records `value` in a histogram; `buckets` only apply when it is first created."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def instrument_node(name, fn):
+    """
+    Wraps a graph node (sync or async) so every call records
+    `claims_node_latency_seconds{node=name}` and, on exceptions,
+    `claims_node_errors_total{node=name}`.
+    """
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                inc("claims_node_errors_total", node=name)
+                raise
+            finally:
+                observe("claims_node_latency_seconds", time.perf_counter() - started, node=name)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            inc("claims_node_errors_total", node=name)
+            raise
+        finally:
+            observe("claims_node_latency_seconds", time.perf_counter() - started, node=name)
+    return wrapper
+
+
+# --- Export ---
+def _labels_dict(labels):
+    return dict(labels)
+
+
+def snapshot():
+    """All metrics as plain JSON-serializable data."""
+    with _lock:
+        counters = [
+            {"name": name, "labels": _labels_dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        gauges = [
+            {"name": name, "labels": _labels_dict(labels), "value": value}
+            for (name, labels), value in sorted(_gauges.items())
+        ]
+        histograms = [
+            {
+                "name": name, "labels": _labels_dict(labels),
+                "count": h.count, "sum": h.sum,
+                "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+            }
+            for (name, labels), h in sorted(_histograms.items())
+        ]
+    return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def _fmt_labels(labels, extra=None):
+    items = list(labels) + list(extra or ())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        typed = set()
+        for (name, labels), value in sorted(_counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+        for (name, labels), value in sorted(_gauges.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+        for (name, labels), h in sorted(_histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {h.count}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = render_prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port=None, host="127.0.0.1"):
+    """Serves /metrics (Prometheus text) and /metrics.json on a daemon thread."""
+    port = port if port is not None else int(os.environ.get("METRICS_PORT", 9464))
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# --- Logging ---
+def configure_logging(level=None):
+    """Routes the project's loggers to stderr at CLAIMS_LOG_LEVEL (default INFO)."""
+    level = level or os.environ.get("CLAIMS_LOG_LEVEL", "INFO")
+    for name in ("nodes", "tools", "worker"):
+        logger = logging.getLogger(name)
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.propagate = False
@@ -0,0 +1,224 @@
+import csv
+import json
+import time
+import random
+import sqlite3
+import logging
+from tools import db_tools
+
+"""
+order_import.py : bulk loader and synthetic generator for the orders table.
+
+Order exports (CSV with a header, or JSONL) are streamed row by row and
+upserted in chunked transactions, so re-importing a newer export updates
+amounts and tiers instead of dropping the table. The load uses a dedicated
+connection with import-friendly pragmas.
+
+By default the import is an offline load: the secondary indexes are dropped
+before loading and rebuilt in one pass afterwards (even if the load fails),
+which is much cheaper than maintaining them row by row. Until they are back,
+every order query scans the table, so stop the apps and workers first; the
+import refuses to start while a worker holds a live job lease. --online
+keeps the indexes and full durability, for topping up a DB in use.
+
+    python -m tools.order_import orders.csv [more.jsonl ...]
+    python -m tools.order_import --generate 20000000
+    python -m tools.order_import --online orders.csv
+"""
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 50_000
+TIERS = ("REGULAR", "REGULAR", "REGULAR", "REGULAR", "GOLD", "VIP")
+
+# Column names accepted for each field in exports
+_ALIASES = {
+    "order_id": ("order_id", "id", "order"),
+    "amount": ("amount", "order_value", "value", "total"),
+    "customer_tier": ("customer_tier", "tier"),
+}
+
+IMPORT_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+)
+# Offline only: trades durability for speed; a failed import is simply re-run
+OFFLINE_PRAGMAS = ("PRAGMA synchronous=OFF",)
+
+_UPSERT = (
+    "INSERT INTO orders (order_id, amount, customer_tier) VALUES (?,?,?) "
+    "ON CONFLICT(order_id) DO UPDATE SET amount=excluded.amount, customer_tier=excluded.customer_tier"
+)
+
+
+def _field(record, name):
+    for key in _ALIASES[name]:
+        if record.get(key) not in (None, ""):
+            return record[key]
+    return None
+
+
+def iter_orders(path, stats=None):
+    """
+    Streams (order_id, amount, tier) tuples from a CSV or JSONL export.
+    Rows without an order ID or with a non-numeric amount are skipped and
+    counted in `stats["rejected"]`.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("rejected", 0)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for record in records:
+            order_id = _field(record, "order_id")
+            try:
+                amount = float(_field(record, "amount"))
+            except (TypeError, ValueError):
+                amount = None
+            if not order_id or amount is None:
+                stats["rejected"] += 1
+                continue
+            tier = (_field(record, "customer_tier") or "REGULAR").strip().upper()
+            yield str(order_id).strip(), amount, tier
+
+
+def generate_orders(count, seed=7, start=0, prefix="ORD-"):
+    """
+    Yields `count` synthetic orders with log-normal amounts (median ~$150,
+    a long tail past $1000) and a mostly-REGULAR tier mix.
+    """
+    rng = random.Random(seed)
+    for i in range(start, start + count):
+        yield f"{prefix}{i:010d}", round(rng.lognormvariate(5, 1.2), 2), rng.choice(TIERS)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _check_offline(conn):
+    """Raises RuntimeError while a claim worker holds a live lease on this DB."""
+    workers = conn.execute(
+        "SELECT COUNT(DISTINCT lease_owner) FROM claim_jobs WHERE status='leased' AND lease_expires>?",
+        (time.time(),),
+    ).fetchone()[0]
+    if workers:
+        raise RuntimeError(f"{workers} claim worker(s) are running against this DB; stop them "
+                           f"before an offline import, or import with --online")
+
+
+def _build_indexes(conn):
+    """Recreates the order indexes and refreshes the planner stats in one transaction."""
+    conn.execute("BEGIN")
+    for name, column in db_tools.ORDER_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON orders({column})")
+    conn.execute("ANALYZE orders")
+    conn.commit()
+
+
+def import_orders(rows, db_path=None, chunk_size=CHUNK_SIZE, rebuild_indexes=True):
+    """
+    Upserts an iterable of (order_id, amount, tier) tuples into the orders
+    table, committing every `chunk_size` rows. Returns counts and timings.
+    With `rebuild_indexes` (the offline load, see above) the order indexes
+    are dropped for the load and always rebuilt before returning or raising.
+    """
+    db_path = db_path or db_tools.DB_PATH
+    # Make sure the schema exists before the import connection takes over
+    db_tools.setup_db(db_path=db_path)
+
+    conn = sqlite3.connect(db_path)
+    for pragma in IMPORT_PRAGMAS + (OFFLINE_PRAGMAS if rebuild_indexes else ()):
+        conn.execute(pragma)
+
+    started = time.perf_counter()
+    loaded = 0
+    try:
+        if rebuild_indexes:
+            _check_offline(conn)
+            for name in db_tools.ORDER_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+        try:
+            for chunk in _chunks(rows, chunk_size):
+                with conn:
+                    conn.executemany(_UPSERT, chunk)
+                loaded += len(chunk)
+                if loaded % (chunk_size * 20) == 0:
+                    logger.info("   📦 %d orders loaded...", loaded)
+        finally:
+            load_seconds = time.perf_counter() - started
+            index_started = time.perf_counter()
+            if rebuild_indexes:
+                if conn.in_transaction:
+                    conn.rollback()
+                # Other connections see the schema change on their next
+                # statement and reload it, new statistics included
+                _build_indexes(conn)
+            index_seconds = time.perf_counter() - index_started
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+    # Cached rows may now be stale
+    db_tools.invalidate_order_cache()
+    seconds = time.perf_counter() - started
+    return {
+        "loaded": loaded,
+        "seconds": seconds,
+        "load_seconds": load_seconds,
+        "index_seconds": index_seconds,
+        "rows_per_sec": loaded / load_seconds if load_seconds else 0.0,
+    }
+
+
+def import_file(path, **kwargs):
+    """Imports one CSV/JSONL export; the report includes rejected rows."""
+    stats = {}
+    report = import_orders(iter_orders(path, stats), **kwargs)
+    report["rejected"] = stats["rejected"]
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk-load orders into claims.db.")
+    parser.add_argument("files", nargs="*", help="CSV or JSONL order exports")
+    parser.add_argument("--generate", type=int, metavar="N", help="Insert N synthetic orders instead")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", help=f"SQLite file (default: {db_tools.DB_PATH})")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--online", action="store_true",
+                        help="Keep the order indexes during the load (the DB is in use)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.db:
+        db_tools.DB_PATH = args.db
+    options = {"chunk_size": args.chunk_size, "rebuild_indexes": not args.online}
+    reports = []
+    if args.generate:
+        reports.append(("synthetic", import_orders(generate_orders(args.generate, seed=args.seed), **options)))
+    for path in args.files:
+        reports.append((path, import_file(path, **options)))
+    if not reports:
+        parser.error("give at least one file or --generate N")
+
+    for source, r in reports:
+        print(f"✅ {source}: {r['loaded']} orders in {r['seconds']:.1f}s "
+              f"({r['rows_per_sec']:.0f} rows/sec, indexes {r['index_seconds']:.1f}s"
+              + (f", {r['rejected']} rejected" if "rejected" in r else "") + ")")
+
+
+if __name__ == "__main__":
+    main()
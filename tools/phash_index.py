@@ -0,0 +1,181 @@
+import os
+import time
+import sqlite3
+import threading
+from itertools import combinations
+from tools import metrics
+from tools.db_tools import DB_PATH
+
+"""
+phash_index.py : perceptual-hash index of every piece of evidence seen.
+
+Each image is reduced to a 64-bit difference hash (dHash), which survives
+resizing and recompression. Re-used photos therefore land within a few bits
+of each other even when their bytes differ. Lookups use multi-index hashing:
+the hash is split into four 16-bit chunks, each with its own SQLite index.
+Two hashes within Hamming distance r must agree on at least one chunk to
+within r // 4 bits (pigeonhole), so a query only probes the chunk values
+inside that radius. Only the resulting candidates are checked bit by bit,
+instead of scanning the whole table.
+
+    PHASH_INDEX          set to 0 to disable lookups and inserts
+    PHASH_INDEX_PATH     SQLite file (default: evidence_index.db next to claims.db)
+    PHASH_RADIUS         max Hamming distance counted as a near-duplicate (default: 6)
+    PHASH_REUSE_VERDICT  set to 0 to only flag near-duplicates, never reuse their verdict
+"""
+
+CHUNKS = 4
+CHUNK_BITS = 16
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+_lock = threading.Lock()
+_conn = None
+
+
+def _index_path():
+    default = os.path.join(os.path.dirname(DB_PATH), "evidence_index.db")
+    return os.environ.get("PHASH_INDEX_PATH", default)
+
+
+def radius():
+    return int(os.environ.get("PHASH_RADIUS", 6))
+
+
+def is_enabled():
+    return os.environ.get("PHASH_INDEX", "1") != "0"
+
+
+def reuse_verdicts():
+    return os.environ.get("PHASH_REUSE_VERDICT", "1") != "0"
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(_index_path(), check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS evidence_hashes (
+                hash INTEGER NOT NULL,
+                c0 INTEGER NOT NULL,
+                c1 INTEGER NOT NULL,
+                c2 INTEGER NOT NULL,
+                c3 INTEGER NOT NULL,
+                claim_id TEXT NOT NULL,
+                is_valid_damage INTEGER,
+                damage_description TEXT,
+                created_at REAL,
+                UNIQUE(hash, claim_id)
+            )
+        """)
+        for i in range(CHUNKS):
+            _conn.execute(f"CREATE INDEX IF NOT EXISTS idx_evidence_c{i} ON evidence_hashes(c{i})")
+        _conn.commit()
+    return _conn
+
+
+def dhash(data: bytes):
+    """64-bit difference hash of an encoded image, or None if it can't be decoded."""
+    import cv2
+    import numpy as np
+
+    # Reduced decode: the hash only needs a 9x8 thumbnail
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _chunks(value):
+    return [(value >> (CHUNK_BITS * i)) & _CHUNK_MASK for i in range(CHUNKS)]
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def _neighbours(chunk, distance):
+    """Every 16-bit value within `distance` bits of `chunk`."""
+    values = [chunk]
+    for d in range(1, distance + 1):
+        for bits in combinations(range(CHUNK_BITS), d):
+            flipped = chunk
+            for bit in bits:
+                flipped ^= 1 << bit
+            values.append(flipped)
+    return values
+
+
+def find(value, max_distance=None, exclude_claim=None):
+    """
+    Returns prior evidence within `max_distance` bits of `value`, nearest
+    first, as dicts with claim_id, distance and the stored verdict.
+    """
+    if not is_enabled() or value is None:
+        return []
+    max_distance = radius() if max_distance is None else max_distance
+    probe = max_distance // CHUNKS
+
+    started = time.perf_counter()
+    clauses, params = [], []
+    for i, chunk in enumerate(_chunks(value)):
+        values = _neighbours(chunk, probe)
+        clauses.append(f"SELECT hash, claim_id, is_valid_damage, damage_description FROM evidence_hashes "
+                       f"WHERE c{i} IN ({','.join('?' * len(values))})")
+        params.extend(values)
+    with _lock:
+        rows = _get_conn().execute(" UNION ".join(clauses), params).fetchall()
+
+    matches = []
+    for stored, claim_id, is_valid_damage, description in rows:
+        if claim_id == exclude_claim:
+            continue
+        distance = (_unsigned(stored) ^ value).bit_count()
+        if distance <= max_distance:
+            matches.append({
+                "claim_id": claim_id,
+                "distance": distance,
+                "is_valid_damage": None if is_valid_damage is None else bool(is_valid_damage),
+                "damage_description": description,
+            })
+    matches.sort(key=lambda m: m["distance"])
+    metrics.observe("claims_phash_lookup_seconds", time.perf_counter() - started)
+    metrics.inc("claims_phash_lookups_total", result="match" if matches else "miss")
+    return matches
+
+
+def add(value, claim_id, result=None):
+    """Records that `claim_id` used evidence with this hash (and its verdict)."""
+    add_many([value], claim_id, result)
+
+
+def add_many(values, claim_id, result=None):
+    if not is_enabled():
+        return
+    result = result or {}
+    is_valid_damage = result.get("is_valid_damage")
+    rows = [
+        (_signed(value), *_chunks(value), claim_id,
+         None if is_valid_damage is None else int(is_valid_damage),
+         result.get("damage_description"), time.time())
+        for value in values if value is not None
+    ]
+    if not rows:
+        return
+    with _lock:
+        conn = _get_conn()
+        conn.executemany("INSERT OR IGNORE INTO evidence_hashes VALUES (?,?,?,?,?,?,?,?,?)", rows)
+        conn.commit()
+
+
+def size():
+    with _lock:
+        return _get_conn().execute("SELECT COUNT(*) FROM evidence_hashes").fetchone()[0]
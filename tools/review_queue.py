@@ -0,0 +1,222 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from tools import tracing
+from tools.db_tools import get_connection
+from tools.policy import normalize_tier
+
+"""
+review_queue.py : persistent queue of claims paused for human review.
+
+The graph enqueues a claim just before it interrupts at `human_review`, so
+managers can find it without holding its thread_id. refund_node resolves
+the entry once the thread is resumed, however it was resumed. The table
+lives in claims.db and is indexed for the listings managers use: pending
+claims by age, by tier and by order value. Tiers are stored and filtered
+in `policy.normalize_tier` form, so `--tier regular` finds REGULAR claims.
+
+Before resuming a thread, a decision claims its entry (`claim`), so two
+managers or bulk runs deciding the same claim can't both resume it. A claim
+held longer than REVIEW_CLAIM_SECONDS (default: 600), e.g. by a process
+that died, may be taken over.
+
+    python -m tools.review_queue                       # first page of pending claims
+    python -m tools.review_queue --approve <thread_id> ...
+    python -m tools.review_queue --reject-all --tier REGULAR
+"""
+
+logger = logging.getLogger(__name__)
+
+APPROVED = "Manager Approved"
+REJECTED = "Rejected"
+
+ORDERINGS = {
+    "age": "created_at ASC",
+    "value": "order_value DESC",
+    "tier": "customer_tier ASC, created_at ASC",
+}
+
+def enqueue(thread_id, state, reason=None):
+    """Adds (or re-opens) the review entry for a paused thread."""
+    conn = get_connection()
+    conn.execute(
+        """INSERT INTO review_queue (thread_id, claim_id, order_value, customer_tier, reason, status, created_at)
+           VALUES (?,?,?,?,?,'pending',?)
+           ON CONFLICT(thread_id) DO UPDATE SET status='pending', reason=excluded.reason, decided_at=NULL,
+               claimed_by=NULL, claimed_at=NULL""",
+        (thread_id, state.get("claim_id"), state.get("order_value"), normalize_tier(state.get("customer_tier")),
+         reason, time.time()),
+    )
+    conn.commit()
+
+
+def resolve(thread_id, refund_status):
+    """Marks the entry for `thread_id` as decided; a no-op if it was never queued."""
+    conn = get_connection()
+    conn.execute(
+        "UPDATE review_queue SET status='decided', refund_status=?, decided_at=? WHERE thread_id=? AND status='pending'",
+        (refund_status, time.time(), thread_id),
+    )
+    conn.commit()
+
+
+def expire(thread_ids):
+    """Closes the pending entries of threads whose checkpoints were swept; nothing is left to resume."""
+    conn = get_connection()
+    conn.executemany(
+        "UPDATE review_queue SET status='expired', decided_at=? WHERE thread_id=? AND status='pending'",
+        [(time.time(), t) for t in thread_ids],
+    )
+    conn.commit()
+
+
+def claim(thread_id, owner):
+    """Claims a pending entry for one decision; True only for the caller that got it."""
+    now = time.time()
+    conn = get_connection()
+    claimed = conn.execute(
+        "UPDATE review_queue SET claimed_by=?, claimed_at=? "
+        "WHERE thread_id=? AND status='pending' AND (claimed_by IS NULL OR claimed_at<?)",
+        (owner, now, thread_id, now - float(os.environ.get("REVIEW_CLAIM_SECONDS", 600))),
+    ).rowcount
+    conn.commit()
+    return claimed == 1
+
+
+def unclaim(thread_id, owner):
+    """Gives up a claim whose decision could not be applied."""
+    conn = get_connection()
+    conn.execute(
+        "UPDATE review_queue SET claimed_by=NULL, claimed_at=NULL WHERE thread_id=? AND claimed_by=?",
+        (thread_id, owner),
+    )
+    conn.commit()
+
+
+def _filters(tier=None, min_value=None, max_value=None):
+    clauses, params = ["status='pending'"], []
+    if tier:
+        clauses.append("customer_tier=?")
+        params.append(normalize_tier(tier))
+    if min_value is not None:
+        clauses.append("order_value>=?")
+        params.append(min_value)
+    if max_value is not None:
+        clauses.append("order_value<=?")
+        params.append(max_value)
+    return " AND ".join(clauses), params
+
+
+def list_pending(tier=None, min_value=None, max_value=None, order_by="age", limit=50, offset=0):
+    """One page of pending claims as dicts, oldest first by default."""
+    where, params = _filters(tier, min_value, max_value)
+    rows = get_connection().execute(
+        f"SELECT thread_id, claim_id, order_value, customer_tier, reason, created_at FROM review_queue "
+        f"WHERE {where} ORDER BY {ORDERINGS[order_by]} LIMIT ? OFFSET ?",
+        params + [limit, offset],
+    ).fetchall()
+    now = time.time()
+    return [
+        {"thread_id": r[0], "claim_id": r[1], "order_value": r[2], "customer_tier": r[3],
+         "reason": r[4], "age_seconds": now - r[5]}
+        for r in rows
+    ]
+
+
+def count_pending(tier=None, min_value=None, max_value=None):
+    where, params = _filters(tier, min_value, max_value)
+    return get_connection().execute(f"SELECT COUNT(*) FROM review_queue WHERE {where}", params).fetchone()[0]
+
+
+def pending_thread_ids(tier=None, min_value=None, max_value=None):
+    where, params = _filters(tier, min_value, max_value)
+    return [r[0] for r in get_connection().execute(f"SELECT thread_id FROM review_queue WHERE {where}", params)]
+
+
+# --- Bulk decisions ---
+async def _decide(graph, thread_id, refund_status, semaphore):
+    config = {"configurable": {"thread_id": thread_id}}
+    owner = str(uuid.uuid4())
+    async with semaphore:
+        if not await asyncio.to_thread(claim, thread_id, owner):
+            # Decided already, or another decision holds it
+            return {"thread_id": thread_id, "skipped": True}
+        try:
+            snapshot = await graph.aget_state(config)
+            if "human_review" not in (snapshot.next or ()):
+                # Already resumed elsewhere; just close the entry
+                await asyncio.to_thread(resolve, thread_id, snapshot.values.get("refund_status"))
+                return {"thread_id": thread_id, "skipped": True}
+            await graph.aupdate_state(config, {"refund_status": refund_status})
+            await graph.ainvoke(None, config={**config, "callbacks": tracing.callbacks()})
+            return {"thread_id": thread_id}
+        except Exception as e:
+            logger.warning("   ❌ Could not resume %s: %s", thread_id, e)
+            await asyncio.to_thread(unclaim, thread_id, owner)
+            return {"thread_id": thread_id, "error": f"{type(e).__name__}: {e}"}
+
+
+async def decide_many(graph, thread_ids, approve=True, concurrency=16):
+    """
+    Approves or rejects many paused claims, resuming up to `concurrency`
+    threads at once. Returns counts and the elapsed time.
+    """
+    refund_status = APPROVED if approve else REJECTED
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_decide(graph, t, refund_status, semaphore) for t in thread_ids))
+    elapsed = time.perf_counter() - started
+    return {
+        "decision": refund_status,
+        "resumed": sum(1 for r in results if "error" not in r and not r.get("skipped")),
+        "skipped": sum(1 for r in results if r.get("skipped")),
+        "failed": [r for r in results if "error" in r],
+        "elapsed": elapsed,
+        "claims_per_sec": len(results) / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    import argparse
+    from main import get_graph, init_runtime
+
+    parser = argparse.ArgumentParser(description="List and bulk-decide claims waiting for human review.")
+    parser.add_argument("--tier")
+    parser.add_argument("--min-value", type=float)
+    parser.add_argument("--order-by", choices=sorted(ORDERINGS), default="age")
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--approve", nargs="+", metavar="THREAD_ID")
+    parser.add_argument("--reject", nargs="+", metavar="THREAD_ID")
+    parser.add_argument("--approve-all", action="store_true", help="Approve every pending claim matching the filters")
+    parser.add_argument("--reject-all", action="store_true", help="Reject every pending claim matching the filters")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+    init_runtime()
+
+    filters = {"tier": args.tier, "min_value": args.min_value}
+    thread_ids, approve = None, True
+    if args.approve or args.reject:
+        thread_ids, approve = args.approve or args.reject, bool(args.approve)
+    elif args.approve_all or args.reject_all:
+        thread_ids, approve = pending_thread_ids(**filters), args.approve_all
+
+    if thread_ids is None:
+        total = count_pending(**filters)
+        rows = list_pending(**filters, order_by=args.order_by, limit=args.page_size,
+                            offset=(args.page - 1) * args.page_size)
+        print(f"--- 👨‍💼 REVIEW QUEUE: {total} pending (page {args.page}) ---")
+        for r in rows:
+            print(f"   {r['thread_id']}  {r['claim_id']:<14} ${r['order_value'] or 0:>10.2f}  "
+                  f"{r['customer_tier'] or '-':<8} {r['age_seconds'] / 60:6.0f} min  {r['reason'] or ''}")
+        return
+
+    report = asyncio.run(decide_many(get_graph(), thread_ids, approve=approve, concurrency=args.concurrency))
+    print(f"{report['decision']}: {report['resumed']} resumed, {report['skipped']} already done, "
+          f"{len(report['failed'])} failed in {report['elapsed']:.2f}s ({report['claims_per_sec']:.1f} claims/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import queue
+import atexit
+import zlib
+import logging
+import threading
+import urllib.request
+from collections import OrderedDict
+from langchain_core.callbacks import BaseCallbackHandler
+from tools import metrics
+
+"""
+tracing.py : sampled, batched tracing of claim runs.
+
+One process-wide `TraceHandler` (see `callbacks()`) is attached to every
+graph run. It records one span per graph, node and model call, keeping only
+names, timings, status and small attributes, never the inputs (which would
+carry Base64 images). The spans of a run wait in memory until the run ends,
+and then the whole trace is kept or dropped:
+    - runs that raised (including claims parked by a vision outage) are always kept
+    - runs that went through manual review are always kept
+    - the rest are kept at TRACE_SAMPLE_RATE, decided per thread_id, so every
+      run of a claim (first pass, resume after review) gets the same answer
+A span that ends after its run did (e.g. a cancelled hedge request whose
+callback arrives late) follows the decision made for the run and is
+exported on its own, under the run's trace_id. The handler remembers the
+last TRACE_LATE_WINDOW finished runs and spans for that.
+
+Kept spans go onto a bounded queue. A background thread posts them as JSON
+batches ({"spans": [...]}) to TRACE_ENDPOINT. When the queue is full, new
+spans are dropped and counted rather than blocking a claim on a slow
+collector. benchmarks/stub_collector.py is a local stand-in collector.
+
+    TRACE_ENDPOINT          collector URL; tracing is off when unset
+    TRACE_SAMPLE_RATE       share of routine claims to keep (default: 0.1)
+    TRACE_BATCH_SIZE        spans per POST (default: 256)
+    TRACE_FLUSH_INTERVAL    max seconds a span waits before it is sent (default: 2)
+    TRACE_QUEUE_SIZE        spans buffered before new ones are dropped (default: 10000)
+    TRACE_TIMEOUT           seconds per POST (default: 5)
+    TRACE_LATE_WINDOW       finished runs/spans remembered for late spans (default: 10000)
+"""
+
+logger = logging.getLogger(__name__)
+
+# Nodes whose presence means a manager is involved; such traces are always kept
+REVIEW_NODES = ("enqueue_review", "human_review")
+
+
+def endpoint():
+    return os.environ.get("TRACE_ENDPOINT") or None
+
+
+def sample_rate():
+    return float(os.environ.get("TRACE_SAMPLE_RATE", 0.1))
+
+
+def sampled(key, rate):
+    """Deterministic head sampling: the same key always gets the same answer."""
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return zlib.crc32(str(key).encode()) / 2 ** 32 < rate
+
+
+# --- 1. Export ---
+class BatchExporter:
+    """Posts spans to a collector in batches from a daemon thread."""
+
+    def __init__(self, url, batch_size=None, flush_interval=None, queue_size=None, timeout=None):
+        self.url = url
+        self.batch_size = batch_size or int(os.environ.get("TRACE_BATCH_SIZE", 256))
+        self.flush_interval = flush_interval or float(os.environ.get("TRACE_FLUSH_INTERVAL", 2))
+        self.timeout = timeout or float(os.environ.get("TRACE_TIMEOUT", 5))
+        self.queue = queue.Queue(maxsize=queue_size or int(os.environ.get("TRACE_QUEUE_SIZE", 10000)))
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._posting = False
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, spans):
+        """Enqueues spans without ever blocking; returns how many were dropped."""
+        dropped = 0
+        for span in spans:
+            try:
+                self.queue.put_nowait(span)
+            except queue.Full:
+                dropped += 1
+        if dropped:
+            metrics.inc("claims_trace_spans_total", dropped, outcome="dropped")
+        if self.queue.qsize() >= self.batch_size:
+            self._flush_requested.set()
+        return dropped
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _post(self, batch):
+        body = json.dumps({"spans": batch}, default=str).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            metrics.inc("claims_trace_spans_total", len(batch), outcome="exported")
+        except Exception as e:
+            # A lost batch is only lost telemetry; don't retry into a struggling collector
+            metrics.inc("claims_trace_spans_total", len(batch), outcome="export_failed")
+            logger.warning("⚠️ Trace export of %d spans failed: %s", len(batch), e)
+        metrics.observe("claims_trace_export_seconds", time.perf_counter() - started)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            while True:
+                self._posting = True
+                batch = self._drain()
+                if batch:
+                    self._post(batch)
+                self._posting = False
+                if len(batch) < self.batch_size:
+                    break
+
+    def flush(self, timeout=None):
+        """Sends everything queued so far; returns False if it did not finish in time."""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout * 2)
+        self._flush_requested.set()
+        while not self.queue.empty() or self._posting:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout=None):
+        self.flush(timeout)
+        self._stopped.set()
+        self._flush_requested.set()
+        self._thread.join(timeout=self.timeout)
+
+
+# --- 2. Recording ---
+class TraceHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that turns graph runs into traces. Cheap
+    enough to stay attached to every run: one dict per span and a lock.
+    """
+
+    # Called on the caller's thread, also under ainvoke: no executor hop per event
+    run_inline = True
+
+    def __init__(self, exporter, rate=None, late_window=None):
+        self.exporter = exporter
+        self.rate = sample_rate() if rate is None else rate
+        self.late_window = late_window or int(os.environ.get("TRACE_LATE_WINDOW", 10000))
+        self._lock = threading.Lock()
+        self._spans = {}   # run_id -> open span
+        self._traces = {}  # root run_id -> finished spans of that run
+        # For spans that outlive their run: which trace a finished span
+        # belonged to, and whether each finished trace was kept
+        self._ended = OrderedDict()   # run_id -> {"trace_id", "thread_id"}
+        self._decided = OrderedDict() # trace_id -> kept
+
+    @staticmethod
+    def _remember(window, key, value, size):
+        window[key] = value
+        if len(window) > size:
+            window.popitem(last=False)
+
+    def _start(self, run_id, parent_run_id, name, kind, metadata, attributes=None):
+        metadata = metadata or {}
+        with self._lock:
+            parent = self._spans.get(parent_run_id) if parent_run_id else None
+            # A parent that has already ended: the span is late, its run may be over too
+            late = parent is None and parent_run_id in self._ended
+            if late:
+                parent = self._ended[parent_run_id]
+            root = parent["trace_id"] if parent else str(run_id)
+            span = {
+                "trace_id": root,
+                "span_id": str(run_id),
+                "parent_id": str(parent_run_id) if parent_run_id else None,
+                "name": name,
+                "kind": kind,
+                "thread_id": (parent or {}).get("thread_id") or metadata.get("thread_id"),
+                "start": time.time(),
+                "attributes": attributes or {},
+            }
+            self._spans[run_id] = span
+            if not late:
+                self._traces.setdefault(root, [])
+
+    def _end(self, run_id, error=None, attributes=None):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+            if span is None:
+                return
+            span["end"] = time.time()
+            span["duration_ms"] = round((span["end"] - span["start"]) * 1000, 3)
+            span["status"] = "error" if error is not None else "ok"
+            if error is not None:
+                span["error"] = f"{type(error).__name__}: {error}"[:500]
+            if attributes:
+                span["attributes"].update(attributes)
+            self._remember(self._ended, run_id, {"trace_id": span["trace_id"], "thread_id": span["thread_id"]},
+                           self.late_window)
+            trace = self._traces.get(span["trace_id"])
+            if trace is None:
+                kept = self._decided.get(span["trace_id"])
+            else:
+                trace.append(span)
+                if span["span_id"] != span["trace_id"]:
+                    return
+                trace = self._traces.pop(span["trace_id"])
+                kept = self._decide(span, trace)
+                self._remember(self._decided, span["trace_id"], kept, self.late_window)
+        if trace is None:
+            self._late(span, kept)
+        elif kept:
+            self.exporter.submit(trace)
+
+    def _decide(self, root, trace):
+        """Keeps or drops a finished run's trace as a whole; returns True to keep it."""
+        if any(s["status"] == "error" for s in trace):
+            reason = "error"
+        elif any(s["name"] in REVIEW_NODES for s in trace):
+            reason = "review"
+        elif sampled(root["thread_id"] or root["trace_id"], self.rate):
+            reason = "sampled"
+        else:
+            metrics.inc("claims_traces_total", decision="dropped")
+            metrics.inc("claims_trace_spans_total", len(trace), outcome="sampled_out")
+            return False
+        root["attributes"]["kept_because"] = reason
+        metrics.inc("claims_traces_total", decision=reason)
+        return True
+
+    def _late(self, span, kept):
+        """A span that ended after its run: exported alone if the run was kept."""
+        if kept:
+            span["attributes"]["late"] = True
+            metrics.inc("claims_trace_spans_total", outcome="late")
+            self.exporter.submit([span])
+        else:
+            # Sampled out with its run, or the run is older than the late window
+            metrics.inc("claims_trace_spans_total", outcome="sampled_out" if kept is False else "orphaned")
+
+    # Graph and node runs
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        attributes = {}
+        if parent_run_id is None and isinstance(inputs, dict):
+            attributes["claim_id"] = inputs.get("claim_id")
+        self._start(run_id, parent_run_id, name, "graph" if parent_run_id is None else "node", metadata, attributes)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        attributes = None
+        if isinstance(outputs, dict) and "refund_status" in outputs:
+            attributes = {"refund_status": outputs.get("refund_status")}
+        self._end(run_id, attributes=attributes)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    # Model calls
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        model = ((serialized or {}).get("kwargs") or {}).get("model_name")
+        self._start(run_id, parent_run_id, kwargs.get("name") or "llm", "llm", metadata, {"model": model})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self._end(run_id, attributes={k: usage[k] for k in ("prompt_tokens", "completion_tokens") if k in usage})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+
+# --- 3. Process-Wide Handler ---
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def get_handler():
+    """The process-wide handler, or None when TRACE_ENDPOINT is unset."""
+    global _handler
+    url = endpoint()
+    if url is None:
+        return None
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                exporter = BatchExporter(url)
+                atexit.register(exporter.shutdown)
+                _handler = TraceHandler(exporter)
+    return _handler
+
+
+def callbacks():
+    """Callbacks to put in a run's config: the shared tracer, or nothing."""
+    handler = get_handler()
+    return [handler] if handler else []
+
+
+def flush(timeout=None):
+    if _handler is not None:
+        return _handler.exporter.flush(timeout)
+    return True
+
+
+def reset():
+    """Shuts the exporter down; the next `get_handler()` reads the environment again."""
+    global _handler
+    with _handler_lock:
+        if _handler is not None:
+            _handler.exporter.shutdown(timeout=1)
+        _handler = None
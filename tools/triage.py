@@ -0,0 +1,237 @@
+import os
+import math
+import time
+from tools import metrics
+
+"""
+triage.py : a cheap local first stage in front of the vision model.
+
+Each evidence image is measured with OpenCV on a small grayscale copy:
+    sharpness   variance of the Laplacian (low = blurry)
+    exposure    mean brightness and the share of clipped pixels
+    edges       Canny edge density
+    disorder    share of edge pixels whose gradient is not close to
+                horizontal/vertical. Intact cartons are mostly straight
+                lines, while crushes, tears and cracks run every which way.
+
+Images that are too dark, blown out or (once TRIAGE_MIN_SHARPNESS is set)
+too blurry are unusable, and a claim with only unusable images is turned
+back without a model call. Edges and disorder feed a logistic damage score.
+A score at or below TRIAGE_CLEAN_BELOW is a confident "no damage" and is
+rejected locally. A score at or above TRIAGE_DAMAGE_ABOVE is counted as
+"damaged" but still goes to the LLM: triage never approves a refund on its
+own. Everything else escalates with just the usable images.
+
+The default weights are uncalibrated, so by default triage decides nothing
+on the score and only drops unusable images: texture alone scores noisy
+photos as damaged and plain cartons as clean. Fit the weights on labelled
+evidence with `python -m tools.triage --calibrate labels.csv` (columns:
+path, damaged) before setting TRIAGE_CLEAN_BELOW or TRIAGE_MIN_SHARPNESS.
+
+    TRIAGE                  set to 0 to send every image to the model (default: 1)
+    TRIAGE_MIN_SHARPNESS    Laplacian variance below which an image is blurry (default: 0 = off)
+    TRIAGE_MIN_BRIGHTNESS   mean brightness below which it is too dark (default: 30)
+    TRIAGE_MAX_BRIGHTNESS   mean brightness above which it is blown out (default: 235)
+    TRIAGE_MAX_CLIPPED      share of clipped pixels that makes it unusable (default: 0.6)
+    TRIAGE_DAMAGE_ABOVE     damage score counted as "damaged", still sent to the model (default: 1 = never)
+    TRIAGE_CLEAN_BELOW      damage score rejected locally as "no damage" (default: 0 = never)
+    TRIAGE_WEIGHTS          bias,edges,disorder of the damage score (default: -8,30,24)
+"""
+
+_WIDTH = 512
+# Edge pixels within this many degrees of horizontal/vertical count as "straight"
+_AXIS_TOLERANCE = 10
+DEFAULT_WEIGHTS = (-8.0, 30.0, 24.0)
+
+
+def is_enabled():
+    return os.environ.get("TRIAGE", "1") != "0"
+
+
+def settings():
+    weights = os.environ.get("TRIAGE_WEIGHTS")
+    return {
+        "min_sharpness": float(os.environ.get("TRIAGE_MIN_SHARPNESS", 0)),
+        "min_brightness": float(os.environ.get("TRIAGE_MIN_BRIGHTNESS", 30)),
+        "max_brightness": float(os.environ.get("TRIAGE_MAX_BRIGHTNESS", 235)),
+        "max_clipped": float(os.environ.get("TRIAGE_MAX_CLIPPED", 0.6)),
+        "damage_above": float(os.environ.get("TRIAGE_DAMAGE_ABOVE", 1)),
+        "clean_below": float(os.environ.get("TRIAGE_CLEAN_BELOW", 0)),
+        "weights": tuple(float(w) for w in weights.split(",")) if weights else DEFAULT_WEIGHTS,
+    }
+
+
+def features(data):
+    """Measures one encoded image; None if OpenCV cannot decode it."""
+    import cv2
+    import numpy as np
+
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    height, width = gray.shape
+    if width > _WIDTH:
+        gray = cv2.resize(gray, (_WIDTH, max(1, height * _WIDTH // width)), interpolation=cv2.INTER_AREA)
+
+    edges = cv2.Canny(gray, 60, 160)
+    edge_mask = edges > 0
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)[edge_mask]
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)[edge_mask]
+    if gx.size:
+        # Angle folded into [0, 90): 0 and 90 degrees are both "straight"
+        angle = np.degrees(np.arctan2(np.abs(gy), np.abs(gx)))
+        straight = (angle < _AXIS_TOLERANCE) | (angle > 90 - _AXIS_TOLERANCE)
+        disorder = 1.0 - float(straight.mean())
+    else:
+        disorder = 0.0
+
+    return {
+        "sharpness": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        "brightness": float(gray.mean()),
+        "clipped": float(((gray < 8) | (gray > 247)).mean()),
+        "edges": float(edge_mask.mean()),
+        "disorder": disorder,
+    }
+
+
+def unusable_reason(f, opts):
+    if f["brightness"] < opts["min_brightness"]:
+        return "too dark"
+    if f["brightness"] > opts["max_brightness"]:
+        return "overexposed"
+    if f["clipped"] > opts["max_clipped"]:
+        return "mostly clipped"
+    if f["sharpness"] < opts["min_sharpness"]:
+        return "too blurry"
+    return None
+
+
+def damage_score(f, weights):
+    bias, w_edges, w_disorder = weights
+    z = bias + w_edges * f["edges"] + w_disorder * f["disorder"]
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def assess(images):
+    """
+    Triage of a claim's images (encoded bytes). Returns a dict with
+    `outcome` ("unusable", "clean", "damaged" or "escalate"), the `verdict`
+    to use instead of a model call (only for "unusable" and "clean"; a
+    refund is never approved locally), and the indexes of the `usable`
+    images to send on.
+    """
+    opts = settings()
+    started = time.perf_counter()
+    usable, scores, problems = [], [], []
+    for i, data in enumerate(images):
+        try:
+            f = features(data)
+        except ImportError:
+            return {"outcome": "escalate", "verdict": None, "usable": list(range(len(images)))}
+        if f is None:
+            usable.append(i)  # Not something we can judge; let the model look
+            scores.append(None)
+            continue
+        reason = unusable_reason(f, opts)
+        if reason:
+            problems.append(reason)
+            continue
+        usable.append(i)
+        scores.append(damage_score(f, opts["weights"]))
+    metrics.observe("claims_triage_seconds", time.perf_counter() - started)
+
+    judged = [s for s in scores if s is not None]
+    if not usable:
+        outcome = "unusable"
+        verdict = {
+            "is_valid_damage": False,
+            "damage_description": f"Evidence unusable ({', '.join(sorted(set(problems)))}). "
+                                  "Please resubmit clear, well-lit photos of the item.",
+        }
+    elif judged and len(judged) == len(scores) and max(judged) >= opts["damage_above"]:
+        # Likely damage: the model still confirms it before any refund
+        outcome, verdict = "damaged", None
+    elif judged and len(judged) == len(scores) and max(judged) <= opts["clean_below"]:
+        outcome = "clean"
+        verdict = {"is_valid_damage": False,
+                   "damage_description": f"NO. Local triage found no sign of damage (score {max(judged):.2f})."}
+    else:
+        outcome, verdict = "escalate", None
+
+    metrics.inc("claims_triage_total", outcome=outcome)
+    return {"outcome": outcome, "verdict": verdict, "usable": usable, "scores": scores}
+
+
+def escalation_rate():
+    """Share of triaged claims that still needed the model, from this process's metrics."""
+    counts = {c["labels"].get("outcome"): c["value"] for c in metrics.snapshot()["counters"]
+              if c["name"] == "claims_triage_total"}
+    total = sum(counts.values())
+    return (counts.get("escalate", 0) + counts.get("damaged", 0)) / total if total else 0.0
+
+
+def calibrate(rows, steps=2000, rate=0.5):
+    """
+    Fits (bias, edges, disorder) by logistic regression on labelled images
+    [(path, damaged)], and reports how many would be rejected locally as
+    clean at the current TRIAGE_CLEAN_BELOW. Unusable images are skipped.
+    """
+    opts = settings()
+    samples = []
+    for path, damaged in rows:
+        with open(path, "rb") as f:
+            feats = features(f.read())
+        if feats and not unusable_reason(feats, opts):
+            samples.append((feats["edges"], feats["disorder"], 1.0 if damaged else 0.0))
+    if not samples:
+        raise ValueError("no usable labelled images")
+
+    w = list(opts["weights"])
+    for _ in range(steps):
+        grad = [0.0, 0.0, 0.0]
+        for edges, disorder, label in samples:
+            p = damage_score({"edges": edges, "disorder": disorder}, w)
+            for j, x in enumerate((1.0, edges, disorder)):
+                grad[j] += (p - label) * x
+        w = [wj - rate * g / len(samples) for wj, g in zip(w, grad)]
+
+    decided = correct = 0
+    for edges, disorder, label in samples:
+        p = damage_score({"edges": edges, "disorder": disorder}, w)
+        if p <= opts["clean_below"]:
+            decided += 1
+            correct += label == 0.0
+    return {"weights": w, "samples": len(samples), "decided": decided, "correct": correct}
+
+
+def main(argv=None):
+    import argparse
+    import csv
+
+    parser = argparse.ArgumentParser(description="Inspect or calibrate the local evidence triage.")
+    parser.add_argument("images", nargs="*", help="Images to score")
+    parser.add_argument("--calibrate", metavar="CSV", help="Labelled images (path,damaged) to fit weights on")
+    args = parser.parse_args(argv)
+
+    if args.calibrate:
+        with open(args.calibrate, newline="", encoding="utf-8") as f:
+            rows = [(r["path"], str(r["damaged"]).lower() in ("1", "true", "yes")) for r in csv.DictReader(f)]
+        report = calibrate(rows)
+        print(f"📐 Fitted on {report['samples']} images: TRIAGE_WEIGHTS={','.join(f'{w:.2f}' for w in report['weights'])}")
+        print(f"   Rejected locally as clean: {report['decided']}/{report['samples']}, "
+              f"{report['correct']} of them correct")
+    opts = settings()
+    for path in args.images:
+        with open(path, "rb") as f:
+            feats = features(f.read())
+        if feats is None:
+            print(f"   {path}: not decodable")
+            continue
+        reason = unusable_reason(feats, opts)
+        score = damage_score(feats, opts["weights"])
+        print(f"   {path}: {reason or f'damage score {score:.2f}'}  "
+              + "  ".join(f"{k}={v:.3f}" for k, v in feats.items()))
+
+
+if __name__ == "__main__":
+    main()
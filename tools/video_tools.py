@@ -0,0 +1,139 @@
+import os
+import heapq
+
+"""
+video_tools.py : picks a few informative keyframes out of video evidence.
+
+Instead of using the first frame (often a black or blurry intro), up to
+VIDEO_FRAME_BUDGET evenly spaced positions are sampled by seeking, scored
+for sharpness and scene change, and the best VIDEO_MAX_FRAMES are kept as
+in-memory JPEG buffers. Only the K best frames (already downsized) and
+their small histograms are held while searching, so memory stays bounded
+however long the video is, and nothing is written to disk.
+
+    VIDEO_MAX_FRAMES     keyframes sent to the model per video (default: 4)
+    VIDEO_FRAME_BUDGET   positions decoded while searching (default: 24)
+"""
+
+# Frames darker than this mean grey level are treated as black/intro frames
+_MIN_BRIGHTNESS = 16
+# Histogram correlation above which two frames count as the same shot
+_SAME_SHOT = 0.97
+# Frames are scored on a thumbnail of this width
+_SCORE_WIDTH = 320
+
+
+def _settings(max_frames, frame_budget):
+    max_frames = max_frames or int(os.environ.get("VIDEO_MAX_FRAMES", 4))
+    frame_budget = frame_budget or int(os.environ.get("VIDEO_FRAME_BUDGET", 24))
+    return max_frames, max(frame_budget, max_frames)
+
+
+def _score(cv2, frame, previous_hist):
+    """Returns (score, hist) for a frame, or (None, hist) if it is unusable."""
+    height, width = frame.shape[:2]
+    if width > _SCORE_WIDTH:
+        frame = cv2.resize(frame, (_SCORE_WIDTH, max(1, height * _SCORE_WIDTH // width)),
+                           interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    hist = cv2.calcHist([gray], [0], None, [32], [0, 256])
+    cv2.normalize(hist, hist)
+
+    if gray.mean() < _MIN_BRIGHTNESS:
+        return None, hist
+
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    # A cut away from the previous sample makes the frame more informative
+    change = 0.0 if previous_hist is None else 1.0 - cv2.compareHist(previous_hist, hist, cv2.HISTCMP_CORREL)
+    return sharpness * (1.0 + max(change, 0.0)), hist
+
+
+def _keep(cv2, kept, candidate, max_frames):
+    """Adds a candidate to the bounded top-K heap, collapsing frames of the same shot."""
+    score, index, hist, frame = candidate
+    for i, (other_score, _, other_hist, _) in enumerate(kept):
+        if cv2.compareHist(other_hist, hist, cv2.HISTCMP_CORREL) > _SAME_SHOT:
+            if score > other_score:
+                kept[i] = candidate
+                heapq.heapify(kept)
+            return
+    if len(kept) < max_frames:
+        heapq.heappush(kept, candidate)
+    elif score > kept[0][0]:
+        heapq.heapreplace(kept, candidate)
+
+
+def _positions(frame_count, frame_budget):
+    """Evenly spaced frame indices, centred in their segment to skip the very first frame."""
+    step = frame_count / frame_budget
+    return sorted({min(frame_count - 1, int(step * (i + 0.5))) for i in range(frame_budget)})
+
+
+def sample_keyframes(video_path, max_frames=None, frame_budget=None):
+    """
+    Returns up to `max_frames` JPEG-encoded keyframes (bytes) in playback
+    order. Returns an empty list if the video cannot be decoded.
+    """
+    import cv2
+    from tools.image_tools import settings
+
+    max_frames, frame_budget = _settings(max_frames, frame_budget)
+    opts = settings()
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return []
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        kept, previous_hist = [], None
+
+        if frame_count > 0:
+            # Seek straight to each sample instead of decoding every frame
+            samples = _seeking(cv2, cap, _positions(frame_count, frame_budget))
+        else:
+            # Unknown length (some streams/containers): read sequentially,
+            # keeping one frame per second up to the budget.
+            stride = max(1, int(cap.get(cv2.CAP_PROP_FPS) or 1))
+            samples = _sequential(cap, stride, frame_budget)
+
+        for index, result in samples:
+            if not result or not result[0]:
+                continue
+            frame = result[1]
+            score, hist = _score(cv2, frame, previous_hist)
+            previous_hist = hist
+            if score is None:
+                continue
+
+            height, width = frame.shape[:2]
+            scale = opts["max_dim"] / max(height, width)
+            if scale < 1:
+                frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            _keep(cv2, kept, (score, index, hist, frame), max_frames)
+
+        frames = []
+        for _, _, _, frame in sorted(kept, key=lambda c: c[1]):
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, opts["quality"]])
+            if ok:
+                frames.append(encoded.tobytes())
+        return frames
+    finally:
+        cap.release()
+
+
+def _seeking(cv2, cap, positions):
+    for index in positions:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        yield index, cap.read()
+
+
+def _sequential(cap, stride, frame_budget):
+    index = 0
+    taken = 0
+    while taken < frame_budget:
+        if not cap.grab():
+            return
+        if index % stride == 0:
+            taken += 1
+            yield index, cap.retrieve()
+        index += 1
@@ -0,0 +1,184 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from tools import metrics
+from tools.db_tools import DB_PATH
+
+"""
+vision_cache.py : content-addressed cache of vision verdicts.
+
+Resubmitted photos (retries, duplicate tickets, UI re-uploads) hash to the
+same key, so the verdict is served from SQLite instead of another model call.
+The key covers the image bytes, the prompt and the model ID, so changing
+either of the latter two simply stops matching old entries.
+
+    VISION_CACHE               set to 0 to bypass the cache entirely
+    VISION_CACHE_PATH          SQLite file (default: vision_cache.db next to claims.db)
+    VISION_CACHE_TTL           entry lifetime in seconds (default: 7 days)
+    VISION_CACHE_MAX_ENTRIES   LRU bound on stored verdicts (default: 10000)
+"""
+
+_lock = threading.Lock()
+_conn = None
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+
+def _cache_path():
+    default = os.path.join(os.path.dirname(DB_PATH), "vision_cache.db")
+    return os.environ.get("VISION_CACHE_PATH", default)
+
+
+def _ttl():
+    return float(os.environ.get("VISION_CACHE_TTL", 7 * 24 * 3600))
+
+
+def _max_entries():
+    return int(os.environ.get("VISION_CACHE_MAX_ENTRIES", 10000))
+
+
+def is_enabled():
+    return os.environ.get("VISION_CACHE", "1") != "0"
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(_cache_path(), check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS vision_cache (
+                key TEXT PRIMARY KEY,
+                model_id TEXT,
+                prompt_hash TEXT,
+                is_valid_damage INTEGER,
+                damage_description TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_vision_cache_access ON vision_cache(last_access)")
+        _conn.commit()
+    return _conn
+
+
+def prompt_hash(prompt: str):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def make_key(images, prompt: str, model_id: str, variant: str = ""):
+    """
+    Hashes the processed image bytes together with the prompt and model ID.
+    `variant` folds in anything else that changes what the model sees, such
+    as the image normalization settings.
+    """
+    h = hashlib.sha256()
+    h.update(model_id.encode("utf-8") + b"\0")
+    h.update(prompt_hash(prompt).encode("ascii") + b"\0")
+    h.update(variant.encode("utf-8") + b"\0")
+    for data in images:
+        # Length prefix keeps [ab, c] and [a, bc] from colliding
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def get(key: str):
+    """Returns the cached verdict dict for `key`, or None on a miss/bypass."""
+    if not is_enabled():
+        with _lock:
+            _stats["bypassed"] += 1
+        return None
+
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute(
+            "SELECT is_valid_damage, damage_description FROM vision_cache WHERE key=? AND created_at>=?",
+            (key, now - _ttl()),
+        ).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            metrics.inc("claims_vision_cache_total", result="miss")
+            return None
+        conn.execute("UPDATE vision_cache SET last_access=? WHERE key=?", (now, key))
+        conn.commit()
+        _stats["hits"] += 1
+    metrics.inc("claims_vision_cache_total", result="hit")
+    return {"is_valid_damage": bool(row[0]), "damage_description": row[1]}
+
+
+def put(key: str, result: dict, prompt: str, model_id: str):
+    """Stores a verdict and trims expired and least-recently-used entries."""
+    if not is_enabled():
+        return
+
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO vision_cache VALUES (?,?,?,?,?,?,?)",
+            (key, model_id, prompt_hash(prompt), int(bool(result["is_valid_damage"])),
+             result["damage_description"], now, now),
+        )
+        cur = conn.execute("DELETE FROM vision_cache WHERE created_at<?", (now - _ttl(),))
+        evicted = cur.rowcount
+        cur = conn.execute(
+            "DELETE FROM vision_cache WHERE key IN "
+            "(SELECT key FROM vision_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (_max_entries(),),
+        )
+        evicted += cur.rowcount
+        conn.commit()
+        _stats["stores"] += 1
+        _stats["evictions"] += evicted
+
+
+def invalidate(model_id: str = None, prompt: str = None):
+    """
+    Deletes cached verdicts. With no arguments the whole cache is cleared;
+    otherwise only entries for the given model ID and/or prompt are removed.
+    Returns the number of deleted entries.
+    """
+    clauses, params = [], []
+    if model_id is not None:
+        clauses.append("model_id=?")
+        params.append(model_id)
+    if prompt is not None:
+        clauses.append("prompt_hash=?")
+        params.append(prompt_hash(prompt))
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with _lock:
+        conn = _get_conn()
+        cur = conn.execute(f"DELETE FROM vision_cache{where}", params)
+        conn.commit()
+    return cur.rowcount
+
+
+def invalidate_stale(model_id: str, prompt: str):
+    """Drops every entry that was not produced by this model/prompt pair."""
+    with _lock:
+        conn = _get_conn()
+        cur = conn.execute(
+            "DELETE FROM vision_cache WHERE model_id!=? OR prompt_hash!=?",
+            (model_id, prompt_hash(prompt)),
+        )
+        conn.commit()
+    return cur.rowcount
+
+
+def stats():
+    """Hit/miss counters for this process plus the current entry count."""
+    with _lock:
+        entries = _get_conn().execute("SELECT COUNT(*) FROM vision_cache").fetchone()[0]
+        return {**_stats, "entries": entries}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--clear" in sys.argv:
+        print(f"🧹 Removed {invalidate()} cached verdicts.")
+    print(stats())
@@ -0,0 +1,294 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from tools import metrics
+
+"""
+vision_scheduler.py : admission control for vision model calls under a
+provider quota.
+
+Each claim's first model call waits here for its share of the
+requests-per-minute (VISION_RPM) and tokens-per-minute (VISION_TPM)
+budgets, each a token bucket. Waiting claims are served by priority, not
+arrival. A claim's place in the queue is
+
+    submitted_at - head_start(tier, order value)
+
+so a VIP or high-value claim counts as if it had arrived earlier. Because
+the head start is capped at SCHED_MAX_HEAD_START, no claim can be passed by
+one that arrived more than that many seconds after it. That bounds
+starvation. Claims without a known submit time use the moment they reach
+the queue. In the gated topology crm has run before vision, so tier and
+order value are known; elsewhere claims get no head start.
+
+Retries and hedged duplicates are charged to the buckets without queueing
+again. The token cost is estimated up front (images * VISION_TOKENS_PER_IMAGE
+plus the completion cap) and corrected with the usage the provider reports.
+With neither limit set the scheduler is a no-op.
+
+Limits are per process. worker.py splits them across its processes.
+
+    VISION_RPM                requests per minute (default: 0 = unlimited)
+    VISION_TPM                tokens per minute (default: 0 = unlimited)
+    VISION_RATE_BURST         seconds of quota that may go out at once (default: 10)
+    VISION_TOKENS_PER_IMAGE   prompt tokens estimated per image (default: 1600)
+    SCHED_TIER_HEAD_START     seconds per tier (default: VIP=120,GOLD=45)
+    SCHED_VALUE_HEAD_START    seconds per doubling of order value above $100 (default: 20)
+    SCHED_MAX_HEAD_START      cap on the total head start, in seconds (default: 300)
+"""
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKENS = 100
+
+
+def _tier_head_starts():
+    value = os.environ.get("SCHED_TIER_HEAD_START", "VIP=120,GOLD=45")
+    pairs = (item.split("=") for item in value.split(",") if "=" in item)
+    return {tier.strip().upper(): float(seconds) for tier, seconds in pairs}
+
+
+def head_start(tier, order_value):
+    """Seconds of queue seniority a claim gets for its tier and order value."""
+    seconds = _tier_head_starts().get((tier or "").upper(), 0.0)
+    if order_value and order_value > 100:
+        seconds += float(os.environ.get("SCHED_VALUE_HEAD_START", 20)) * math.log2(order_value / 100)
+    return min(seconds, float(os.environ.get("SCHED_MAX_HEAD_START", 300)))
+
+
+def estimate_tokens(images):
+    from tools.llm_client import max_tokens
+
+    per_image = int(os.environ.get("VISION_TOKENS_PER_IMAGE", 1600))
+    return PROMPT_TOKENS + per_image * images + (max_tokens() or 300)
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute`/60 per second and holds `burst` seconds' worth.
+    Charges may take it negative.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        burst = burst if burst is not None else float(os.environ.get("VISION_RATE_BURST", 10))
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost, now):
+        """Seconds until `cost` can be taken (a cost above capacity waits for a full bucket)."""
+        self._refill(now)
+        missing = min(cost, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, cost, now):
+        self._refill(now)
+        self.tokens -= cost
+
+
+class _Waiter:
+    __slots__ = ("cost", "tier", "enqueued", "grant", "cancelled")
+
+    def __init__(self, cost, tier, grant):
+        self.cost = cost
+        self.tier = tier
+        self.enqueued = time.monotonic()
+        self.grant = grant
+        self.cancelled = False
+
+
+class VisionScheduler:
+    """
+    Priority queue in front of the two buckets. A dispatcher thread grants
+    the head of the queue as soon as both buckets allow it, so sync and
+    async callers from any thread or event loop share one quota.
+    """
+
+    def __init__(self, rpm=0, tpm=0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._heap = []
+        self._waiting = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        if self.enabled:
+            threading.Thread(target=self._dispatch, name="vision-scheduler", daemon=True).start()
+
+    @property
+    def enabled(self):
+        return self.requests is not None or self.tokens is not None
+
+    def _wait_time(self, cost, now):
+        wait = 0.0
+        if self.requests:
+            wait = self.requests.wait_time(1, now)
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(cost, now))
+        return wait
+
+    def _take(self, cost, now):
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(cost, now)
+
+    def _publish_depth(self):
+        metrics.set_gauge("claims_vision_queue_depth", self._waiting)
+
+    def _dispatch(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][-1].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._publish_depth()
+                    self._cond.wait()
+                    continue
+                waiter = self._heap[0][-1]
+                now = time.monotonic()
+                wait = self._wait_time(waiter.cost, now)
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                self._waiting -= 1
+                self._take(waiter.cost, now)
+                self._publish_depth()
+                waited = now - waiter.enqueued
+                metrics.observe("claims_vision_queue_wait_seconds", waited, tier=waiter.tier)
+                waiter.grant()
+
+    def _enqueue(self, key, cost, tier, grant):
+        waiter = _Waiter(cost, tier, grant)
+        with self._cond:
+            heapq.heappush(self._heap, (key, next(self._seq), waiter))
+            self._waiting += 1
+            self._publish_depth()
+            self._cond.notify()
+        return waiter
+
+    def _cancel(self, waiter):
+        with self._cond:
+            if waiter.cancelled or not any(w is waiter for *_, w in self._heap):
+                return  # Already granted
+            waiter.cancelled = True
+            self._waiting -= 1
+            self._publish_depth()
+            self._cond.notify()
+
+    def admit(self, key, cost, tier=None):
+        """Blocks until a call of `cost` tokens may go out; lower `key` goes first."""
+        if not self.enabled:
+            return
+        granted = threading.Event()
+        waiter = self._enqueue(key, cost, tier or "unknown", granted.set)
+        try:
+            granted.wait()
+        except BaseException:
+            self._cancel(waiter)
+            raise
+
+    async def aadmit(self, key, cost, tier=None):
+        """Async variant of `admit`; a cancelled caller gives up its place."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            try:
+                loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+            except RuntimeError:
+                pass  # The caller's loop is gone
+
+        waiter = self._enqueue(key, cost, tier or "unknown", grant)
+        try:
+            await granted
+        except BaseException:
+            self._cancel(waiter)
+            raise
+
+    def charge(self, cost):
+        """Books a call that did not queue (a retry or a hedge)."""
+        if not self.enabled:
+            return
+        with self._cond:
+            self._take(cost, time.monotonic())
+        metrics.inc("claims_vision_unqueued_calls_total")
+
+    def settle(self, estimate, actual):
+        """Corrects the token bucket once the provider has reported a call's real usage."""
+        if not self.tokens or not actual:
+            return
+        with self._cond:
+            self.tokens.tokens += estimate - actual
+            self._cond.notify()
+
+    def depth(self):
+        return self._waiting
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = VisionScheduler(
+                    rpm=float(os.environ.get("VISION_RPM", 0)),
+                    tpm=float(os.environ.get("VISION_TPM", 0)),
+                )
+    return _scheduler
+
+
+def reset():
+    """Drops the scheduler; the next call reads the limits from the environment again."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
+
+
+def queue_key(state):
+    """Priority of a claim: its submit time minus its head start (lower goes first)."""
+    submitted = state.get("submitted_at") or time.time()
+    return submitted - head_start(state.get("customer_tier"), state.get("order_value"))
+
+
+def admit(state, cost):
+    get_scheduler().admit(queue_key(state), cost, state.get("customer_tier"))
+
+
+async def aadmit(state, cost):
+    await get_scheduler().aadmit(queue_key(state), cost, state.get("customer_tier"))
+
+
+def charge(cost):
+    get_scheduler().charge(cost)
+
+
+def metered(attempt, cost):
+    """Wraps a resilience attempt so calls after the admitted first one are charged."""
+    calls = itertools.count()
+
+    def run(model):
+        if next(calls):
+            charge(cost)
+        return attempt(model)
+    return run
+
+
+def settle(estimate, actual):
+    get_scheduler().settle(estimate, actual)
@@ -0,0 +1,246 @@
+"""
+worker.py : a pool of processes that work through the claim job queue.
+
+Each process compiles its own graph and keeps up to --concurrency claims in
+flight. It leases jobs from tools/job_queue.py and heartbeats the leases
+while the graph runs. A job is acked once its thread finishes or pauses for
+a manager. If a worker dies, its leases expire and another worker resumes
+those threads from their last checkpoint. The supervisor restarts children
+that exit unexpectedly.
+
+Usage:
+    python -m tools.job_queue --submit claims.jsonl
+    python worker.py --processes 4 --concurrency 8
+    python worker.py --processes 2 --exit-when-idle        # drain the queue, then stop
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- PATH HANDLER ---
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger("worker")
+
+POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", 0.5))
+# Decisions a manager can record on a paused thread before it is resumed
+MANAGER_DECISIONS = ("Manager Approved", "Rejected")
+
+# Queue calls get their own thread: behind busy sync nodes in the node
+# executor, heartbeats would arrive late and leases would expire under load
+_queue_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue")
+
+
+async def _queue(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_queue_pool, fn, *args)
+
+
+# --- 1. Running One Job ---
+async def run_job(graph, job):
+    """
+    Drives the job's thread to its next stop and returns "done" or "paused".
+    A thread with a checkpoint is resumed, not restarted, so a claim left
+    half-finished by a dead worker continues where it stopped.
+    """
+    from tools import tracing
+
+    config = {"configurable": {"thread_id": job["thread_id"]}, "callbacks": tracing.callbacks()}
+    snapshot = await graph.aget_state(config)
+    if not snapshot.values:
+        graph_input = {
+            "claim_id": job["claim_id"],
+            "image_paths": job["image_paths"],
+            "submitted_at": job["created_at"],  # Time in the job queue counts towards priority
+            "messages": [],
+            "refund_status": "Pending",
+        }
+    elif not snapshot.next:
+        return "done"  # Finished before the previous worker could ack
+    elif "human_review" in snapshot.next and snapshot.values.get("refund_status") not in MANAGER_DECISIONS:
+        return "paused"  # Still waiting for a manager
+    else:
+        graph_input = None  # None input means 'continue'
+
+    await graph.ainvoke(graph_input, config=config)
+    snapshot = await graph.aget_state(config)
+    return "paused" if "human_review" in (snapshot.next or ()) else "done"
+
+
+async def _work(graph, job, worker_id, inflight):
+    from tools import job_queue, metrics
+    from tools.llm_resilience import VisionRequestError, VisionUnavailableError
+
+    thread_id = job["thread_id"]
+    started = time.perf_counter()
+    status = error = None
+    try:
+        status = await run_job(graph, job)
+    except Exception as e:
+        error = e
+    # Leave the heartbeat set before the outcome is written, so a job that was
+    # just acked is never mistaken for a lost lease
+    inflight.pop(thread_id, None)
+
+    if isinstance(error, VisionUnavailableError):
+        # Parked, not failed: the model is down, the claim is fine
+        await _queue(job_queue.retry, thread_id, worker_id, error, job_queue.park_delay(), False)
+        metrics.inc("claims_jobs_total", outcome="parked")
+    elif isinstance(error, VisionRequestError):
+        # The model rejected the request; running it again would fail the same way
+        logger.error("❌ [Worker %s] Claim %s failed: %s", worker_id, job["claim_id"], error)
+        failed = await _queue(job_queue.fail, thread_id, worker_id, f"{type(error).__name__}: {error}")
+        metrics.inc("claims_jobs_total", outcome="failed" if failed else "lost")
+    elif error is not None:
+        logger.error("❌ [Worker %s] Claim %s failed: %s: %s", worker_id, job["claim_id"], type(error).__name__, error)
+        delay = min(300, 5 * 2 ** job["attempts"]) * random.uniform(0.5, 1)
+        outcome = await _queue(job_queue.retry, thread_id, worker_id, f"{type(error).__name__}: {error}", delay)
+        metrics.inc("claims_jobs_total", outcome=outcome or "lost")
+    else:
+        if not await _queue(job_queue.ack, thread_id, worker_id, status):
+            logger.warning("⚠️ [Worker %s] Lost the lease on %s before acking", worker_id, thread_id)
+        metrics.inc("claims_jobs_total", outcome=status)
+        metrics.observe("claims_job_seconds", time.perf_counter() - started)
+
+
+# --- 2. One Worker Process ---
+async def run_worker(worker_id, concurrency=8, stop=None, exit_when_idle=False):
+    """
+    Leases and runs jobs until `stop` is set (or, with `exit_when_idle`, until
+    the queue has nothing left). In-flight claims finish before it returns,
+    and anything still leased is handed back.
+    """
+    from main import get_graph, node_executor
+
+    # Sync nodes need a thread each; keep their pool as wide as the claims in flight
+    with node_executor(concurrency):
+        await _run_worker(get_graph(), worker_id, concurrency, stop, exit_when_idle)
+
+
+async def _run_worker(graph, worker_id, concurrency, stop, exit_when_idle):
+    from tools import job_queue
+
+    stop = stop or asyncio.Event()
+    inflight = {}
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(job_queue.lease_seconds() / 3)
+            sent = list(inflight)
+            try:
+                held = await _queue(job_queue.heartbeat, worker_id, sent)
+            except Exception as e:
+                # e.g. the database stayed locked past busy_timeout; two more beats before the leases run out
+                logger.warning("⚠️ [Worker %s] Heartbeat failed: %s: %s", worker_id, type(e).__name__, e)
+                continue
+            for thread_id in set(sent) - held:
+                task = inflight.get(thread_id)
+                if task:
+                    # Another worker owns it now; don't write over its run
+                    logger.warning("⚠️ [Worker %s] Lease on %s lost; abandoning it", worker_id, thread_id)
+                    task.cancel()
+
+    beat = asyncio.create_task(heartbeat())
+    # Set whenever a claim finishes, so a full worker leases again right away
+    slot_free = asyncio.Event()
+    logger.info("👷 [Worker %s] Started (concurrency=%d)", worker_id, concurrency)
+    try:
+        while not stop.is_set():
+            slot_free.clear()
+            free = concurrency - len(inflight)
+            jobs = await _queue(job_queue.lease, worker_id, free) if free else []
+            for job in jobs:
+                task = asyncio.create_task(_work(graph, job, worker_id, inflight))
+                inflight[job["thread_id"]] = task
+                task.add_done_callback(lambda _, t=job["thread_id"]: (inflight.pop(t, None), slot_free.set()))
+            if jobs and len(jobs) < free:
+                continue  # There may be more ready jobs
+            if not jobs and not inflight and exit_when_idle:
+                if not await _queue(job_queue.outstanding):
+                    break
+            try:
+                await asyncio.wait_for(slot_free.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        if inflight:
+            logger.info("🛑 [Worker %s] Finishing %d in-flight claims", worker_id, len(inflight))
+            await asyncio.gather(*inflight.values(), return_exceptions=True)
+    finally:
+        beat.cancel()
+        await _queue(job_queue.release, worker_id)
+    logger.info("👋 [Worker %s] Stopped", worker_id)
+
+
+def _process_main(slot, concurrency, exit_when_idle):
+    """Entry point of each child process; the runtime is set up with its graph."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    if os.environ.get("METRICS_PORT"):
+        # One /metrics port per worker slot: METRICS_PORT, METRICS_PORT+1, ...
+        os.environ["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + slot)
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await run_worker(worker_id, concurrency, stop, exit_when_idle)
+
+    asyncio.run(run())
+
+
+# --- 3. Supervisor ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run claim workers against the job queue.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="Claims in flight per process")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop once the queue is drained")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # The vision quota is per process (tools/vision_scheduler.py); give each child its share
+    for name in ("VISION_RPM", "VISION_TPM"):
+        if float(os.environ.get(name, 0)):
+            os.environ[name] = str(float(os.environ[name]) / args.processes)
+
+    # Fresh interpreters: SQLite connections and HTTP pools must not be forked
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def spawn(slot):
+        process = context.Process(target=_process_main, args=(slot, args.concurrency, args.exit_when_idle))
+        process.start()
+        return process
+
+    def shutdown(*_):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()  # SIGTERM: finish in-flight claims, then exit
+
+    processes = {slot: spawn(slot) for slot in range(args.processes)}
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"👷 Started {len(processes)} worker processes ({args.concurrency} claims each)")
+
+    while processes:
+        for slot, process in list(processes.items()):
+            process.join(timeout=0.5)
+            if process.is_alive():
+                continue
+            del processes[slot]
+            if process.exitcode != 0 and not stopping:
+                print(f"💀 Worker {process.pid} died (exit {process.exitcode}); starting a replacement")
+                processes[slot] = spawn(slot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())